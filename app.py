@@ -1,51 +1,117 @@
 import streamlit as st
-from langchain_community.callbacks.streamlit import StreamlitCallbackHandler
-from dataviz.graphbuilder import build_graph
-from dataviz.utils import display_visualization,download_chart_as_html
-from dataviz.logging import logger
+from dataviz.graphbuilder import get_graph,warm_up
+from dataviz.utils import display_visualization
+from dataviz.render_cache import render_history,render_download_button,remember_figure
+from dataviz.session_store import MessageStore,chart_message
+from dataviz.logging import logger, compact
+from dataviz.streaming import TokenStreamStats,astream_graph
 import io
+import asyncio
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Query results are kept as typed DataFrames so charts are built without re-parsing strings,
+# repeated questions are served from the query cache and chart questions get the text answer
+# and the chart recommendation in parallel. Nodes run async so LLM and warehouse calls share
+# the process-wide scheduler. Generated SQL is validated and dry-run checked before it runs.
+# Each chat keeps its previous turn, so follow-ups re-chart or re-word it without new SQL
+GRAPH_CONFIG = {"typed_results": True, "cache_queries": True, "parallel_viz": True, "async_nodes": True,
+                "validate_queries": True, "follow_ups": True}
+
+# Compile the graph once per process; later reruns and sessions reuse the same instance
+warm_up(**GRAPH_CONFIG)
+
 st.set_page_config(page_title="Store SQL Assistant", page_icon="🤖", layout="wide")
 
 st.title("🤖 Store SQL Assistant")
    
-streamlit_callback = StreamlitCallbackHandler(st.container())
 st.subheader("About")
 st.info("This SQL Assistant provides answers or visualizations for your store data . Ask questions in plain English, and get SQL-powered answers!")
 st.markdown("---")
 
 if "messages" not in st.session_state:
-    st.session_state["messages"] = [{"role": "assistant", "content": "How can I help you?"}]
+    # Capped per session; charts are stored as chart type plus chart data, not as figures
+    st.session_state["messages"] = MessageStore([{"role": "assistant", "content": "How can I help you?"}])
+
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
 
 
-# Render chat history from st.session_state
+# Render chat history from st.session_state. Chart figures are rebuilt from their spec through a
+# shared cache, their export is only built when downloaded, and older messages stay collapsed
 if "messages" in st.session_state:
-    for message in st.session_state.messages:
-        if message["role"] == "assistant":
-                if "chart" in message:
-                    with st.container():  # Use a container instead of st.chat_message
-                        # Display the heading in the middle (centered, bold)
-                        chart_label = message["content"]
-                        chart=message["chart"]
-                        st.plotly_chart(chart, use_container_width=True)
-                        st.download_button(
-                            label="Download Chart as HTML",
-                            data=download_chart_as_html(chart),
-                            file_name=f"{chart_label}_chart.html",
-                            mime="text/html"
-                        )
-                else:
-                    # Display the assistant's response
-                    with st.chat_message("assistant"):  # Use st.chat_message for assistant
-                        st.markdown(message["content"])
-
-        elif message["role"] == "user":
-            # Display the user's query
-            with st.chat_message("user"):  # Use st.chat_message for user
-                st.markdown(message["content"])
+    render_history(st.session_state.messages)
+
+
+def render_step(step, response_container, placeholders):
+    """
+    Renders one graph step in the chat and stores it in the session history. Text already
+    streamed into a node's placeholder is replaced there by the final response.
+    """
+    # Results and chart data can be large, so only their sizes are logged
+    logger.info("Output of step %s", compact(step))
+    if 'generate_answer' in step:
+        response = step['generate_answer']['answer']
+        placeholders.pop('generate_answer', response_container).markdown(response)
+        st.session_state.messages.append({
+        "role": "assistant",
+        "content": response  # Append text response
+        })
+    elif 'get_visualization' in step:
+        response = step['get_visualization']['answer']
+        placeholders.pop('get_visualization', response_container).markdown(response) 
+        st.session_state.messages.append({
+        "role": "assistant",
+        "content": response  # Append text response
+        }) 
+    elif 'recommend_chart' in step:
+        response = step['recommend_chart']['recommendation']
+        placeholders.pop('recommend_chart', response_container).markdown(response)
+        st.session_state.messages.append({
+        "role": "assistant",
+        "content": response  # Append text response
+        })
+        # The parallel graph shapes the chart in the same node
+        if step['recommend_chart'].get('viz_data'):
+            render_chart(step['recommend_chart']['viz_data'], step['recommend_chart']['chart_type'])
+    elif 'transform_data_for_visualization_chain' in step:
+        render_chart(step['transform_data_for_visualization_chain']['viz_data'],
+                     step['transform_data_for_visualization_chain'].get('chart_type'))
+
+
+def render_chart(viz_data, chart_type):
+    """Renders the chart of a step and stores it in the session history."""
+    chart,chart_label=display_visualization(viz_data,chart_type)
+    if chart is not None:
+        # Append the chart type and data to session state messages; the figure goes to the render cache
+        message=chart_message(chart_label,chart_type,viz_data)
+        remember_figure(message,chart)
+        messages=st.session_state.messages
+        render_download_button(message, messages.evicted + len(messages))
+        messages.append(message)
+
+
+async def run_question(graph, user_query, response_container):
+    """Drives the async graph, streaming LLM tokens into the chat and rendering each step as it completes."""
+    # The session id lets the scheduler queue LLM and warehouse calls fairly across users, and
+    # keys the conversation context of the chat as its checkpoint thread
+    session_id = st.session_state["session_id"]
+    config = {"configurable": {"session_id": session_id, "thread_id": session_id}}
+    stats = TokenStreamStats()
+    placeholders = {}
+    streamed_text = {}
+    async for event in astream_graph(graph, {"question": user_query}, config, stats):
+        if event[0] == "token":
+            _, node, token = event
+            streamed_text[node] = streamed_text.get(node, "") + token
+            if node not in placeholders:
+                placeholders[node] = response_container.empty()
+            placeholders[node].markdown(streamed_text[node])
+        else:
+            render_step(event[1], response_container, placeholders)
+    logger.info(f"Streaming stats {stats.finish()}")
 
 
 user_query = st.chat_input(placeholder="Ask anything from the database")
@@ -57,49 +123,5 @@ if user_query:
     with st.chat_message("assistant"):
         response_container = st.container()
         with response_container:
-            graph=build_graph()
-            response=None
-            for step in graph.stream(
-                {"question": user_query}
-            ):
-                logger.info(f"Output of step {step}") 
-                if 'generate_answer' in step:
-                    response = step['generate_answer']['answer']
-                    response_container.markdown(response)
-                    st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response  # Append text response
-                    })
-                elif 'get_visualization' in step:
-                    response = step['get_visualization']['answer']
-                    response_container.markdown(response) 
-                    st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response  # Append text response
-                    }) 
-                elif 'transform_data_for_visualization_chain' in step:
-                    viz_data=step['transform_data_for_visualization_chain']['viz_data']
-                    chart_type=step['transform_data_for_visualization_chain']['chart_type']
-                    chart,chart_label=display_visualization(viz_data,chart_type)
-                    
-                    st.download_button(
-                        label="Download Chart as HTML",
-                        data=download_chart_as_html(chart),
-                        file_name=f"{chart_label}_chart.html",
-                        mime="text/html"
-                    )
-
-                    # Append chart to session state messages
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": chart_label,  # Placeholder for text description
-                        "chart": chart  # Store the chart object
-                    })
- 
-
-
-            
-
-
-
-    
\ No newline at end of file
+            graph=get_graph(**GRAPH_CONFIG)
+            asyncio.run(run_question(graph, user_query, response_container))
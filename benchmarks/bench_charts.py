@@ -0,0 +1,241 @@
+"""
+Time to build a chart and serialize it for the browser (what st.plotly_chart sends) against
+chart size, for the previous Plotly Express builders and the graph_objects builders of
+dataviz.charts, with the size of the serialized figure.
+
+Usage:
+    python benchmarks/bench_charts.py [--sizes 100 1000 10000 100000] [--repeat 3] [--max-legacy-size 10000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+import plotly.colors as pcolors
+import plotly.express as px
+from dataviz.utils import build_figure
+
+CHART_TYPES = ["bar", "stacked bar", "pie", "histogram", "scatter"]
+
+
+def legacy_build_figure(response,chart_type):
+    # build_figure of dataviz/utils.py before dataviz.charts: Plotly Express on row-built DataFrames
+    chart, chart_label = None, None
+    #get the chart_data from state as dictionary
+    content = response.replace(
+        '```json', '').replace('```', '').strip()
+    parsed_data = json.loads(content)
+    if chart_data := parsed_data.get("chart_data"):
+    
+        if chart_type == "bar":
+            df = pd.DataFrame({
+                'Category': chart_data['labels'],
+                'Value': chart_data['values'][0]['data']
+            })
+            # Dynamically generate a color palette based on the number of categories
+            num_categories = len(df['Category'])
+            color_palette = pcolors.qualitative.Plotly[:num_categories]
+            # Get the label
+            x_label=chart_data.get('x_label')
+            y_label=chart_data['values'][0]['label']
+            chart_label = "Bar Chart for " + chart_data.get('title')
+
+            # Create the bar chart using Plotly
+            chart = px.bar(
+                df,
+                x="Category",
+                y="Value",
+                title=chart_label,
+                color="Category",  # Assign colors to categories
+                color_discrete_sequence=color_palette
+            )
+
+            # Customize tooltips and layout
+            chart.update_traces(
+                hovertemplate="<b>%{x}</b><br>Value: %{y}<extra></extra>"
+            )
+
+            chart.update_layout(
+                xaxis_title=x_label,
+                yaxis_title=y_label,
+                #title_x=0.5,  # Center the title
+                title_font=dict(size=18, weight='bold'),
+            )
+
+        elif chart_type == "stacked bar":
+            # Prepare the DataFrame
+            data = []
+            for group in chart_data["stack_groups"]:
+                for i, count in enumerate(group["counts"]):
+                    data.append({
+                        "Size": chart_data["x_axis_categories"][i],
+                        "Count": count,
+                        "Color": group["stack_category"]
+                    })
+
+            df = pd.DataFrame(data)
+            # Dynamically generate a color palette based on the number of stack categories
+            stack_categories = [group["stack_category"] for group in chart_data["stack_groups"]]
+            color_palette = pcolors.qualitative.Plotly[:len(stack_categories)]
+            chart_label = "Stacked Bar Chart for " + chart_data.get('title')
+            # Create the stacked bar chart using Plotly
+            chart = px.bar(
+                df,
+                x="Size",
+                y="Count",
+                color="Color",
+                title=chart_label,
+                labels={"Size": chart_data.get("x_label", "X-Axis"), "Count": chart_data.get("y_label", "Y-Axis")},
+                color_discrete_sequence=color_palette,  # Apply the dynamic color palette
+            )
+
+            # Customize the layout
+            chart.update_layout(
+                barmode="stack",  # Enable stacking
+                #title_x=0.5,  # Center the title
+                title_font=dict(size=18, weight="bold"),
+                xaxis_title=chart_data.get("x_label", "X-Axis"),
+                yaxis_title=chart_data.get("y_label", "Y-Axis"),
+            )
+        
+        elif chart_type == "pie":
+            # Prepare data for the pie chart
+            df = pd.DataFrame({
+                'Category': [item['label'] for item in chart_data['data']],
+                'Value': [item['value'] for item in chart_data['data']]
+            })
+            # Dynamically generate a color palette based on the number of categories
+            num_categories = len(df['Category'])
+            color_palette = pcolors.qualitative.Plotly[:num_categories]
+            chart_label = "Pie Chart for " + chart_data.get('title')
+
+            # Create the donut chart using Plotly
+            chart = px.pie(
+                df,
+                values="Value",
+                names="Category",
+                title=chart_label,
+                hole=0.4,  # Creates the donut effect
+            )
+
+            # Customize tooltips to include percentages
+            chart.update_traces(
+                textinfo="percent+label",  # Show both percentage and label
+                hovertemplate="<b>%{label}</b><br>Value: %{value}<br>Percentage: %{percent}<extra></extra>",
+                marker=dict(colors=color_palette)
+            )
+        elif chart_type == "histogram":
+            # Prepare the DataFrame
+            df = pd.DataFrame({
+                "Bins": chart_data["bins"],
+                "Counts": chart_data["counts"]
+            })
+            chart_label="Histogram for " + chart_data.get('title')
+            # Create the histogram using Plotly
+            chart=px.histogram(
+                df, x="Bins", y="Counts",
+                title=chart_label, 
+                labels={"Bins": chart_data.get("x_label", "X-Axis"), 
+                        "Counts": chart_data.get("y_label", "Y-Axis")},
+                histfunc='sum',  # Use the provided counts
+                color_discrete_sequence=["#ADD8E6"]  # Set color to light blue
+                )
+            
+            # Update layout for the histogram
+            chart.update_layout(
+                #title_x=0.5,  # Center the title
+                title_font=dict(size=18, weight="bold"),
+                xaxis=dict(
+                    tickmode="array",
+                    tickvals=df["Bins"],  # Show bin values as ticks
+                ),
+            )
+        elif chart_type == "scatter":
+            # Convert data points to DataFrame
+            df = pd.DataFrame(chart_data["data_points"])
+            chart_label="Scatter plot for " + chart_data.get('title')
+            chart=px.scatter(df, x="x", y="y", 
+             labels={"x": chart_data["x_label"], "y": chart_data["y_label"]},
+             title=chart_label,hover_data={"x": True, "y": True},
+             color_discrete_sequence=["#636EFA"]  # Set color to blue
+             )
+
+    return chart,chart_label
+
+
+def chart_spec(chart_type, size, rng):
+    """viz_data of a chart with `size` points (categories, cells, bins or observations)."""
+    if chart_type in ("bar", "pie"):
+        labels = [f"category {i}" for i in range(size)]
+        values = rng.integers(0, 1000, size).tolist()
+        if chart_type == "bar":
+            chart_data = {"labels": labels, "values": [{"data": values, "label": "Stock"}], "title": "Stock", "x_label": "Category"}
+        else:
+            chart_data = {"data": [{"label": label, "value": value} for label, value in zip(labels, values)], "title": "Stock"}
+    elif chart_type == "stacked bar":
+        groups = 5
+        categories = [f"category {i}" for i in range(max(1, size // groups))]
+        chart_data = {
+            "x_axis_categories": categories,
+            "stack_groups": [{"counts": rng.integers(0, 100, len(categories)).tolist(), "stack_category": f"group {g}"}
+                             for g in range(groups)],
+            "title": "Stock", "x_label": "Category", "y_label": "Stock",
+        }
+    elif chart_type == "histogram":
+        chart_data = {"bins": np.arange(size).tolist(), "counts": rng.integers(0, 100, size).tolist(),
+                      "title": "Price", "x_label": "Price", "y_label": "Frequency"}
+    else:
+        points = rng.normal(size=(size, 2)).round(4).tolist()
+        chart_data = {"data_points": [{"x": x, "y": y} for x, y in points], "title": "Price vs Stock",
+                      "x_label": "Price", "y_label": "Stock"}
+    return json.dumps({"chart_data": chart_data})
+
+
+def measure(build, viz_data, chart_type, repeat):
+    """Best time (ms) to build the figure and serialize it to JSON, and the JSON size in KiB."""
+    best, size = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chart, _ = build(viz_data, chart_type)
+        payload = chart.to_json()
+        best = min(best, (time.perf_counter() - start) * 1000)
+        size = len(payload) / 1024
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--chart-types", nargs="+", default=CHART_TYPES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-legacy-size", type=int, default=10000,
+                        help="skip the previous builders above this size (one trace per category takes minutes)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Warm up plotly's lazy imports and validators
+    for chart_type in CHART_TYPES:
+        viz_data = chart_spec(chart_type, 10, rng)
+        legacy_build_figure(viz_data, chart_type)
+        build_figure(viz_data, chart_type)
+
+    print(f"{'chart':<12}{'size':>9}{'previous ms':>14}{'previous KiB':>14}{'new ms':>10}{'new KiB':>10}{'speedup':>9}")
+    for chart_type in args.chart_types:
+        for size in args.sizes:
+            viz_data = chart_spec(chart_type, size, rng)
+            new_ms, new_kib = measure(build_figure, viz_data, chart_type, args.repeat)
+            if size <= args.max_legacy_size:
+                old_ms, old_kib = measure(legacy_build_figure, viz_data, chart_type, args.repeat)
+                print(f"{chart_type:<12}{size:>9}{old_ms:>14.1f}{old_kib:>14.0f}{new_ms:>10.1f}{new_kib:>10.0f}"
+                      f"{old_ms / new_ms:>8.1f}x", flush=True)
+            else:
+                print(f"{chart_type:<12}{size:>9}{'-':>14}{'-':>14}{new_ms:>10.1f}{new_kib:>10.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
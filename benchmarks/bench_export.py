@@ -0,0 +1,95 @@
+"""
+Size and build time of chart exports: the previous per-chart to_html export (plotly.js from the
+CDN, or inlined per file) against the formats of dataviz.export, for single charts and for a
+dashboard of every chart. The first export of a process also reads (and for html.gz compresses)
+the plotly.js bundle, so it is reported separately from the following ones.
+
+Usage:
+    python benchmarks/bench_export.py [--charts 5] [--repeat 5] [--output-dir DIR]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import plotly.io as pio
+
+
+def sample_figures(count, seed=0):
+    """`count` charts cycling through the chart types, with a few hundred values each."""
+    from dataviz.charts import build_chart_figure
+    rng = np.random.default_rng(seed)
+    labels = [f"Brand {i}" for i in range(50)]
+    specs = [
+        ("bar", {"title": "Stock by Brand", "labels": labels,
+                 "values": [{"data": rng.integers(0, 1000, 50).tolist(), "label": "Stock"}]}),
+        ("stacked bar", {"title": "Brand by Size", "x_axis_categories": labels,
+                         "stack_groups": [{"stack_category": size, "counts": rng.integers(0, 100, 50).tolist()}
+                                          for size in ("S", "M", "L", "XL")]}),
+        ("pie", {"title": "Stock by Color",
+                 "data": [{"label": color, "value": int(rng.integers(1, 500))} for color in ("Red", "Black", "White", "Blue")]}),
+        ("histogram", {"title": "Prices", "bins": list(range(10, 60)), "counts": rng.integers(0, 40, 50).tolist()}),
+        ("scatter", {"title": "Price vs Stock", "x_label": "Price", "y_label": "Stock",
+                     "data_points": [{"x": float(x), "y": float(y)} for x, y in rng.integers(0, 100, (500, 2))]}),
+    ]
+    return [build_chart_figure(*specs[i % len(specs)])[0] for i in range(count)]
+
+
+def timed(fn, repeat):
+    """(size in bytes, first call ms, median ms of the following calls)."""
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        size = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return size, times[0], float(np.median(times[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--charts", type=int, default=5, help="charts exported, and shown on the dashboard")
+    parser.add_argument("--repeat", type=int, default=5, help="timed exports after the first one")
+    parser.add_argument("--output-dir", help="directory for the written files (a temporary one by default)")
+    args = parser.parse_args()
+
+    from dataviz.export import export_bytes, write_export
+    figures = sample_figures(args.charts)
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="dataviz_export_bench_")
+    os.makedirs(output_dir, exist_ok=True)
+
+    def previous(plotlyjs):
+        return lambda: sum(len(pio.to_html(figure, full_html=True, include_plotlyjs=plotlyjs).encode("utf-8"))
+                           for figure in figures)
+
+    def per_chart(fmt):
+        return lambda: sum(len(export_bytes([figure], fmt)) for figure in figures)
+
+    def dashboard(fmt):
+        def run():
+            path = write_export(os.path.join(output_dir, f"dashboard.{fmt}"), figures, fmt)
+            return os.path.getsize(path)
+        return run
+
+    cases = [
+        ("to_html cdn, per chart", previous("cdn")),
+        ("to_html inline, per chart", previous(True)),
+        ("html, per chart", per_chart("html")),
+        ("html.gz, per chart", per_chart("html.gz")),
+        ("json, per chart", per_chart("json")),
+        ("html dashboard", dashboard("html")),
+        ("html.gz dashboard", dashboard("html.gz")),
+        ("json dashboard", dashboard("json")),
+    ]
+    print(f"{args.charts} charts; offline unless noted. Files written to {output_dir}")
+    print(f"{'export':<28}{'total KiB':>12}{'first ms':>10}{'next ms':>10}")
+    for name, fn in cases:
+        size, first, following = timed(fn, args.repeat)
+        print(f"{name:<28}{size / 1024:12.0f}{first:10.1f}{following:10.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
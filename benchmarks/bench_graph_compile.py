@@ -0,0 +1,51 @@
+"""
+Per-question graph setup latency: building the graph for every question (old app.py behaviour)
+versus fetching the compiled graph from the process-wide registry.
+
+Needs the same environment as the app (.env with OpenAI and BigQuery settings) because
+importing dataviz.graphbuilder creates the LLM client and database connection.
+
+Usage:
+    python benchmarks/bench_graph_compile.py --questions 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataviz.graphbuilder import build_graph, clear_graph_cache, get_graph
+
+
+def time_calls(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<28} mean={statistics.mean(timings):8.3f} ms  p50={statistics.median(timings):8.3f} ms  p95={p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100, help="number of simulated questions")
+    args = parser.parse_args()
+
+    report("before: build_graph()", time_calls(build_graph, args.questions))
+
+    clear_graph_cache()
+    first = time_calls(get_graph, 1)
+    report("after: get_graph() (cold)", first)
+    report("after: get_graph() (warm)", time_calls(get_graph, args.questions))
+
+
+if __name__ == "__main__":
+    main()
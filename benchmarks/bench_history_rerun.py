@@ -0,0 +1,101 @@
+"""
+Streamlit rerun time against chat history length, for the previous history rendering (every
+figure re-rendered and exported to HTML on each rerun) and the render cache (cached figures,
+HTML built on download, older messages collapsed). Runs the rendering in streamlit's AppTest,
+so no browser or server is needed.
+
+Usage:
+    python benchmarks/bench_history_rerun.py [--lengths 10 50 100 200] [--reruns 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest
+
+
+def legacy_history():
+    # The history loop of app.py before the render cache
+    import streamlit as st
+
+    for message in st.session_state.messages:
+        if "chart" in message:
+            with st.container():
+                st.plotly_chart(message["chart"], use_container_width=True)
+                st.download_button(
+                    label="Download Chart as HTML",
+                    data=message["chart"].to_html(full_html=True, include_plotlyjs="cdn"),
+                    file_name=f"{message['content']}_chart.html",
+                    mime="text/html",
+                )
+        else:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+
+def cached_history():
+    import streamlit as st
+    from dataviz.render_cache import render_history
+
+    render_history(st.session_state.messages)
+
+
+def build_messages(length, cached):
+    """Alternating questions and chart answers, like a session of chart questions."""
+    import json
+    import plotly.express as px
+    from dataviz.render_cache import remember_figure
+    from dataviz.session_store import chart_message
+
+    messages = []
+    for i in range(length // 2):
+        messages.append({"role": "user", "content": f"Plot stock by brand, variant {i}"})
+        labels, values = ["Adidas", "Levi", "Nike", "Van Huesen"], [i, 2 * i, 3 * i, 4 * i]
+        chart = px.bar(x=labels, y=values, title=f"Bar Chart for Stock by Brand {i}")
+        label = f"Bar Chart for Stock by Brand {i}"
+        if cached:
+            viz_data = json.dumps({"chart_data": {"labels": labels, "values": [{"data": values, "label": "Stock"}],
+                                                  "title": f"Stock by Brand {i}", "x_label": "Brand"}})
+            message = chart_message(label, "bar", viz_data)
+            remember_figure(message, chart)
+            messages.append(message)
+        else:
+            messages.append({"role": "assistant", "content": label, "chart": chart})
+    return messages
+
+
+def rerun_ms(script, messages, reruns):
+    """Median duration of a script run with the given history already in the session."""
+    app = AppTest.from_function(script, default_timeout=120)
+    app.session_state["messages"] = messages
+    app.run()  # first run imports and warms up
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - start) * 1000)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 100, 200], help="history lengths (messages)")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'previous ms':>12} {'render cache ms':>16}")
+    for length in args.lengths:
+        legacy = rerun_ms(legacy_history, build_messages(length, cached=False), args.reruns)
+        cached = rerun_ms(cached_history, build_messages(length, cached=True), args.reruns)
+        print(f"{length:>8} {legacy:>12.1f} {cached:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
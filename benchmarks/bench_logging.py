@@ -0,0 +1,142 @@
+"""
+Time request threads spend logging graph step outputs, with the previous setup (whole steps
+formatted into the message, written synchronously by a FileHandler and a StreamHandler) and
+the queue based pipeline of dataviz.logging (compacted steps, written by a background thread).
+Both write to files in a temporary directory; --slow-ms adds a delay to every stream write to
+mimic a slow disk or a blocked stdout pipe.
+
+Usage:
+    python benchmarks/bench_logging.py [--threads 8] [--requests 50] [--rows 5000] [--slow-ms 0]
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+STEPS = ["write_query", "execute_query", "get_visualization", "transform_data_for_visualization_chain"]
+
+
+class SlowStream(io.TextIOWrapper):
+    """File stream whose writes take at least `delay` seconds."""
+
+    def __init__(self, path, delay):
+        super().__init__(open(path, "wb"), encoding="utf-8")
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().write(text)
+
+
+def step_outputs(rows):
+    """Graph steps of one visualization question, with a result of `rows` rows."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"brand": rng.choice(["Adidas", "Levi", "Nike"], rows), "stock": rng.integers(0, 100, rows)})
+    result = str([tuple(row) for row in df.itertuples(index=False)])
+    viz_data = '{"chart_data": {"labels": %s, "values": [{"data": %s}]}}' % (
+        list(df["brand"][:2000]), list(df["stock"][:2000])
+    )
+    outputs = {
+        "write_query": {"query": "SELECT brand, stock_quantity FROM t_shirts"},
+        "execute_query": {"result": result, "result_df": df, "result_truncated": False},
+        "get_visualization": {"answer": "Recommended Visualization: bar\nReason: Compares stock across brands."},
+        "transform_data_for_visualization_chain": {"viz_data": viz_data, "chart_type": "bar"},
+    }
+    return [{step: outputs[step]} for step in STEPS]
+
+
+def previous_logger(workdir, delay):
+    logger = logging.getLogger("bench.previous")
+    logger.propagate = False
+    formatter = logging.Formatter("[%(asctime)s: %(levelname)s: %(module)s: %(message)s]")
+    for handler in (logging.FileHandler(os.path.join(workdir, "previous.log")),
+                    logging.StreamHandler(SlowStream(os.path.join(workdir, "previous.stdout"), delay))):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def run(log_request, threads, requests):
+    """Per-request logging time in ms, across `threads` threads each handling `requests` requests."""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(requests):
+            start = time.perf_counter()
+            log_request()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def report(name, latencies, elapsed):
+    from dataviz.metrics import percentile
+    print(f"{name:<10} per request ms: p50={percentile(latencies, 50):8.2f} p95={percentile(latencies, 95):8.2f} "
+          f"max={max(latencies):8.2f}  wall {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="request threads")
+    parser.add_argument("--requests", type=int, default=50, help="requests handled by each thread")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in the logged query result")
+    parser.add_argument("--slow-ms", type=float, default=0, help="delay added to every stream write")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dataviz_logging_bench_")
+    os.environ["LOG_DIR"] = workdir
+    # Imported after LOG_DIR is set so the application log also goes to the temporary directory
+    from dataviz.logging import compact, configure_logging
+    from dataviz.metrics import metrics
+
+    steps = step_outputs(args.rows)
+    print(f"logged step outputs: {sum(len(str(step)) for step in steps) / 1024:.0f} KiB per request")
+
+    previous = previous_logger(workdir, args.slow_ms / 1000)
+
+    def log_previous():
+        for step in steps:
+            previous.info(f"Output of step {step}")
+
+    report("previous", *run(log_previous, args.threads, args.requests))
+
+    queued = logging.getLogger("bench.queued")
+    queued.propagate = False
+    stream = SlowStream(os.path.join(workdir, "queued.stdout"), args.slow_ms / 1000)
+    listener = configure_logging(queued, "INFO", os.path.join(workdir, "queued.log"), stream)
+
+    def log_queued():
+        for step in steps:
+            queued.info("Output of step %s", compact(step))
+
+    report("queued", *run(log_queued, args.threads, args.requests))
+    start = time.perf_counter()
+    listener.stop()
+    print(f"queue drained in {(time.perf_counter() - start) * 1000:.1f} ms after the requests, "
+          f"{metrics.counter('logging.dropped'):.0f} records dropped")
+    for name in ("previous.log", "queued.log"):
+        print(f"{name:<13} {os.path.getsize(os.path.join(workdir, name)) / 1024 / 1024:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
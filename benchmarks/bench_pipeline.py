@@ -0,0 +1,271 @@
+"""
+End-to-end benchmark of the question answering graph, offline: the LLM is a fake chat model
+replaying recorded replies (fixtures/pipeline_responses.json) with a configurable latency, and
+the warehouse is a seeded SQLite or DuckDB copy of t_shirts/discounts at each requested scale.
+
+Every scenario of the selected suites (text and one per chart type) is asked --repeat times,
+--concurrency at once, after one warm-up run. The report has end-to-end latency, throughput,
+tokens per question, peak Python memory of one run and p50/p95 per graph node. --output saves
+the results as JSON and --compare checks them against a saved run, exiting with status 1 when a
+metric regressed by more than --threshold.
+
+Usage:
+    python benchmarks/bench_pipeline.py --scales 1k,100k,1M --output run.json
+    python benchmarks/bench_pipeline.py --scales 10M --format duckdb   # needs a duckdb-engine matching SQLAlchemy
+    python benchmarks/bench_pipeline.py --scales 1k,100k --compare run.json --threshold 0.15
+    python benchmarks/bench_pipeline.py --suites bar,scatter --llm-latency 0.3 --token-latency 0.01
+    python benchmarks/bench_pipeline.py --record   # re-record the fixtures with the configured OpenAI model
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from seed_data import create_duckdb_dataset, create_sqlite_dataset
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pipeline_responses.json")
+SUITES = ["text", "bar", "stacked bar", "pie", "histogram", "scatter"]
+# The graph configuration of app.py without cache_queries and follow_ups, so every repeat runs
+# the whole pipeline instead of hitting the query cache, and the plain sequential graph for comparison
+GRAPH_CONFIGS = {
+    "app": {"typed_results": True, "parallel_viz": True, "async_nodes": True, "validate_queries": True},
+    "sequential": {},
+}
+# Metrics compared against a baseline; throughput is the only one where higher is better
+LOWER_IS_BETTER = ["e2e_p50_ms", "e2e_p95_ms", "tokens_per_question", "peak_memory_mb"]
+HIGHER_IS_BETTER = ["throughput_qps"]
+# Settings that make two runs incomparable when they differ
+COMPARED_SETTINGS = ["format", "config", "concurrency", "llm_latency", "token_latency"]
+
+
+def parse_scale(text):
+    """'1k' -> 1000, '10M' -> 10000000."""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1k,100k", help="comma separated t_shirts row counts, e.g. 1k,100k,1M,10M")
+    parser.add_argument("--format", choices=["sqlite", "duckdb"], default="sqlite", help="warehouse stand-in")
+    parser.add_argument("--data-dir", default="bench_data", help="where seeded datasets are kept and reused")
+    parser.add_argument("--suites", default=",".join(SUITES), help="comma separated: " + ", ".join(SUITES))
+    parser.add_argument("--config", choices=sorted(GRAPH_CONFIGS), default="app", help="graph configuration")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of every scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="runs of a scenario in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed fake tokens")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="recorded LLM replies")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change reported as a regression")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="latencies below this are too noisy to compare")
+    parser.add_argument("--record", action="store_true", help="record --fixtures with the real LLM instead of benchmarking")
+    return parser.parse_args()
+
+
+def dataset_path(args, rows):
+    """Seeds the dataset for `rows` unless an earlier run left it in --data-dir."""
+    extension = "duckdb" if args.format == "duckdb" else "db"
+    path = os.path.abspath(os.path.join(args.data_dir, f"shop_{rows}.{extension}"))
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        (create_duckdb_dataset if args.format == "duckdb" else create_sqlite_dataset)(path, rows)
+        print(f"seeded {rows} rows into {path} in {time.perf_counter() - start:.1f} s")
+    return path
+
+
+def use_dataset(args, path):
+    """Points the shared database resource at `path`, dropping the resources built for another scale."""
+    from dataviz.resources import resources
+
+    os.environ["DATABASE_URL"] = f"{args.format}:///{path}"
+    resources.shutdown()
+
+
+def load_scenarios(args):
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    suites = [suite.strip() for suite in args.suites.split(",")]
+    return [scenario for scenario in scenarios if scenario["suite"] in suites]
+
+
+async def timed_runs(graph, question, repeat, concurrency):
+    """End-to-end latencies (ms) of `repeat` runs of the question, and the wall time of all of them."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run_once(index):
+        async with semaphore:
+            start = time.perf_counter()
+            await graph.ainvoke({"question": question}, {"configurable": {"session_id": f"bench-{index}"}})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_once(i) for i in range(repeat)))
+    return latencies, time.perf_counter() - start
+
+
+def peak_memory_mb(graph, question):
+    """Peak Python allocations of one run, in MiB."""
+    tracemalloc.start()
+    try:
+        asyncio.run(graph.ainvoke({"question": question}, {"configurable": {"session_id": "bench-memory"}}))
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(graph, scenario, args):
+    from dataviz.metrics import metrics, percentile
+    from dataviz.telemetry import node_report
+
+    # The warm-up run fills the schema cache and the connection pool
+    asyncio.run(graph.ainvoke({"question": scenario["question"]}, {"configurable": {"session_id": "bench-warm-up"}}))
+    metrics.reset()
+    latencies, elapsed = asyncio.run(timed_runs(graph, scenario["question"], args.repeat, args.concurrency))
+    nodes = node_report()
+    tokens = sum(
+        fields[field]["p50"] for fields in nodes.values()
+        for field in ("prompt_tokens", "completion_tokens") if field in fields
+    )
+    return {
+        "e2e_p50_ms": percentile(latencies, 50),
+        "e2e_p95_ms": percentile(latencies, 95),
+        "throughput_qps": len(latencies) / elapsed,
+        "tokens_per_question": tokens,
+        "peak_memory_mb": peak_memory_mb(graph, scenario["question"]),
+        "nodes": {node: {"p50_ms": fields["ms"]["p50"], "p95_ms": fields["ms"]["p95"]} for node, fields in nodes.items()},
+    }
+
+
+def print_results(results):
+    print(f"\n{'scenario':<48}{'e2e p50':>10}{'e2e p95':>10}{'q/s':>8}{'tokens':>8}{'peak MiB':>10}")
+    for key, result in results.items():
+        print(f"{key:<48}{result['e2e_p50_ms']:>10.1f}{result['e2e_p95_ms']:>10.1f}{result['throughput_qps']:>8.2f}"
+              f"{result['tokens_per_question']:>8.0f}{result['peak_memory_mb']:>10.1f}")
+        for node, timing in result["nodes"].items():
+            print(f"    {node:<44}{timing['p50_ms']:>10.1f}{timing['p95_ms']:>10.1f}")
+
+
+def compare(results, baseline, threshold, min_ms):
+    """Prints the metrics that changed by more than `threshold` and returns the regressions."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        checks = [(name, result[name], previous[name], True) for name in LOWER_IS_BETTER]
+        checks += [(name, result[name], previous[name], False) for name in HIGHER_IS_BETTER]
+        for node, timing in result["nodes"].items():
+            if node in previous["nodes"] and previous["nodes"][node]["p50_ms"] >= min_ms:
+                checks.append((f"{node} p50_ms", timing["p50_ms"], previous["nodes"][node]["p50_ms"], True))
+        for name, value, before, lower_is_better in checks:
+            if not before or (name.endswith("_ms") and before < min_ms):
+                continue
+            change = (value - before) / before
+            worse = change > threshold if lower_is_better else change < -threshold
+            better = change < -threshold if lower_is_better else change > threshold
+            if worse or better:
+                label = "REGRESSION" if worse else "improved"
+                print(f"{label:<11} {key} {name}: {before:.2f} -> {value:.2f} ({change:+.0%})")
+            if worse:
+                regressions.append((key, name))
+    return regressions
+
+
+def record(args, scenarios):
+    """
+    Runs the scenarios with the real LLM and saves its replies per node into the fixtures file.
+    Both graph configurations are run, so visualization questions get a get_visualization reply
+    (sequential graph) and a generate_answer reply (app graph).
+    """
+    from dataviz.graphbuilder import get_graph
+
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    graphs = [get_graph(**GRAPH_CONFIGS[name]) for name in ("sequential", "app")]
+    for scenario in scenarios:
+        responses = {}
+        for graph in graphs:
+            config = {"configurable": {"session_id": "record"}}
+            for step in asyncio.run(collect_steps(graph, scenario["question"], config)):
+                for node, output in step.items():
+                    if node == "write_query":
+                        responses.setdefault(node, output["query"])
+                    elif node in ("generate_answer", "get_visualization"):
+                        responses.setdefault(node, output["answer"])
+                    elif node in ("transform_data_for_visualization_chain", "recommend_chart") and output.get("viz_data"):
+                        # The parallel graph shapes the chart inside recommend_chart
+                        responses.setdefault("transform_data_for_visualization_chain", output["viz_data"])
+        # Scenarios are matched by name, so suites left out of --suites keep their recordings
+        for fixture in fixtures["scenarios"]:
+            if fixture["name"] == scenario["name"]:
+                fixture["responses"] = responses
+        print(f"recorded {scenario['name']}: {', '.join(responses)}")
+    with open(args.fixtures, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=2)
+
+
+async def collect_steps(graph, question, config):
+    return [step async for step in graph.astream({"question": question}, config)]
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="dataviz_pipeline_bench_")
+    os.environ["SCHEMA_CACHE_PATH"] = os.path.join(workdir, "schema_cache.json")
+    os.environ["QUERY_CACHE_BACKEND"] = "memory"
+    os.environ["LOG_DIR"] = workdir
+    os.environ.setdefault("OPENAI_API_KEY", "not-used")
+    scales = [parse_scale(scale) for scale in args.scales.split(",")]
+    scenarios = load_scenarios(args)
+
+    # Imported after the environment is configured so the graph picks up the local dataset
+    from fakes import FakeChatModel
+    from dataviz.graphbuilder import get_graph
+    from dataviz.resources import resources
+
+    if args.record:
+        use_dataset(args, dataset_path(args, scales[0]))
+        record(args, scenarios)
+        return
+
+    results = {}
+    for rows in scales:
+        use_dataset(args, dataset_path(args, rows))
+        resources.override("llm", FakeChatModel.from_fixtures(
+            args.fixtures, latency=args.llm_latency, token_latency=args.token_latency
+        ))
+        graph = get_graph(**GRAPH_CONFIGS[args.config])
+        for scenario in scenarios:
+            results[f"{rows}/{scenario['suite']}/{scenario['name']}"] = run_scenario(graph, scenario, args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": {**vars(args), "python": platform.python_version(), "time": time.time()},
+                       "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.compare} (threshold {args.threshold:.0%}):")
+        for setting in COMPARED_SETTINGS:
+            if baseline["meta"].get(setting) != getattr(args, setting):
+                print(f"warning: {setting} was {baseline['meta'].get(setting)!r} in the baseline")
+        regressions = compare(results, baseline["results"], args.threshold, args.min_ms)
+        print(f"{len(regressions)} regressions")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Accuracy and speed of question routing: the keyword matching get_flow used before against the
+TF-IDF router of dataviz.router, by k-fold cross-validation over labelled questions (the
+bundled seed questions, plus any JSONL files given), and the router's training, loading and
+per-question prediction time.
+
+Usage:
+    python benchmarks/bench_router.py [--folds 5] [--examples results.jsonl ...]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataviz.metrics import percentile
+from dataviz.router import (ROUTER_MIN_CONFIDENCE, SEED_QUESTIONS_PATH, KeywordRouter, TfidfRouter,
+                            load_examples)
+
+
+def cross_validate(examples, folds, seed=0):
+    """Route accuracy of both routers, and chart type accuracy of the TF-IDF router overall and when confident."""
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    keywords = KeywordRouter()
+    counts = dict(routes=0, keyword_routes=0, model_routes=0, charts=0, chart_types=0, confident=0, confident_correct=0)
+    for fold in range(folds):
+        test = examples[fold::folds]
+        router = TfidfRouter.train([example for index, example in enumerate(examples) if index % folds != fold])
+        for example in test:
+            route = router.predict(example["question"])
+            if example.get("route"):
+                counts["routes"] += 1
+                counts["keyword_routes"] += keywords.predict(example["question"]).route == example["route"]
+                counts["model_routes"] += route.route == example["route"]
+            if example.get("chart_type"):
+                counts["charts"] += 1
+                counts["chart_types"] += route.chart_type == example["chart_type"]
+                if route.chart_confidence >= ROUTER_MIN_CONFIDENCE:
+                    counts["confident"] += 1
+                    counts["confident_correct"] += route.chart_type == example["chart_type"]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds")
+    parser.add_argument("--examples", nargs="*", default=[], help="more labelled JSONL files (see load_examples)")
+    args = parser.parse_args()
+
+    examples = load_examples(SEED_QUESTIONS_PATH)
+    for path in args.examples:
+        examples += load_examples(path)
+    counts = cross_validate(examples, args.folds)
+    print(f"{len(examples)} questions, {args.folds}-fold cross-validation")
+    print(f"route accuracy ({counts['routes']} labelled routes): keywords {counts['keyword_routes'] / counts['routes']:.1%}, "
+          f"tf-idf {counts['model_routes'] / counts['routes']:.1%}")
+    if counts["charts"]:
+        confident = counts["confident"]
+        print(f"chart type accuracy: {counts['chart_types'] / counts['charts']:.1%}; "
+              f"{confident}/{counts['charts']} guesses >= {ROUTER_MIN_CONFIDENCE} confidence skip the "
+              f"recommendation, {counts['confident_correct'] / max(confident, 1):.1%} of them correct")
+
+    start = time.perf_counter()
+    router = TfidfRouter.train(examples)
+    train_ms = (time.perf_counter() - start) * 1000
+    path = os.path.join(tempfile.mkdtemp(prefix="dataviz_router_bench_"), "router_model.json")
+    router.save(path)
+    start = time.perf_counter()
+    router = TfidfRouter.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    latencies = []
+    for example in examples * 10:
+        start = time.perf_counter()
+        router.predict(example["question"])
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"train {train_ms:.0f} ms, load {load_ms:.1f} ms ({os.path.getsize(path) / 1024:.0f} KiB), "
+          f"predict p50 {percentile(latencies, 50):.3f} ms p95 {percentile(latencies, 95):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Memory held by one chat session of 200 messages (100 questions, 100 charts of every type),
+stored the previous way (Plotly figure objects in the message list) and as compact chart
+specs in a MessageStore, plus the cost of rebuilding a figure from its spec when it is not
+in the shared figure cache.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--messages 200] [--points 500]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+from dataviz.chart_data import build_chart_data
+from dataviz.session_store import MessageStore, chart_message
+from dataviz.utils import build_figure
+
+CHART_TYPES = ["bar", "stacked bar", "pie", "histogram", "scatter"]
+
+
+def sample_frame(chart_type, points, rng):
+    """A query result with the layout build_chart_data expects for the chart type."""
+    brands = ["Adidas", "Levi", "Nike", "Van Huesen"]
+    if chart_type in ("bar", "pie"):
+        return pd.DataFrame({"brand": brands, "stock": rng.integers(0, 500, len(brands))})
+    if chart_type == "stacked bar":
+        colors, sizes = ["Red", "Blue", "Black", "White"], ["XS", "S", "M", "L", "XL"]
+        rows = [(color, size, int(rng.integers(0, 100))) for color in colors for size in sizes]
+        return pd.DataFrame(rows, columns=["color", "size", "stock"])
+    if chart_type == "histogram":
+        return pd.DataFrame({"price": rng.integers(10, 50, points)})
+    return pd.DataFrame({"price": rng.integers(10, 50, points), "stock": rng.integers(0, 100, points)})
+
+
+def chart_answers(count, points):
+    """(label, chart type, viz_data) of `count` chart answers, cycling through the chart types."""
+    rng = np.random.default_rng(0)
+    answers = []
+    for i in range(count):
+        chart_type = CHART_TYPES[i % len(CHART_TYPES)]
+        viz_data = json.dumps(build_chart_data(chart_type, sample_frame(chart_type, points, rng), f"question {i}"))
+        answers.append((f"{chart_type} chart {i}", chart_type, viz_data))
+    return answers
+
+
+def measure(build):
+    """Memory still allocated after build(), while the session it returns is kept alive."""
+    tracemalloc.start()
+    session = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return session, current
+
+
+def figures_session(answers):
+    messages = [{"role": "assistant", "content": "How can I help you?"}]
+    for i, (label, chart_type, viz_data) in enumerate(answers):
+        messages.append({"role": "user", "content": f"Question {i}"})
+        chart, chart_label = build_figure(viz_data, chart_type)
+        messages.append({"role": "assistant", "content": chart_label, "chart": chart})
+    return messages
+
+
+def specs_session(answers):
+    messages = MessageStore([{"role": "assistant", "content": "How can I help you?"}])
+    for i, (label, chart_type, viz_data) in enumerate(answers):
+        messages.append({"role": "user", "content": f"Question {i}"})
+        messages.append(chart_message(label, chart_type, viz_data))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="messages in the session")
+    parser.add_argument("--points", type=int, default=500, help="observations of histogram and scatter charts")
+    args = parser.parse_args()
+
+    answers = chart_answers(args.messages // 2, args.points)
+    # Build one figure first so plotly's lazy imports are not counted as session memory
+    build_figure(answers[0][2], answers[0][1])
+
+    _, figures_bytes = measure(lambda: figures_session(answers))
+    specs, specs_bytes = measure(lambda: specs_session(answers))
+    print(f"figure objects  {figures_bytes / 1024:10.1f} KiB")
+    print(f"chart specs     {specs_bytes / 1024:10.1f} KiB ({figures_bytes / max(specs_bytes, 1):.0f}x smaller, "
+          f"{len(specs)} messages, ~{specs.nbytes / 1024:.1f} KiB counted against SESSION_MAX_BYTES)")
+
+    for chart_type in CHART_TYPES:
+        message = next(message for message in specs if message.get("chart_type") == chart_type)
+        start = time.perf_counter()
+        build_figure(message["chart_spec"], chart_type)
+        print(f"rebuild {chart_type:<12} {(time.perf_counter() - start) * 1000:8.1f} ms (figure cache miss)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Startup cost of the app: importing dataviz.graphbuilder in a fresh interpreter, loading and
+compiling every prompt from the local registry, and optionally creating the LLM client and
+database engine (needs the app's .env) or pulling the SQL prompt from LangChain Hub (needs
+network access) for comparison.
+
+Usage:
+    python benchmarks/bench_startup.py [--warm-up] [--hub] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import dataviz.graphbuilder; "
+    "print((time.perf_counter() - start) * 1000)"
+)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def import_time_ms(runs):
+    """Median import time of dataviz.graphbuilder, each run in a new interpreter."""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, text=True)
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters used for the import timing")
+    parser.add_argument("--warm-up", action="store_true", help="also time creating the LLM client and database")
+    parser.add_argument("--hub", action="store_true", help="also time hub.pull of the SQL prompt")
+    args = parser.parse_args()
+
+    print(f"import dataviz.graphbuilder     {import_time_ms(args.runs):8.1f} ms (median of {args.runs})")
+
+    from dataviz.prompts import HUB_SQL_PROMPT, clear_compiled_prompts, precompile_prompts
+    from dataviz.resources import resources
+
+    clear_compiled_prompts()
+    print(f"precompile_prompts (cold)       {timed(precompile_prompts):8.1f} ms")
+    print(f"precompile_prompts (warm)       {timed(precompile_prompts):8.3f} ms")
+    if args.warm_up:
+        for name in ("llm", "db", "schema_cache", "query_cache"):
+            print(f"resource {name:<22} {timed(lambda: resources.get(name)):8.1f} ms")
+        resources.shutdown()
+    if args.hub:
+        from langchain import hub
+        print(f"hub.pull({HUB_SQL_PROMPT})  {timed(lambda: hub.pull(HUB_SQL_PROMPT)):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenAI used for load tests, benchmarks and tests.
+
+    Replies are picked from the prompt: the visualization prompt gets `recommendation`, the data
+    transform prompt gets `transform_reply`, structured output (write_query) gets `sql` and
+    everything else gets `answer`. Every call sleeps for `latency` seconds to mimic a remote model; when
+    streamed, replies are split into words with `token_latency` seconds between them. Token
+    usage is reported in words, in usage_metadata like OpenAI models do.
+
+    `fixtures` replays recorded replies: a list of {"question": ..., "responses": {node: reply}}
+    where node is write_query, generate_answer, get_visualization or
+    transform_data_for_visualization_chain. A prompt containing a fixture's question gets that
+    fixture's reply for the node, and the defaults above otherwise.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    sql: str = "SELECT brand, SUM(stock_quantity) AS total_stock FROM t_shirts GROUP BY brand"
+    answer: str = "Adidas has the most t shirts in stock."
+    recommendation: str = "Recommended Visualization: bar\nReason: Compares stock across brands."
+    transform_reply: str = '{"chart_data": {"labels": ["Adidas"], "values": [{"data": [1], "label": "Stock"}], "title": "Stock", "x_label": "Brand"}}'
+    fixtures: list = []
+    # Set on the copy returned by with_structured_output, which answers with `sql`
+    structured: bool = False
+
+    @classmethod
+    def from_fixtures(cls, path, **kwargs):
+        """A fake model replaying the recorded replies of a fixtures file ({"scenarios": [...]})."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(fixtures=json.load(f)["scenarios"], **kwargs)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _recorded(self, text):
+        # Longest question first, so a question that contains another one is matched first
+        for fixture in sorted(self.fixtures, key=lambda fixture: -len(fixture["question"])):
+            if fixture["question"] in text:
+                return fixture["responses"]
+        return {}
+
+    def _respond(self, messages):
+        text = "\n".join(str(message.content) for message in messages)
+        recorded = self._recorded(text)
+        if self.structured:
+            return recorded.get("write_query", self.sql)
+        if "Recommended Visualization:" in text:
+            return recorded.get("get_visualization", self.recommendation)
+        if "data transformation expert" in text:
+            return recorded.get("transform_data_for_visualization_chain", self.transform_reply)
+        return recorded.get("generate_answer", self.answer)
+
+    def _usage(self, messages, reply):
+        prompt_tokens = sum(len(str(message.content).split()) for message in messages)
+        completion_tokens = len(reply.split())
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _result(self, messages):
+        reply = self._respond(messages)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def _tokens(self, messages):
+        words = self._respond(messages).split(" ")
+        return [word if i == len(words) - 1 else word + " " for i, word in enumerate(words)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        # Like OpenAI with stream_usage, the usage comes in a last empty chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(messages, self._respond(messages))
+        ))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        # Like OpenAI with stream_usage, the usage comes in a last empty chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(messages, self._respond(messages))
+        ))
+
+    def with_structured_output(self, schema, **kwargs):
+        # The SQL goes through the model like any reply, so latency and token usage apply to it too
+        structured_model = self.model_copy(update={"structured": True})
+        return structured_model | RunnableLambda(lambda message: {"query": message.content})
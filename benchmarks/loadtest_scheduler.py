@@ -0,0 +1,89 @@
+"""
+Load test for the async graph and the shared LLM/warehouse scheduler, using the fake chat
+model and a local SQLite copy of t_shirts/discounts (no OpenAI or BigQuery access needed).
+
+Usage:
+    python benchmarks/loadtest_scheduler.py --sessions 50 --questions 5 --llm-latency 0.2 \
+        --max-llm 8 --max-warehouse 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from seed_data import create_sqlite_dataset
+
+QUESTIONS = [
+    "How many t shirts do we have in stock?",
+    "Plot a chart of stock quantity by brand",
+    "What is the total price of all small t shirts?",
+    "Show a graph of t shirt count by color",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent chat sessions")
+    parser.add_argument("--questions", type=int, default=5, help="questions asked by each session")
+    parser.add_argument("--rows", type=int, default=10000, help="t shirts in the SQLite dataset")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--max-llm", type=int, default=8)
+    parser.add_argument("--max-warehouse", type=int, default=4)
+    return parser.parse_args()
+
+
+async def run_session(graph, session_id, questions, latencies):
+    config = {"configurable": {"session_id": session_id}}
+    for question in questions:
+        start = time.perf_counter()
+        async for _ in graph.astream({"question": question}, config):
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(args):
+    # Imported after the environment is configured so the graph picks up SQLite and the limits
+    import dataviz.graphbuilder as graphbuilder
+    from fakes import FakeChatModel
+    from dataviz.metrics import metrics, percentile
+    from dataviz.resources import resources
+    from dataviz.telemetry import format_node_report
+
+    resources.override("llm", FakeChatModel(latency=args.llm_latency))
+    graph = graphbuilder.get_graph(typed_results=True, parallel_viz=True, async_nodes=True)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_session(graph, f"session-{i}", [QUESTIONS[(i + j) % len(QUESTIONS)] for j in range(args.questions)], latencies)
+        for i in range(args.sessions)
+    ])
+    elapsed = time.perf_counter() - start
+
+    print(f"questions: {len(latencies)} in {elapsed:.2f} s ({len(latencies) / elapsed:.1f} questions/s)")
+    print(f"latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} max={max(latencies):.1f}")
+    for name in ("scheduler.llm.queue_wait_ms", "scheduler.warehouse.queue_wait_ms", "db.pool.checkout_wait_ms", "db.query_ms"):
+        summary = metrics.summary(name)
+        print(f"{name}: p50={summary['p50']:.1f} p95={summary['p95']:.1f} max={summary['max']:.1f}")
+    print(format_node_report())
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="dataviz_loadtest_")
+    db_path = create_sqlite_dataset(os.path.join(workdir, "shop.db"), args.rows)
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = db_path
+    os.environ["SCHEMA_CACHE_PATH"] = os.path.join(workdir, "schema_cache.json")
+    os.environ["MAX_INFLIGHT_LLM"] = str(args.max_llm)
+    os.environ["MAX_INFLIGHT_WAREHOUSE"] = str(args.max_warehouse)
+    os.environ.setdefault("OPENAI_API_KEY", "not-used")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
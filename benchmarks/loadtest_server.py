@@ -0,0 +1,127 @@
+"""
+Load test for the ASGI service (dataviz/server.py) over real HTTP, using the fake chat model
+and a local SQLite copy of t_shirts/discounts. Clients ask questions from a small pool, so
+many requests are simultaneous duplicates that the server coalesces into one graph run.
+
+Usage:
+    python benchmarks/loadtest_server.py --clients 50 --requests 4 --distinct 5 --llm-latency 0.2 [--stream]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+import uvicorn
+from seed_data import create_sqlite_dataset
+
+QUESTIONS = [
+    "How many t shirts do we have in stock?",
+    "Plot a chart of stock quantity by brand",
+    "What is the total price of all small t shirts?",
+    "Show a graph of t shirt count by color",
+    "Which brand has the most discounted t shirts?",
+    "Plot a pie chart of stock by size",
+    "What is the average price of Nike t shirts?",
+    "Draw a histogram of prices",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50, help="concurrent HTTP clients")
+    parser.add_argument("--requests", type=int, default=4, help="questions asked by each client")
+    parser.add_argument("--distinct", type=int, default=5, help="distinct questions in the pool (at most 8)")
+    parser.add_argument("--rows", type=int, default=10000, help="t shirts in the SQLite dataset")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--stream", action="store_true", help="use /ask/stream and report time to first token")
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    """Runs uvicorn in a daemon thread and waits until it accepts requests."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def ask(client, question, stream, latencies, ttfts):
+    start = time.perf_counter()
+    if stream:
+        async with client.stream("POST", "/ask/stream", json={"question": question}) as response:
+            async for line in response.aiter_lines():
+                if '"type": "token"' in line and len(ttfts) < len(latencies) + 1:
+                    ttfts.append((time.perf_counter() - start) * 1000)
+    else:
+        response = await client.post("/ask", json={"question": question})
+        response.raise_for_status()
+    latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_client(client, index, args, latencies, ttfts):
+    for j in range(args.requests):
+        await ask(client, QUESTIONS[(index + j) % args.distinct], args.stream, latencies, ttfts)
+
+
+async def run(args, base_url):
+    from dataviz.metrics import metrics, percentile
+    from dataviz.telemetry import format_node_report
+
+    latencies, ttfts = [], []
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[run_client(client, i, args, latencies, ttfts) for i in range(args.clients)])
+        elapsed = time.perf_counter() - start
+
+    print(f"requests: {len(latencies)} in {elapsed:.2f} s ({len(latencies) / elapsed:.1f} requests/s)")
+    print(f"latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} max={max(latencies):.1f}")
+    if ttfts:
+        print(f"time to first token ms: p50={percentile(ttfts, 50):.1f} p95={percentile(ttfts, 95):.1f}")
+    runs, coalesced = metrics.counter("server.runs"), metrics.counter("server.coalesced")
+    print(f"graph runs: {runs:.0f}, coalesced requests: {coalesced:.0f}, "
+          f"errors: {metrics.counter('server.errors'):.0f}, rejected: {metrics.counter('server.rejected'):.0f}")
+    print(format_node_report())
+
+
+def main():
+    args = parse_args()
+    args.distinct = max(1, min(args.distinct, len(QUESTIONS)))
+    workdir = tempfile.mkdtemp(prefix="dataviz_server_loadtest_")
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = create_sqlite_dataset(os.path.join(workdir, "shop.db"), args.rows)
+    os.environ["SCHEMA_CACHE_PATH"] = os.path.join(workdir, "schema_cache.json")
+    os.environ["QUERY_CACHE_BACKEND"] = "memory"
+    os.environ.setdefault("OPENAI_API_KEY", "not-used")
+
+    # Imported after the environment is configured so the server picks up SQLite
+    from fakes import FakeChatModel
+    from dataviz.resources import resources
+    from dataviz.server import SERVER_GRAPH_CONFIG, create_app
+
+    resources.override("llm", FakeChatModel(latency=args.llm_latency))
+    # Without the query cache every coalesced group is a full run, so the numbers show coalescing alone
+    port = free_port()
+    server = start_server(create_app({**SERVER_GRAPH_CONFIG, "cache_queries": False}), port)
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Seeded t_shirts/discounts datasets for load tests and benchmarks.
+
+Usage:
+    python benchmarks/seed_data.py --rows 100000 --path bench_data/shop.db
+    python benchmarks/seed_data.py --rows 10000000 --path bench_data/shop.duckdb --format duckdb
+"""
+import argparse
+import os
+import random
+import sqlite3
+
+BRANDS = ["Van Huesen", "Levi", "Nike", "Adidas"]
+COLORS = ["Red", "Blue", "Black", "White"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+DISCOUNTS = [10, 15, 20, 25, 30, 35, 40, 45, 50]
+
+# Fraction of t shirts that have a row in the discounts table
+DISCOUNTED_FRACTION = 0.1
+
+
+def create_sqlite_dataset(path, rows=1000, seed=0, batch_size=50000):
+    """Creates (or replaces) a SQLite database with `rows` t shirts and matching discounts."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE t_shirts (
+            t_shirt_id INTEGER PRIMARY KEY, brand TEXT, color TEXT, size TEXT, price INTEGER, stock_quantity INTEGER
+        );
+        CREATE TABLE discounts (
+            discount_id INTEGER PRIMARY KEY, t_shirt_id INTEGER, pct_discount REAL
+        );
+        """
+    )
+    discount_id = 0
+    for start in range(1, rows + 1, batch_size):
+        stop = min(start + batch_size, rows + 1)
+        t_shirts = [
+            (i, rng.choice(BRANDS), rng.choice(COLORS), rng.choice(SIZES), rng.randint(10, 50), rng.randint(10, 100))
+            for i in range(start, stop)
+        ]
+        discounts = []
+        for i in range(start, stop):
+            if rng.random() < DISCOUNTED_FRACTION:
+                discount_id += 1
+                discounts.append((discount_id, i, rng.choice(DISCOUNTS)))
+        connection.executemany("INSERT INTO t_shirts VALUES (?, ?, ?, ?, ?, ?)", t_shirts)
+        connection.executemany("INSERT INTO discounts VALUES (?, ?, ?)", discounts)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def create_duckdb_dataset(path, rows=1000, seed=0):
+    """
+    Creates (or replaces) a DuckDB database with `rows` t shirts and matching discounts. The rows
+    are generated inside DuckDB from hashes of the row number, so 10M rows take seconds; the
+    values have the same ranges as create_sqlite_dataset but not the same rows.
+    """
+    import duckdb
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    connection = duckdb.connect(path)
+    connection.execute(
+        f"""
+        CREATE TABLE t_shirts AS
+        SELECT i AS t_shirt_id,
+               ($brands)[CAST(1 + hash(i, {seed}, 1) % {len(BRANDS)} AS BIGINT)] AS brand,
+               ($colors)[CAST(1 + hash(i, {seed}, 2) % {len(COLORS)} AS BIGINT)] AS color,
+               ($sizes)[CAST(1 + hash(i, {seed}, 3) % {len(SIZES)} AS BIGINT)] AS size,
+               CAST(10 + hash(i, {seed}, 4) % 41 AS INTEGER) AS price,
+               CAST(10 + hash(i, {seed}, 5) % 91 AS INTEGER) AS stock_quantity
+        FROM range(1, {rows} + 1) AS r(i)
+        """,
+        {"brands": BRANDS, "colors": COLORS, "sizes": SIZES},
+    )
+    connection.execute(
+        f"""
+        CREATE TABLE discounts AS
+        SELECT CAST(row_number() OVER (ORDER BY t_shirt_id) AS INTEGER) AS discount_id, t_shirt_id,
+               CAST(($discounts)[CAST(1 + hash(t_shirt_id, {seed}, 7) % {len(DISCOUNTS)} AS BIGINT)] AS DOUBLE) AS pct_discount
+        FROM t_shirts
+        WHERE hash(t_shirt_id, {seed}, 6) % 1000 < {int(DISCOUNTED_FRACTION * 1000)}
+        """,
+        {"discounts": DISCOUNTS},
+    )
+    connection.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--path", default=os.path.join("bench_data", "shop.db"))
+    parser.add_argument("--format", choices=["sqlite", "duckdb"], default="sqlite")
+    args = parser.parse_args()
+    if args.format == "duckdb":
+        create_duckdb_dataset(args.path, args.rows, args.seed)
+    else:
+        create_sqlite_dataset(args.path, args.rows, args.seed)
+    print(f"Wrote {args.rows} t shirts to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Headless batch runner: answers a file of questions with the compiled graph, outside Streamlit.
+
+    python -m dataviz.batch questions.txt --output reports/nightly --concurrency 8
+
+The questions file has one question per line (blank lines and lines starting with # are
+skipped), or is a .jsonl file of {"id": ..., "question": ...} objects. The output directory
+gets results.jsonl (question, SQL, answer, chart type and chart spec of every question), one
+export per chart named like the files in download_charts/ (--format, HTML by default)
+and dashboard.html with every chart, sharing one inlined plotly.js bundle.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from dataviz.export import EXPORT_FORMATS, write_export
+from dataviz.graphbuilder import warm_up
+from dataviz.metrics import metrics
+from dataviz.utils import build_figure
+
+# Graph used for batches: async nodes so questions run concurrently, identical SQL executed once
+BATCH_GRAPH_CONFIG = {"typed_results": True, "parallel_viz": True, "async_nodes": True,
+                      "validate_queries": True, "dedupe_queries": True}
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Per-chart files are HTML like the download_charts/ files; each embeds the ~4.7 MB plotly.js
+# bundle, so html.gz or json keep large batches small
+BATCH_EXPORT_FORMAT = os.getenv("BATCH_EXPORT_FORMAT", "html")
+RESULTS_FILE = "results.jsonl"
+DASHBOARD_FILE = "dashboard.html"
+
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\n\r\t]+')
+
+
+def load_questions(path):
+    """Reads a questions file into a list of {"id", "question"} dictionaries."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    if path.endswith(".jsonl"):
+        items = [json.loads(line) for line in lines if line]
+        return [{"id": str(item.get("id", index)), "question": item["question"]} for index, item in enumerate(items, 1)]
+    questions = [line for line in lines if line and not line.startswith("#")]
+    return [{"id": str(index), "question": question} for index, question in enumerate(questions, 1)]
+
+
+def chart_filename(item_id, chart_label, fmt="html"):
+    """File name of a chart export, e.g. '12 Bar Chart for T shirt Count by Brand_chart.html'."""
+    return f"{item_id} {_UNSAFE_FILENAME_RE.sub(' ', chart_label).strip()}_chart.{fmt}"
+
+
+def export_chart(output_dir, item_id, viz_data, chart_type, fmt=BATCH_EXPORT_FORMAT, figures=None):
+    """
+    Builds the figure for the chart data and writes its export in `fmt`; returns the file name.
+    The figure is also stored in `figures` under the item id when given, for the dashboard.
+    """
+    chart, chart_label = build_figure(viz_data, chart_type)
+    if chart is None:
+        return None
+    if figures is not None:
+        figures[item_id] = chart
+    filename = chart_filename(item_id, chart_label, fmt)
+    write_export(os.path.join(output_dir, filename), [chart], fmt, chart_label)
+    return filename
+
+
+async def answer_question(graph, item, output_dir, semaphore, query_results, fmt=BATCH_EXPORT_FORMAT, figures=None):
+    """Runs one question through the graph and exports its chart; errors are recorded, not raised."""
+    record = {"id": item["id"], "question": item["question"]}
+    # Questions of a batch share query_results, so identical SQL is executed once
+    config = {"configurable": {"session_id": "batch", "query_results": query_results}}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            state = await graph.ainvoke({"question": item["question"]}, config)
+            record.update({"query": state.get("query"), "answer": state.get("answer"),
+                           "chart_type": state.get("chart_type")})
+            if state.get("viz_data"):
+                record["chart_spec"] = json.loads(
+                    state["viz_data"].replace("```json", "").replace("```", "").strip()
+                )
+                # Figure and HTML building is CPU bound, so it stays off the event loop
+                record["chart_file"] = await asyncio.to_thread(
+                    export_chart, output_dir, item["id"], state["viz_data"], state["chart_type"], fmt, figures
+                )
+        except Exception as e:
+            metrics.incr("batch.errors")
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+async def arun_batch(questions, output_dir, concurrency=BATCH_CONCURRENCY, graph_config=None,
+                     fmt=BATCH_EXPORT_FORMAT):
+    """
+    Answers `questions` (as returned by load_questions) with at most `concurrency` in flight
+    and writes the results, chart exports in `fmt` and the dashboard to `output_dir`.
+
+    :return: The result records, in input order.
+    """
+    graph_config = graph_config or BATCH_GRAPH_CONFIG
+    os.makedirs(output_dir, exist_ok=True)
+    graph = await asyncio.to_thread(warm_up, **graph_config)
+    semaphore = asyncio.Semaphore(concurrency)
+    query_results = {}
+    figures = {}
+    records = await asyncio.gather(*(
+        answer_question(graph, item, output_dir, semaphore, query_results, fmt, figures) for item in questions
+    ))
+    if figures:
+        # Charts in input order, in one file with a single copy of plotly.js
+        ordered = [figures[item["id"]] for item in questions if item["id"] in figures]
+        await asyncio.to_thread(write_export, os.path.join(output_dir, DASHBOARD_FILE), ordered, "html", "Batch charts")
+    with open(os.path.join(output_dir, RESULTS_FILE), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+    return records
+
+
+def run_batch(questions, output_dir, concurrency=BATCH_CONCURRENCY, graph_config=None, fmt=BATCH_EXPORT_FORMAT):
+    """Synchronous entry point of arun_batch."""
+    return asyncio.run(arun_batch(questions, output_dir, concurrency, graph_config, fmt))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="questions file (.txt, one per line, or .jsonl)")
+    parser.add_argument("--output", default="batch_output", help="directory for results.jsonl and chart exports")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions answered at once")
+    parser.add_argument("--cache-queries", action="store_true", help="also use the persistent query cache")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default=BATCH_EXPORT_FORMAT,
+                        help="format of the per-chart exports")
+    args = parser.parse_args(argv)
+
+    graph_config = {**BATCH_GRAPH_CONFIG, "cache_queries": args.cache_queries}
+    start = time.perf_counter()
+    records = run_batch(load_questions(args.questions), args.output, args.concurrency, graph_config, args.format)
+    errors = sum(1 for record in records if "error" in record)
+    charts = sum(1 for record in records if record.get("chart_file"))
+    print(f"{len(records)} questions, {charts} charts, {errors} errors in {time.perf_counter() - start:.1f} s; "
+          f"{int(metrics.counter('query_dedupe.hit'))} duplicate queries reused. Results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
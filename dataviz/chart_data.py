@@ -0,0 +1,224 @@
+import ast
+import re
+import numpy as np
+import pandas as pd
+
+# Natural ordering for t shirt sizes on the x-axis
+SIZE_ORDER = ["XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL"]
+
+# Above this many distinct values histogram data is binned instead of plotted per value
+MAX_HISTOGRAM_BINS = 20
+# Label of the rows whose category is NULL
+MISSING_LABEL = "(none)"
+
+_DECIMAL_RE = re.compile(r"Decimal\('([^']*)'\)")
+
+
+def parse_result_rows(result):
+    """
+    Parses the string returned by QuerySQLDataBaseTool back into a list of row tuples.
+
+    :param result: Stringified list of tuples, e.g. "[('Nike', 120), ('Adidas', 80)]".
+    :return: List of tuples, or None when the string cannot be parsed safely.
+    """
+    if not isinstance(result, str) or not result.strip():
+        return None
+    try:
+        rows = ast.literal_eval(_DECIMAL_RE.sub(r"\1", result.strip()))
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(rows, list) or not all(isinstance(row, tuple) for row in rows):
+        return None
+    return rows
+
+
+def to_frame(rows, columns=None):
+    """Builds a DataFrame from query rows, converting numeric-looking object columns to numbers."""
+    return coerce_numeric(pd.DataFrame.from_records(rows, columns=columns))
+
+
+def coerce_numeric(df):
+    """Converts object columns holding numbers (e.g. Decimal from the warehouse driver) to numeric dtypes."""
+    for name in df.columns:
+        if df[name].dtype == object:
+            try:
+                df[name] = pd.to_numeric(df[name])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def _humanize(name):
+    if not isinstance(name, str):
+        return None
+    return re.sub(r"[^0-9a-zA-Z]+", " ", name).strip().title() or None
+
+
+def _title(question, x_name=None, y_name=None):
+    x_label, y_label = _humanize(x_name), _humanize(y_name)
+    if x_label and y_label:
+        return f"{y_label} by {x_label}"
+    return question.strip().rstrip("?.").strip() if question else "Chart"
+
+
+def split_columns(df):
+    """Splits the column names into (categorical, numeric) lists."""
+    numeric = [name for name in df.columns if pd.api.types.is_numeric_dtype(df[name])]
+    categorical = [name for name in df.columns if name not in numeric]
+    return categorical, numeric
+
+
+def _labeled(df, names):
+    """The rows with NULL categories in `names` labeled MISSING_LABEL, so they stay in the totals and out of the JSON as NaN."""
+    if not df[names].isna().any().any():
+        return df
+    df = df.copy()
+    for name in names:
+        df[name] = df[name].astype(object).where(df[name].notna(), MISSING_LABEL)
+    return df
+
+
+def _ordered(values):
+    """Unique values in first-seen order, or in size order when the values are t shirt sizes."""
+    unique = pd.unique(values)
+    if all(str(value).upper() in SIZE_ORDER for value in unique):
+        return sorted(unique, key=lambda value: SIZE_ORDER.index(str(value).upper()))
+    return list(unique)
+
+
+def _category_totals(df):
+    categorical, numeric = split_columns(df)
+    if len(categorical) != 1 or len(numeric) != 1:
+        return None
+    x_name, y_name = categorical[0], numeric[0]
+    df = _labeled(df, [x_name])
+    totals = df.groupby(x_name, sort=False)[y_name].sum()
+    totals = totals.reindex(_ordered(df[x_name]))
+    return x_name, y_name, totals
+
+
+def _bar(df, question):
+    shaped = _category_totals(df)
+    if shaped is None:
+        return None
+    x_name, y_name, totals = shaped
+    return {
+        "labels": [str(label) for label in totals.index],
+        "values": [{"data": totals.to_numpy().tolist(), "label": _humanize(y_name) or "Value"}],
+        "title": _title(question, x_name, y_name),
+        "x_label": _humanize(x_name) or "Category",
+    }
+
+
+def _pie(df, question):
+    shaped = _category_totals(df)
+    if shaped is None:
+        return None
+    x_name, y_name, totals = shaped
+    return {
+        "data": [{"label": str(label), "value": value} for label, value in zip(totals.index, totals.to_numpy().tolist())],
+        "title": _title(question, x_name, y_name),
+    }
+
+
+def _stacked_bar(df, question):
+    categorical, numeric = split_columns(df)
+    if len(categorical) != 2 or len(numeric) != 1:
+        return None
+    # Same convention as the transform prompt: (stack category, x-axis category, count)
+    stack_name, x_name = categorical
+    y_name = numeric[0]
+    df = _labeled(df, categorical)
+    pivot = df.pivot_table(index=stack_name, columns=x_name, values=y_name, aggfunc="sum", fill_value=0, sort=False)
+    pivot = pivot.reindex(index=_ordered(df[stack_name]), columns=_ordered(df[x_name]), fill_value=0)
+    counts = pivot.to_numpy().tolist()
+    return {
+        "x_axis_categories": [str(category) for category in pivot.columns],
+        "stack_groups": [
+            {"counts": row, "stack_category": str(stack)} for stack, row in zip(pivot.index, counts)
+        ],
+        "title": _title(question, x_name, stack_name),
+        "x_label": _humanize(x_name) or "Category",
+        "y_label": _humanize(y_name) or "Count",
+    }
+
+
+def _histogram(df, question, count_column=None):
+    categorical, numeric = split_columns(df)
+    if categorical or len(numeric) not in (1, 2):
+        return None
+    # A single column is a list of observations; a second column is only a weight when it is
+    # known to count the rows of each value, otherwise the pair is not a distribution
+    if len(numeric) == 2:
+        if count_column not in numeric:
+            return None
+        numeric = [name for name in numeric if name != count_column] + [count_column]
+    values = df[numeric[0]].to_numpy(dtype=float)
+    weights = df[numeric[1]].to_numpy(dtype=float) if len(numeric) == 2 else np.ones(len(values))
+    # NULLs (NaN) and infinities cannot be binned; np.histogram raises on them
+    finite = np.isfinite(values) & np.isfinite(weights)
+    if not finite.any():
+        return None
+    values, weights = values[finite], weights[finite]
+    distinct, inverse = np.unique(values, return_inverse=True)
+    if len(distinct) <= MAX_HISTOGRAM_BINS:
+        bins, counts = distinct, np.bincount(inverse, weights=weights)
+        bin_width = None
+    else:
+        counts, edges = np.histogram(values, bins=MAX_HISTOGRAM_BINS, weights=weights)
+        # Bars are drawn centered on their x value, so a bin is placed at its center
+        bins, bin_width = (edges[:-1] + edges[1:]) / 2, float(edges[1] - edges[0])
+    chart_data = {
+        "bins": bins.tolist(),
+        "counts": counts.tolist(),
+        "x_label": _humanize(numeric[0]) or "Value",
+        "y_label": (_humanize(numeric[1]) if len(numeric) == 2 else None) or "Frequency",
+        "title": _title(question),
+    }
+    if bin_width is not None:
+        chart_data["bin_width"] = bin_width
+    return chart_data
+
+
+def _scatter(df, question):
+    categorical, numeric = split_columns(df)
+    if categorical or len(numeric) != 2:
+        return None
+    x_name, y_name = numeric
+    points = df[[x_name, y_name]].dropna().to_numpy().tolist()
+    return {
+        "data_points": [{"x": x, "y": y} for x, y in points],
+        "x_label": _humanize(x_name) or "X",
+        "y_label": _humanize(y_name) or "Y",
+        "title": f"{_humanize(x_name)} vs {_humanize(y_name)}" if _humanize(x_name) and _humanize(y_name) else _title(question),
+    }
+
+
+_BUILDERS = {
+    "bar": _bar,
+    "stacked bar": _stacked_bar,
+    "pie": _pie,
+    "histogram": _histogram,
+    "scatter": _scatter,
+}
+
+
+def build_chart_data(chart_type, df, question=None, count_column=None):
+    """
+    Shapes query rows into the chart_data structure expected by display_visualization.
+
+    :param chart_type: One of bar, stacked bar, pie, histogram, scatter.
+    :param df: DataFrame of query rows.
+    :param question: User question, used for the chart title when column names are not available.
+    :param count_column: Column holding the number of rows of each value (e.g. the COUNT of a
+        grouped query, see result_shaping.count_column); only then does a histogram of two numeric
+        columns use the second one as weights.
+    :return: {"chart_data": {...}} or None when the result shape is ambiguous for the chart type.
+    """
+    builder = _BUILDERS.get((chart_type or "").lower())
+    if builder is None or df is None or df.empty:
+        return None
+    chart_data = _histogram(df, question, count_column) if builder is _histogram else builder(df, question)
+    if chart_data is None:
+        return None
+    return {"chart_data": chart_data}
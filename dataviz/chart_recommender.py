@@ -0,0 +1,74 @@
+from dataviz.chart_data import split_columns
+
+# Pie charts become unreadable with many slices
+MAX_PIE_CATEGORIES = 8
+
+# Chart names the user may ask for explicitly, checked in this order
+EXPLICIT_CHART_KEYWORDS = [
+    ("stacked bar", ["stacked"]),
+    ("pie", ["pie", "donut"]),
+    ("histogram", ["histogram"]),
+    ("scatter", ["scatter"]),
+    ("bar", ["bar"]),
+]
+
+DISTRIBUTION_KEYWORDS = ["distribution", "spread", "histogram"]
+RELATIONSHIP_KEYWORDS = [" vs", "versus", "relationship", "correlat", "against", "scatter"]
+PROPORTION_KEYWORDS = ["proportion", "share", "percentage of", "contribut", "pie", "breakdown"]
+
+
+def _shape_charts(categorical, numeric):
+    """Chart types the result shape can be transformed into, most natural first."""
+    if len(categorical) == 1 and len(numeric) == 1:
+        return ["bar", "pie"]
+    if len(categorical) == 2 and len(numeric) == 1:
+        return ["stacked bar"]
+    if not categorical and len(numeric) == 2:
+        return ["scatter", "histogram"]
+    if not categorical and len(numeric) == 1:
+        return ["histogram"]
+    return []
+
+
+def recommend_chart(df, question):
+    """
+    Recommends a chart type from the column dtypes and cardinality of the result, using the
+    question only to choose between chart types the result shape supports.
+
+    :param df: DataFrame of query rows.
+    :param question: User question.
+    :return: (chart_type, reason, ambiguous). chart_type is None when no chart fits the result
+        confidently; ambiguous is True when the chart has to be chosen by the LLM rather than
+        guessed: the question asks for a chart type the result shape does not fit, or two
+        numeric columns could be a scatter plot or a weighted histogram.
+    """
+    if df is None or len(df) < 2:
+        return None, "Too few rows to chart", False
+    categorical, numeric = split_columns(df)
+    candidates = _shape_charts(categorical, numeric)
+    if not candidates:
+        return None, f"No chart fits {len(categorical)} categorical and {len(numeric)} numeric columns", False
+
+    text = (question or "").lower()
+    for chart_type, keywords in EXPLICIT_CHART_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            if chart_type in candidates:
+                return chart_type, f"The question asks for a {chart_type} chart and the result has a matching shape", False
+            return None, f"The question asks for a {chart_type} chart, which the result shape does not fit", True
+
+    if "histogram" in candidates and any(keyword in text for keyword in DISTRIBUTION_KEYWORDS):
+        return "histogram", "The question asks for the distribution of numeric values", False
+    if "scatter" in candidates:
+        if any(keyword in text for keyword in RELATIONSHIP_KEYWORDS):
+            return "scatter", "The question relates two numeric columns, shown point by point", False
+        return None, "Two numeric columns could be a relationship or a weighted distribution", True
+    if "pie" in candidates and any(keyword in text for keyword in PROPORTION_KEYWORDS):
+        if df[categorical[0]].nunique() <= MAX_PIE_CATEGORIES:
+            return "pie", "The question asks for proportions across a small number of categories", False
+    if "bar" in candidates:
+        return "bar", f"Compares {numeric[0]} across the {df[categorical[0]].nunique()} values of {categorical[0]}", False
+    if candidates == ["stacked bar"]:
+        return "stacked bar", f"Shows {numeric[0]} by {categorical[1]}, grouped by {categorical[0]}", False
+    if candidates == ["histogram"]:
+        return "histogram", f"Single numeric column {numeric[0]}, shown as a distribution", False
+    return None, "The result shape is ambiguous", True
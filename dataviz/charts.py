@@ -0,0 +1,156 @@
+"""
+Plotly figures for the chart_data structures of the graph, built with plotly.graph_objects
+from NumPy arrays: one trace per chart (per stack group for stacked bars) instead of the one
+trace per category Plotly Express creates.
+
+Chart data is reduced with the same budgets as the rows it is shaped from
+(result_shaping.shape_chart_data), so charts from the LLM transform are folded, binned and
+sampled like the others. Scatter plots with more than CHART_WEBGL_POINTS points use WebGL.
+Binned histograms (with a bin_width) have one bar per bin, centered on the bin.
+"""
+import os
+import numpy as np
+import plotly.colors as pcolors
+import plotly.graph_objects as go
+from dotenv import load_dotenv
+from dataviz.result_shaping import CHART_MAX_POINTS, shape_chart_data
+
+load_dotenv()
+
+# Scatter plots with at least this many points use WebGL; they are sampled down to CHART_MAX_POINTS,
+# so the threshold cannot be above it
+CHART_WEBGL_POINTS = min(int(os.getenv("CHART_WEBGL_POINTS", "1000")), CHART_MAX_POINTS)
+
+PALETTE = pcolors.qualitative.Plotly
+TITLE_FONT = dict(size=18, weight="bold")
+
+
+def palette(count):
+    """`count` colors, cycling through the qualitative Plotly palette."""
+    return [PALETTE[i % len(PALETTE)] for i in range(count)]
+
+
+def _array(values):
+    """A float array when every value is numeric, an object array otherwise."""
+    array = np.asarray(values)
+    if array.dtype.kind in "iuf":
+        return array
+    try:
+        return array.astype(float)
+    except (TypeError, ValueError):
+        return array.astype(str)
+
+
+def bar_figure(chart_data):
+    labels, values = np.asarray(chart_data["labels"], dtype=str), _array(chart_data["values"][0]["data"])
+    chart_label = "Bar Chart for " + chart_data.get("title")
+    chart = go.Figure(go.Bar(
+        x=labels, y=values, marker_color=palette(len(labels)),
+        hovertemplate="<b>%{x}</b><br>Value: %{y}<extra></extra>",
+    ))
+    chart.update_layout(
+        title=chart_label,
+        xaxis_title=chart_data.get("x_label"),
+        yaxis_title=chart_data["values"][0]["label"],
+        title_font=TITLE_FONT,
+    )
+    return chart, chart_label
+
+
+def stacked_bar_figure(chart_data):
+    categories = np.asarray(chart_data["x_axis_categories"], dtype=str)
+    groups = chart_data["stack_groups"]
+    counts = [_array(group["counts"]) for group in groups]
+    chart_label = "Stacked Bar Chart for " + chart_data.get("title")
+    x_label, y_label = chart_data.get("x_label", "X-Axis"), chart_data.get("y_label", "Y-Axis")
+    chart = go.Figure([
+        go.Bar(
+            x=categories, y=row, name=group["stack_category"], marker_color=color,
+            hovertemplate=f"{x_label}: %{{x}}<br>{y_label}: %{{y}}<extra>{group['stack_category']}</extra>",
+        )
+        for group, row, color in zip(groups, counts, palette(len(groups)))
+    ])
+    chart.update_layout(
+        barmode="stack",
+        title=chart_label,
+        title_font=TITLE_FONT,
+        xaxis_title=x_label,
+        yaxis_title=y_label,
+        legend_title_text="Color",
+    )
+    return chart, chart_label
+
+
+def pie_figure(chart_data):
+    items = chart_data["data"]
+    labels, values = np.asarray([item["label"] for item in items], dtype=str), _array([item["value"] for item in items])
+    chart_label = "Pie Chart for " + chart_data.get("title")
+    chart = go.Figure(go.Pie(
+        labels=labels, values=values, hole=0.4,  # Creates the donut effect
+        textinfo="percent+label",
+        hovertemplate="<b>%{label}</b><br>Value: %{value}<br>Percentage: %{percent}<extra></extra>",
+        marker=dict(colors=palette(len(labels))),
+    ))
+    chart.update_layout(title=chart_label)
+    return chart, chart_label
+
+
+def histogram_figure(chart_data):
+    bins, counts = _array(chart_data["bins"]), _array(chart_data["counts"])
+    chart_label = "Histogram for " + chart_data.get("title")
+    bin_width = chart_data.get("bin_width")
+    chart = go.Figure(go.Bar(
+        x=bins, y=counts, width=bin_width, marker_color="#ADD8E6",  # Light blue
+        hovertemplate="%{x}<br>%{y}<extra></extra>",
+    ))
+    chart.update_layout(
+        title=chart_label,
+        title_font=TITLE_FONT,
+        xaxis_title=chart_data.get("x_label", "X-Axis"),
+        yaxis_title=chart_data.get("y_label", "Y-Axis"),
+        bargap=0,
+    )
+    # Every value gets a tick while they stay readable; bin centers of binned data would not be round numbers
+    if bin_width is None and len(bins) <= 30:
+        chart.update_xaxes(tickmode="array", tickvals=bins)
+    return chart, chart_label
+
+
+def scatter_figure(chart_data):
+    points = chart_data["data_points"]
+    # Text axes (e.g. dates or names from the LLM transform) are plotted as they are
+    x = _array([point["x"] for point in points])
+    y = _array([point["y"] for point in points])
+    chart_label = "Scatter plot for " + chart_data.get("title")
+    x_label, y_label = chart_data["x_label"], chart_data["y_label"]
+    # WebGL draws many points much faster than SVG
+    trace = go.Scattergl if len(x) >= CHART_WEBGL_POINTS else go.Scatter
+    chart = go.Figure(trace(
+        x=x, y=y, mode="markers", marker_color="#636EFA",  # Blue
+        hovertemplate=f"{x_label}=%{{x}}<br>{y_label}=%{{y}}<extra></extra>",
+    ))
+    chart.update_layout(title=chart_label, xaxis_title=x_label, yaxis_title=y_label)
+    return chart, chart_label
+
+
+FIGURE_BUILDERS = {
+    "bar": bar_figure,
+    "stacked bar": stacked_bar_figure,
+    "pie": pie_figure,
+    "histogram": histogram_figure,
+    "scatter": scatter_figure,
+}
+
+
+def build_chart_figure(chart_type, chart_data):
+    """(figure, chart label) for a chart_data dictionary, or (None, None) for an unknown chart type."""
+    builder = FIGURE_BUILDERS.get(chart_type)
+    if builder is None:
+        return None, None
+    chart, chart_label = builder(shape_chart_data(chart_type, chart_data))
+    if chart_data.get("note"):
+        # e.g. that the chart was built from a truncated result
+        chart.add_annotation(text=chart_data["note"], xref="paper", yref="paper", x=0, y=-0.18,
+                             xanchor="left", yanchor="top", showarrow=False, font=dict(size=11, color="gray"))
+        chart.update_layout(margin=dict(b=100))
+    return chart, chart_label
@@ -0,0 +1,161 @@
+"""
+Conversation context for build_graph(follow_ups=True): the graph state of each chat is kept by
+a LangGraph checkpointer under configurable.thread_id, so the next question of the chat starts
+from the previous turn's SQL and result. Follow-ups that only change how that result is shown
+("now show that as a pie chart", "summarize that") are answered from it without generating or
+running SQL again.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from dataviz.chart_recommender import EXPLICIT_CHART_KEYWORDS
+from dataviz.result_shaping import fit_frame
+
+load_dotenv()
+
+# Chats whose context is kept; the least recently used ones are dropped first
+CONVERSATION_MAX_THREADS = int(os.getenv("CONVERSATION_MAX_THREADS", "1000"))
+# In-memory size of the typed result kept per chat
+CONVERSATION_RESULT_MAX_BYTES = int(os.getenv("CONVERSATION_RESULT_MAX_BYTES", str(1024 * 1024)))
+
+# Words referring back to the previous result
+REFERENCE_WORDS = {"that", "this", "it", "these", "those", "them", "same", "instead", "again", "now"}
+CHART_WORDS = {"chart", "graph", "plot", "visualize", "visualise", "visualization", "diagram"}
+# Requests to re-word the previous answer
+ANSWER_PHRASES = ["summarize", "summarise", "explain", "rephrase", "shorter", "briefly", "in words",
+                  "as text", "as a list", "as a table", "in one sentence", "bullet"]
+# Words that narrow or regroup the data, which needs a new query
+NEW_DATA_WORDS = {"for", "only", "where", "by", "per", "without", "except", "excluding", "between",
+                  "top", "last", "first", "each", "filter", "group"}
+
+_WORD_RE = re.compile(r"[a-z_]+")
+
+
+def requested_chart_type(question):
+    """The chart type named in the question, e.g. 'pie' for '... as a donut chart', or None."""
+    text = question.lower()
+    for chart_type, keywords in EXPLICIT_CHART_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return chart_type
+    return None
+
+
+def classify_follow_up(question, query, result, columns=None):
+    """
+    Classifies a question against the previous turn of the chat.
+
+    :param question: The new question.
+    :param query: SQL of the previous turn, or None.
+    :param result: Result of the previous turn, or None.
+    :param columns: Column names of the database tables ({table: [column, ...]}); a question
+        naming a column the previous query did not select needs new SQL.
+    :return: "chart" to chart the previous result again, "answer" to answer from it again, or
+        None when the question needs new SQL.
+    """
+    if not query or not result or str(result).startswith("Error"):
+        return None
+    text = question.lower()
+    words = set(_WORD_RE.findall(text))
+    if not words & REFERENCE_WORDS or words & NEW_DATA_WORDS:
+        return None
+    previous = query.lower()
+    for name in {column.lower() for table_columns in (columns or {}).values() for column in table_columns}:
+        if name not in previous and (name in words or name.replace("_", " ") in text):
+            return None
+    if words & CHART_WORDS or requested_chart_type(question):
+        return "chart"
+    if any(phrase in text for phrase in ANSWER_PHRASES):
+        return "answer"
+    return None
+
+
+class ConversationSaver(BaseCheckpointSaver):
+    """
+    Checkpointer keeping only the latest checkpoint of each thread, for at most `max_threads`
+    threads. Each thread and namespace has its own MemorySaver, replaced whenever a newer
+    checkpoint is saved, so older checkpoints and their pending writes are dropped and memory
+    grows with the number of chats and not with turns. A typed result larger than
+    `max_result_bytes` is checkpointed as its first rows that fit, marked as truncated.
+    Query results are DataFrames, which the default serializer only stores with pickle.
+    """
+
+    def __init__(self, max_threads=CONVERSATION_MAX_THREADS, max_result_bytes=CONVERSATION_RESULT_MAX_BYTES):
+        super().__init__(serde=JsonPlusSerializer(pickle_fallback=True))
+        self.max_threads = max_threads
+        self.max_result_bytes = max_result_bytes
+        # thread_id -> {checkpoint_ns: MemorySaver}, least recently used first
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _saver(self, config):
+        configurable = config["configurable"]
+        with self._lock:
+            return self._threads.get(configurable["thread_id"], {}).get(configurable.get("checkpoint_ns", ""))
+
+    def _compact(self, checkpoint):
+        values = checkpoint["channel_values"]
+        df = values.get("result_df")
+        if df is None or int(df.memory_usage(deep=True).sum()) <= self.max_result_bytes:
+            return checkpoint
+        df, _ = fit_frame(df, len(df), self.max_result_bytes)
+        values = {**values, "result_df": df, "result_truncated": True, "result_note": None}
+        return {**checkpoint, "channel_values": values}
+
+    def get_tuple(self, config):
+        saver = self._saver(config)
+        return saver.get_tuple(config) if saver is not None else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config is not None:
+            savers = [self._saver(config)]
+        else:
+            with self._lock:
+                savers = [saver for namespaces in self._threads.values() for saver in namespaces.values()]
+        for saver in savers:
+            if saver is not None:
+                yield from saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        # The new saver stores every channel, not just the ones changed since the previous checkpoint
+        saver = MemorySaver(serde=self.serde)
+        output = saver.put(config, self._compact(checkpoint), metadata, checkpoint["channel_versions"])
+        with self._lock:
+            # The thread moves to the end as most recently used
+            namespaces = self._threads.pop(thread_id, {})
+            namespaces[checkpoint_ns] = saver
+            self._threads[thread_id] = namespaces
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        return output
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        saver = self._saver(config)
+        if saver is not None:
+            saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        self.delete_thread(thread_id)
@@ -1,17 +1,125 @@
-#import streamlit as st
 from langchain_community.utilities import SQLDatabase
-from sqlalchemy import create_engine
+import sqlalchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from dataviz.metrics import metrics
+from dataviz.telemetry import add_to_span
 import os
+import time
 load_dotenv()
 
-#@st.cache_resource(ttl="2h")
-def configure_db():
-    project=os.getenv('GOOGLE_PROJECT')
-    dataset=os.getenv('BIGQUERY_DATASET')
-    service_account_file=os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-    sql_url = (
-        f"bigquery://{project}/{dataset}?credentials_path={service_account_file}"
-    )
-    return SQLDatabase.from_uri(sql_url)
- 
\ No newline at end of file
+# Warehouse backend used when DATABASE_URL is not set: bigquery, mysql, sqlite or duckdb
+DB_BACKEND = os.getenv('DB_BACKEND', 'bigquery')
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Seconds after which pooled connections are replaced; -1 keeps them forever
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('db.pool.checkout_wait_ms', (time.perf_counter() - start) * 1000)
+
+
+def database_url(backend=DB_BACKEND):
+    """Builds the SQLAlchemy URL of a backend from its environment variables."""
+    if backend == 'bigquery':
+        project=os.getenv('GOOGLE_PROJECT')
+        dataset=os.getenv('BIGQUERY_DATASET')
+        service_account_file=os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        return f"bigquery://{project}/{dataset}?credentials_path={service_account_file}"
+    if backend == 'mysql':
+        user=os.getenv('MYSQL_USER')
+        password=os.getenv('MYSQL_PASSWORD')
+        host=os.getenv('MYSQL_HOST', 'localhost')
+        port=os.getenv('MYSQL_PORT', '3306')
+        database=os.getenv('MYSQL_DATABASE')
+        return f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
+    if backend == 'sqlite':
+        return f"sqlite:///{os.getenv('SQLITE_PATH', 'shop.db')}"
+    if backend == 'duckdb':
+        # Needs the duckdb-engine SQLAlchemy dialect, and SQLAlchemy < 2.1 (see requirements.txt)
+        return f"duckdb:///{os.getenv('DUCKDB_PATH', 'shop.duckdb')}"
+    raise ValueError(f"Unknown database backend: {backend}")
+
+
+def engine_options(url, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT,
+                   pool_recycle=POOL_RECYCLE, pool_pre_ping=POOL_PRE_PING):
+    """Pool settings for create_engine; in-memory databases keep SQLAlchemy's single-connection pool."""
+    parsed = make_url(url)
+    in_memory = parsed.get_backend_name() in ('sqlite', 'duckdb') and parsed.database in (None, '', ':memory:')
+    if in_memory:
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping,
+    }
+
+
+def instrument_engine(engine):
+    """Records the execution time of every statement as db.query_ms, and the bytes BigQuery processed."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        metrics.observe('db.query_ms', (time.perf_counter() - start) * 1000)
+        metrics.incr('db.queries')
+        # The BigQuery DB-API cursor keeps the finished job, which reports the bytes it processed
+        job = getattr(cursor, '_query_job', None)
+        bytes_processed = getattr(job, 'total_bytes_processed', None)
+        if bytes_processed is not None:
+            metrics.observe('db.bytes_processed', bytes_processed)
+            add_to_span('warehouse_bytes', bytes_processed)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # Failed statements never reach after_cursor_execute
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+    return engine
+
+
+def _version(version):
+    return tuple(int(part) for part in version.split('.')[:2] if part.isdigit())
+
+
+def configure_db(backend=None, **pool_options):
+    """
+    Creates the SQLDatabase used by the graph.
+
+    DATABASE_URL (e.g. sqlite:///shop.db) takes precedence; otherwise the URL is built for
+    `backend` (default DB_BACKEND). `pool_options` override the DB_POOL_* settings.
+    """
+    sql_url=os.getenv('DATABASE_URL') or database_url(backend or DB_BACKEND)
+    if make_url(sql_url).get_backend_name() == 'duckdb' and _version(sqlalchemy.__version__) >= (2, 1):
+        # Fail here with the fix instead of with a pg_collation error while reflecting tables
+        raise RuntimeError(
+            f"The duckdb backend needs SQLAlchemy < 2.1 (installed: {sqlalchemy.__version__}); "
+            "install the versions pinned in requirements.txt"
+        )
+    engine = create_engine(sql_url, **engine_options(sql_url, **pool_options))
+    return SQLDatabase(instrument_engine(engine))
+
+
+def pool_status(db):
+    """Human readable pool state (size, checked in/out, overflow) of a SQLDatabase."""
+    return db._engine.pool.status()
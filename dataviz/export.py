@@ -0,0 +1,155 @@
+"""
+Chart exports: self-contained HTML (plotly.js inlined, so the file displays offline), the same
+gzip-compressed, Plotly figure JSON, and dashboards of several charts in one HTML file.
+
+The plotly.js bundle is read once per process and shared by every export. Figures are written
+as compact JSON with their template (the bulk of a figure's layout) stored once per document,
+and exports are produced as a stream of chunks so `write_export` never holds a whole file in
+memory.
+"""
+import functools
+import gzip
+import html
+import io
+import json
+import os
+from dotenv import load_dotenv
+import plotly.io as pio
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+load_dotenv()
+
+# "inline" embeds plotly.js so exports work offline; "cdn" links it instead (small, needs network)
+EXPORT_PLOTLYJS = os.getenv("EXPORT_PLOTLYJS", "inline")
+# Format of the chart download buttons: html, html.gz or json
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "html")
+
+# file extension -> (MIME type, download button label)
+EXPORT_FORMATS = {
+    "html": ("text/html", "Download Chart as HTML"),
+    "html.gz": ("application/gzip", "Download Chart as compressed HTML"),
+    "json": ("application/json", "Download Chart as JSON"),
+}
+
+_PAGE_START = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>body {{ font-family: sans-serif; margin: 0 16px; }} .chart {{ width: 100%; height: 520px; }}</style>
+"""
+_PLOT_FUNCTION = """<script>
+const templates = [];
+function plot(id, figure, template) {
+    figure.layout.template = templates[template];
+    Plotly.newPlot(id, figure.data, figure.layout, {responsive: true});
+}
+</script>
+</head>
+<body>
+"""
+_PAGE_END = "</body>\n</html>\n"
+
+
+@functools.lru_cache(maxsize=None)
+def plotly_bundle():
+    """The plotly.js bundle shipped with plotly in a script element, read on first use and kept for the process."""
+    return f'<script type="text/javascript">{get_plotlyjs()}</script>\n'
+
+
+@functools.lru_cache(maxsize=None)
+def gzipped_plotly_bundle():
+    """plotly_bundle() as a gzip member, compressed once; gzip files may consist of several members."""
+    return gzip.compress(plotly_bundle().encode("utf-8"), mtime=0)
+
+
+def _script_json(value):
+    # "</" would end the script element early
+    return value.replace("</", "<\\/")
+
+
+def _split_template(figure):
+    """(figure JSON without its template, template JSON)."""
+    figure_dict = json.loads(pio.to_json(figure, validate=False))
+    template = figure_dict.get("layout", {}).pop("template", {})
+    return json.dumps(figure_dict, separators=(",", ":")), json.dumps(template, separators=(",", ":"))
+
+
+def iter_html(figures, title="Charts", plotlyjs=None):
+    """
+    Yields the chunks of an HTML document showing `figures` one below the other. plotly.js and
+    each distinct template are written once however many figures there are.
+    """
+    plotlyjs = plotlyjs or EXPORT_PLOTLYJS
+    yield _PAGE_START.format(title=html.escape(title))
+    if plotlyjs == "cdn":
+        yield f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>\n'
+    else:
+        yield plotly_bundle()
+    yield _PLOT_FUNCTION
+    templates = {}
+    for index, figure in enumerate(figures):
+        figure_json, template_json = _split_template(figure)
+        if template_json not in templates:
+            templates[template_json] = len(templates)
+            yield f"<script>templates.push({_script_json(template_json)});</script>\n"
+        yield f'<div id="chart-{index}" class="chart"></div>\n'
+        yield f'<script>plot("chart-{index}", {_script_json(figure_json)}, {templates[template_json]});</script>\n'
+    yield _PAGE_END
+
+
+def iter_json(figures):
+    """Yields Plotly figure JSON of one figure, or of {"charts": [...]} for several; pio.from_json reads them back."""
+    if len(figures) == 1:
+        yield pio.to_json(figures[0], validate=False)
+        return
+    yield '{"charts":['
+    for index, figure in enumerate(figures):
+        yield ("," if index else "") + pio.to_json(figure, validate=False)
+    yield "]}"
+
+
+def iter_export(figures, fmt=None, title="Charts"):
+    """Text chunks of an export of `figures` in `fmt` (html.gz yields the HTML to compress)."""
+    fmt = fmt or EXPORT_FORMAT
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    return iter_json(figures) if fmt == "json" else iter_html(figures, title)
+
+
+def _write_gzip(raw, chunks):
+    """Writes the chunks gzip-compressed to the binary file `raw`, reusing the compressed plotly.js bundle."""
+    member = gzip.GzipFile(fileobj=raw, mode="wb", mtime=0)
+    for chunk in chunks:
+        if chunk is plotly_bundle():
+            member.close()
+            raw.write(gzipped_plotly_bundle())
+            member = gzip.GzipFile(fileobj=raw, mode="wb", mtime=0)
+        else:
+            member.write(chunk.encode("utf-8"))
+    member.close()
+
+
+def export_bytes(figures, fmt=None, title="Charts"):
+    """An export of `figures` in `fmt` (see EXPORT_FORMATS) as bytes, e.g. for a download button."""
+    fmt = fmt or EXPORT_FORMAT
+    chunks = iter_export(figures, fmt, title)
+    if fmt == "html.gz":
+        buffer = io.BytesIO()
+        _write_gzip(buffer, chunks)
+        return buffer.getvalue()
+    return "".join(chunks).encode("utf-8")
+
+
+def write_export(path, figures, fmt=None, title="Charts"):
+    """Streams an export of `figures` in `fmt` to `path` chunk by chunk; returns the path."""
+    fmt = fmt or EXPORT_FORMAT
+    chunks = iter_export(figures, fmt, title)
+    if fmt == "html.gz":
+        with open(path, "wb") as f:
+            _write_gzip(f, chunks)
+        return path
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path
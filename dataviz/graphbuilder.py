@@ -1,21 +1,30 @@
-from langchain_openai import ChatOpenAI
-from dataviz.db_connect import configure_db
-from dataviz.prompts import get_prompt_template,create_data_transform_prompt
+from dataviz.chart_data import build_chart_data,parse_result_rows,to_frame,coerce_numeric
+from dataviz.results import run_query_frame,summarize_frame
+from dataviz.result_shaping import count_column,limit_query,reduce_chart_query,fit_frame,fit_text_result,prompt_result,rows_text,shape_for_chart,truncation_note
+from dataviz.result_shaping import RESULT_MAX_ROWS,RESULT_MAX_BYTES,CHART_RESULT_MAX_ROWS,CHART_RESULT_MAX_BYTES
+from dataviz.chart_recommender import recommend_chart as recommend_chart_heuristic
+from dataviz.scheduler import scheduler
+from dataviz.prompts import get_viz_prompt,create_data_transform_prompt
+from dataviz.resources import resources,get_llm,get_db,get_schema_cache,get_query_cache,get_query_prompt,get_replica,get_dry_run,get_router
+from dataviz.router import ROUTER_MIN_CONFIDENCE
+from dataviz.sql_validation import check_query,SQL_MAX_ATTEMPTS
+from dataviz.metrics import metrics
+from dataviz.telemetry import traced,add_to_span
+from dataviz.logging import logger,compact,dump
+from dataviz.conversation import ConversationSaver,classify_follow_up,requested_chart_type
 from typing_extensions import TypedDict,Annotated
 from langchain_community.tools import QuerySQLDataBaseTool
 from langgraph.graph import START, StateGraph,END
 from langchain_core.runnables.base import RunnableLambda
+from langgraph.constants import TAG_NOSTREAM
 import pandas as pd
-import streamlit as st
-import altair as alt
 import json
+import threading
+import asyncio
+import inspect
+import concurrent.futures
 
-
-llm = ChatOpenAI(model_name="gpt-4o-mini", streaming=True)
-
-db = configure_db()
-
-query_prompt_template=get_prompt_template()
+#The LLM client, database, caches and prompts are created lazily by dataviz.resources on first use
 
 class State(TypedDict):
     question: str
@@ -23,8 +32,19 @@ class State(TypedDict):
     result: str
     answer: str
     chart_type:str
+    recommendation:str
     viz_data:str
     chart:dict
+    result_df:pd.DataFrame
+    result_truncated:bool
+    result_note:str
+    validation_error:str
+    query_attempts:int
+    follow_up:str
+    context_question:str
+    route:str
+    predicted_chart_type:str
+    chart_confidence:float
 
 #A TypedDict that specifies the expected structure of the output.
 #query: A field of type str, annotated to indicate that it should contain a syntactically valid SQL query.
@@ -34,39 +54,357 @@ class QueryOutput(TypedDict):
     query: Annotated[str, ..., "Syntactically valid SQL query."]
 
 
-#generate an SQL query by interacting with an LLM and return it in a structured format
-def write_query(state: State):
-    """Generate SQL query to fetch information."""
-    prompt = query_prompt_template.invoke(
+def _configurable(config):
+    return (config or {}).get("configurable") or {}
+
+def _session(config):
+    """Session id used for fair scheduling, passed by callers as configurable.session_id."""
+    return _configurable(config).get("session_id", "default")
+
+def build_query_prompt(state: State):
+    """Prompt for SQL generation, with the cached table info of the database."""
+    question = state["question"]
+    if state.get("validation_error"):
+        # Regeneration after validate_query rejected the previous query
+        question = (
+            f"{question}\n\nThe previous SQL query was rejected before running it.\n"
+            f"Previous query: {state['query']}\nReason: {state['validation_error']}\n"
+            "Write a corrected query."
+        )
+    return get_query_prompt().invoke(
         {
-            "dialect": db.dialect,
+            "dialect": get_db().dialect,
             "top_k": 30,
-            "table_info": db.get_table_info(),
-            "input": state["question"],
+            "table_info": get_schema_cache().get_table_info(),
+            "input": question,
         }
     )
+
+#generate an SQL query by interacting with an LLM and return it in a structured format
+def write_query(state: State, config=None):
+    """Generate SQL query to fetch information."""
+    prompt = build_query_prompt(state)
     #Configures the LLM to return its results as a QueryOutput structure, ensuring compliance with the expected format
-    structured_llm = llm.with_structured_output(QueryOutput)
-    result = structured_llm.invoke(prompt)
-    print(result)
+    structured_llm = get_llm().with_structured_output(QueryOutput)
+    with scheduler.slot_sync("llm", _session(config)):
+        result = structured_llm.invoke(prompt)
+    logger.debug("Generated query: %s", compact(result))
     return {"query": result["query"]}
 
-def execute_query(state: State):
-    """Execute SQL query."""
-    execute_query_tool = QuerySQLDataBaseTool(db=db)
+async def awrite_query(state: State, config=None):
+    """Async version of write_query."""
+    # Building the prompt may fetch table info from the warehouse on a schema cache miss
+    prompt = await asyncio.to_thread(build_query_prompt, state)
+    structured_llm = get_llm().with_structured_output(QueryOutput)
+    async with scheduler.slot("llm", _session(config)):
+        result = await structured_llm.ainvoke(prompt)
+    return {"query": result["query"]}
+
+def validate_query(state: State, config=None):
+    """
+    Checks the generated SQL against the cached schema and the dry run scan budget before it
+    reaches the warehouse. A rejected query is sent back to write_query with the reason, and
+    refused with an error result after SQL_MAX_ATTEMPTS generations.
+    """
+    error, estimate = check_query(
+        state["query"], get_db().dialect, get_schema_cache().get_columns(), get_dry_run()
+    )
+    attempts = state.get("query_attempts", 0) + 1
+    if estimate is not None:
+        metrics.observe("sql_validation.estimated_bytes", estimate)
+    if error is None:
+        return {"validation_error": None, "query_attempts": attempts}
+    logger.info("Query rejected (attempt %s): %s", attempts, error)
+    if attempts >= SQL_MAX_ATTEMPTS:
+        metrics.incr("sql_validation.refused")
+        return {"validation_error": error, "query_attempts": attempts,
+                "result": f"Error: the query was refused before running it. {error}"}
+    metrics.incr("sql_validation.regenerated")
+    return {"validation_error": error, "query_attempts": attempts}
+
+async def avalidate_query(state: State, config=None):
+    """Async version of validate_query; the dry run is a blocking API call so it runs in a worker thread."""
+    return await asyncio.to_thread(validate_query, state, config)
+
+def get_validation_flow(state: State):
+    """Next node after validate_query: execute the query, regenerate it, or answer with the refusal."""
+    if not state.get("validation_error"):
+        return "execute_query"
+    if state.get("query_attempts", 0) >= SQL_MAX_ATTEMPTS:
+        return "generate_answer"
+    return "write_query"
+
+def run_query(state: State):
+    """Runs the SQL query through QuerySQLDataBaseTool, which returns the rows as one string."""
+    execute_query_tool = QuerySQLDataBaseTool(db=get_db())
     return {"result": execute_query_tool.invoke(state["query"])}
 
-#Generate answer
-def generate_answer(state: State):
-    """Answer question using retrieved information as context."""
-    prompt = (
+def run_query_typed(state: State):
+    """Runs the SQL query into a typed DataFrame, with a compact summary of it for prompts."""
+    df, error = run_query_frame(get_db(), state["query"])
+    if error:
+        return {"result": error, "result_df": None}
+    return {"result": summarize_frame(df), "result_df": df}
+
+def execute_query(state: State, config=None):
+    """Execute SQL query."""
+    with scheduler.slot_sync("warehouse", _session(config)):
+        return run_query(state)
+
+def execute_query_typed(state: State, config=None):
+    """Execute SQL query, keeping the rows as a typed DataFrame and a compact summary for prompts."""
+    with scheduler.slot_sync("warehouse", _session(config)):
+        return run_query_typed(state)
+
+async def aexecute_query(state: State, config=None):
+    """Async version of execute_query; the database driver is blocking so it runs in a worker thread."""
+    async with scheduler.slot("warehouse", _session(config)):
+        return await asyncio.to_thread(run_query, state)
+
+async def aexecute_query_typed(state: State, config=None):
+    """Async version of execute_query_typed."""
+    async with scheduler.slot("warehouse", _session(config)):
+        return await asyncio.to_thread(run_query_typed, state)
+
+def replica_output(state: State, typed_results):
+    """Runs the query on the local replica when it is fresh; None means the warehouse has to answer."""
+    replica = get_replica()
+    if not replica.is_fresh():
+        replica.refresh_in_background()
+        metrics.incr("replica.fallback")
+        return None
+    try:
+        df = coerce_numeric(replica.query_frame(state["query"]))
+    except Exception as e:
+        # SQL the replica cannot run (other tables, dialect specific functions) goes to the warehouse
+        logger.warning("Replica could not run the query, using the warehouse: %s", e)
+        metrics.incr("replica.fallback")
+        return None
+    metrics.incr("replica.hit")
+    add_to_span("cache_hits", 1)
+    if typed_results:
+        return {"result": summarize_frame(df), "result_df": df}
+    return {"result": rows_text(df)}
+
+def with_replica(execute_fn, typed_results):
+    """Wraps an execute node (sync or async) so queries run on the local replica while it is fresh."""
+    if inspect.iscoroutinefunction(execute_fn):
+        async def aexecute_query_replica(state: State, config=None):
+            output = await asyncio.to_thread(replica_output, state, typed_results)
+            return output if output is not None else await execute_fn(state, config)
+        return aexecute_query_replica
+
+    def execute_query_replica(state: State, config=None):
+        output = replica_output(state, typed_results)
+        return output if output is not None else execute_fn(state, config)
+    return execute_query_replica
+
+def is_chart_route(state: State):
+    """Whether the question was routed to a chart (see route_question)."""
+    return state.get("route") == "get_visualization"
+
+def result_key(state: State):
+    """
+    Normalized SQL identifying a result for the result cache and query dedupe. Large results of
+    chart questions are reduced in the warehouse, so they are kept apart from text ones.
+    """
+    key = " ".join(state["query"].split())
+    return f"{key} -- chart" if is_chart_route(state) else key
+
+def _fit_output(output, max_rows=RESULT_MAX_ROWS, max_bytes=RESULT_MAX_BYTES):
+    """Applies the row and byte budgets to the output of an execute node."""
+    if output.get("result_df") is not None:
+        df, truncated = fit_frame(output["result_df"], max_rows, max_bytes)
+        if truncated:
+            output = {**output, "result": summarize_frame(df), "result_df": df}
+    else:
+        result, truncated = fit_text_result(output.get("result"))
+        output = {**output, "result": result}
+    if truncated:
+        metrics.incr("result.truncated")
+    return {**output, "result_truncated": truncated, "result_note": None}
+
+def _budgets(state: State, typed_results):
+    # Typed results of chart questions get the chart budgets, and are reduced when they exceed them
+    if typed_results and is_chart_route(state):
+        return CHART_RESULT_MAX_ROWS, CHART_RESULT_MAX_BYTES
+    return RESULT_MAX_ROWS, RESULT_MAX_BYTES
+
+def _chart_reduction(state: State, output, max_rows, typed_results):
+    """
+    SQL and note of the warehouse-side reduction of a chart result that exceeded its row budget,
+    else (None, None).
+    """
+    df = output.get("result_df")
+    if not (typed_results and is_chart_route(state)) or df is None or len(df) <= max_rows:
+        return None, None
+    return reduce_chart_query(state["query"], df, max_rows, get_db().dialect)
+
+def _reduced_output(output, reduced_output, note, max_rows, max_bytes):
+    # A failed reduction keeps the first rows of the result
+    if reduced_output.get("result_df") is None:
+        return _fit_output(output, max_rows, max_bytes)
+    metrics.incr("result.reduced")
+    return {**_fit_output(reduced_output, max_rows, max_bytes), "result_truncated": True, "result_note": note}
+
+def with_result_budget(execute_fn, typed_results=False):
+    """
+    Wraps an execute node (sync or async) so the query runs with a LIMIT of RESULT_MAX_ROWS
+    (CHART_RESULT_MAX_ROWS for typed results of chart questions) and the result is cut to the
+    byte budget. A chart result over its row budget is replaced by the result of
+    reduce_chart_query, so the warehouse aggregates or samples it rather than the app.
+    `query` in the state keeps the SQL as generated.
+    """
+    if inspect.iscoroutinefunction(execute_fn):
+        async def aexecute_query_bounded(state: State, config=None):
+            max_rows, max_bytes = _budgets(state, typed_results)
+            query = limit_query(state["query"], max_rows, get_db().dialect)
+            output = await execute_fn({**state, "query": query}, config)
+            reduced_query, note = _chart_reduction(state, output, max_rows, typed_results)
+            if reduced_query is None:
+                return _fit_output(output, max_rows, max_bytes)
+            reduced_output = await execute_fn({**state, "query": reduced_query}, config)
+            return _reduced_output(output, reduced_output, note, max_rows, max_bytes)
+        return aexecute_query_bounded
+
+    def execute_query_bounded(state: State, config=None):
+        max_rows, max_bytes = _budgets(state, typed_results)
+        output = execute_fn({**state, "query": limit_query(state["query"], max_rows, get_db().dialect)}, config)
+        reduced_query, note = _chart_reduction(state, output, max_rows, typed_results)
+        if reduced_query is None:
+            return _fit_output(output, max_rows, max_bytes)
+        reduced_output = execute_fn({**state, "query": reduced_query}, config)
+        return _reduced_output(output, reduced_output, note, max_rows, max_bytes)
+    return execute_query_bounded
+
+#Guards the shared query_results dicts of sync runs
+_shared_results_lock = threading.Lock()
+
+def with_query_dedupe(execute_fn):
+    """
+    Wraps an execute node (sync or async) so runs that pass the same dict as
+    configurable.query_results (e.g. the questions of one batch) execute each distinct SQL query
+    once; concurrent and later runs with the same SQL reuse the first run's output.
+    """
+    if inspect.iscoroutinefunction(execute_fn):
+        async def aexecute_query_deduped(state: State, config=None):
+            shared = _configurable(config).get("query_results")
+            if shared is None:
+                return await execute_fn(state, config)
+            key = result_key(state)
+            future = shared.get(key)
+            if future is None:
+                future = shared[key] = asyncio.ensure_future(execute_fn(state, config))
+            else:
+                metrics.incr("query_dedupe.hit")
+                add_to_span("cache_hits", 1)
+            # Shielded so a cancelled run does not cancel the query other runs wait for
+            return dict(await asyncio.shield(future))
+        return aexecute_query_deduped
+
+    def execute_query_deduped(state: State, config=None):
+        shared = _configurable(config).get("query_results")
+        if shared is None:
+            return execute_fn(state, config)
+        key = result_key(state)
+        with _shared_results_lock:
+            future = shared.get(key)
+            owner = future is None
+            if owner:
+                future = shared[key] = concurrent.futures.Future()
+        if not owner:
+            metrics.incr("query_dedupe.hit")
+            add_to_span("cache_hits", 1)
+            return dict(future.result())
+        try:
+            output = execute_fn(state, config)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(output)
+        return dict(output)
+    return execute_query_deduped
+
+def write_query_cached(state: State, config=None):
+    """Generate SQL query, reusing the SQL of an identical or similar earlier question."""
+    # A rejected query is regenerated; its replacement overwrites the cached SQL
+    query = None if state.get("validation_error") else get_query_cache().get_sql(state["question"])
+    if query is not None:
+        add_to_span("cache_hits", 1)
+        return {"query": query}
+    output = write_query(state, config)
+    get_query_cache().put_sql(state["question"], output["query"])
+    return output
+
+async def awrite_query_cached(state: State, config=None):
+    """Async version of write_query_cached."""
+    query = None if state.get("validation_error") else get_query_cache().get_sql(state["question"])
+    if query is not None:
+        add_to_span("cache_hits", 1)
+        return {"query": query}
+    output = await awrite_query(state, config)
+    get_query_cache().put_sql(state["question"], output["query"])
+    return output
+
+def _cache_result(state: State, output):
+    # Errors are not cached so a transient failure is retried on the next question
+    if not str(output.get("result", "")).startswith("Error:"):
+        get_query_cache().put_result(result_key(state), output)
+
+def with_result_cache(execute_fn):
+    """Wraps an execute node (sync or async) so results are served from the query cache while the dataset is unchanged."""
+    if inspect.iscoroutinefunction(execute_fn):
+        async def aexecute_query_cached(state: State, config=None):
+            output = get_query_cache().get_result(result_key(state))
+            if output is None:
+                output = await execute_fn(state, config)
+                _cache_result(state, output)
+            else:
+                add_to_span("cache_hits", 1)
+            return output
+        return aexecute_query_cached
+
+    def execute_query_cached(state: State, config=None):
+        output = get_query_cache().get_result(result_key(state))
+        if output is None:
+            output = execute_fn(state, config)
+            _cache_result(state, output)
+        else:
+            add_to_span("cache_hits", 1)
+        return output
+    return execute_query_cached
+
+def state_prompt_result(state: State):
+    """The query result as it goes into prompts, cut to PROMPT_RESULT_MAX_CHARS."""
+    return prompt_result(state.get("result"), state.get("result_truncated", False), note=state.get("result_note"))
+
+def state_question(state: State):
+    """The question as it goes into prompts; a follow-up comes with the question its result answers."""
+    if state.get("follow_up"):
+        return f'{state["context_question"]}\nFollow-up: {state["question"]}'
+    return state["question"]
+
+def build_answer_prompt(state: State):
+    """Prompt asking the LLM to answer the question from the SQL query and its result."""
+    return (
         "Given the following user question, corresponding SQL query, "
         "and SQL result, answer the user question.\n\n"
-        f'Question: {state["question"]}\n'
+        f'Question: {state_question(state)}\n'
         f'SQL Query: {state["query"]}\n'
-        f'SQL Result: {state["result"]}'
+        f'SQL Result: {state_prompt_result(state)}'
     )
-    response = llm.invoke(prompt)
+
+#Generate answer
+def generate_answer(state: State, config=None):
+    """Answer question using retrieved information as context."""
+    with scheduler.slot_sync("llm", _session(config)):
+        response = get_llm().invoke(build_answer_prompt(state))
+    return {"answer": response.content}
+
+async def agenerate_answer(state: State, config=None):
+    """Async version of generate_answer."""
+    async with scheduler.slot("llm", _session(config)):
+        response = await get_llm().ainvoke(build_answer_prompt(state))
     return {"answer": response.content}
 
 def parse_response_to_dict(response: str) -> dict:
@@ -87,142 +425,429 @@ def parse_response_to_dict(response: str) -> dict:
     
     return response_dict
 
+def build_viz_prompt(state: State):
+    """Prompt asking the LLM to recommend a chart type for the question and its SQL result."""
+    return get_viz_prompt().format(question=state_question(state), query=state["query"], result=state_prompt_result(state))
+
 #Generate visualization
-def get_visualization(state: State):
+def get_visualization(state: State, config=None):
     """Returns recommended visualization or charts using retrieved information as context."""
-    viz_prompt = f"""
-    You are an AI assistant that recommends appropriate data visualizations for price,count,size,colour,brand distribution and analysis for t shirts in a store.
-    Based on the user's question, SQL query, and query results, suggest the most suitable type of graph or chart to visualize the data.
-
-    Available chart types and their best use cases:
-
-    - Bar Graphs (for 3+ categories): 
-    * Comparing distributions or counts across multiple categories such as size, colour or brand
-    * Average discount percentage or effectiveness by brand.
-    
-    - Stacked Bar Chart: 
-    * Stock quantity by brand,size or color, grouped by size,color or brand.                                       
-
-    - Histogram:
-    * Distribution of discount percentages or t shirt prices.
-      Note: Total should sum to 100%
-                                              
-    - Scatter Plots (for numeric relationships):
-    * T-shirt price vs. discount percentage to see how discounts vary with price of t shirts
-    * Stock quantity vs. discount percentage to identify trends (e.g., are high-stock items discounted more?).
-    * Price vs. stock quantity to see if cheaper t-shirts have higher stock.                                         
-    Note: Both axes must be numeric, non-categorical
-    
-    - Pie chart
-    * Proportion of stock contributed by each brand or color.
-                                              
-    Special Cases:
-    Raw Data:
-    * Individual records → No chart (tabular display)
-    * Non-aggregated data → No chart (tabular display)
-
-    Tables in scope:
-    - t_shirts: t_shirt_id, brand, color, size, price, stock_quantity
-    - discounts: discount_id, t_shirt_id, pct_discount
+    with scheduler.slot_sync("llm", _session(config)):
+        response = get_llm().invoke(build_viz_prompt(state))
+    # Update the state with the response_dict
+    state["answer"] = response.content  # Explicitly store it in state
+    return state
 
-    Question: {state["question"]}
-    SQL Query: {state["query"]}
-    SQL Result: {state["result"]}
+async def aget_visualization(state: State, config=None):
+    """Async version of get_visualization."""
+    async with scheduler.slot("llm", _session(config)):
+        response = await get_llm().ainvoke(build_viz_prompt(state))
+    state["answer"] = response.content
+    return state
 
-    Provide your response in the following format:
-    Recommended Visualization: [Chart type or "none"]. ONLY use the following names: bar, stacked bar, histogram, pie, scatter.
-    Reason: [Brief explanation for your recommendation]
+def result_frame(state: State):
+    """The typed result when available, otherwise the string result parsed back into rows."""
+    df = state.get("result_df")
+    if df is None:
+        rows = parse_result_rows(state.get("result"))
+        df = to_frame(rows) if rows else None
+    return df
+
+def confident_chart_type(state: State):
+    """The router's chart type guess for the question when it is at least ROUTER_MIN_CONFIDENCE sure, else None."""
+    if (state.get("chart_confidence") or 0) >= ROUTER_MIN_CONFIDENCE:
+        return state.get("predicted_chart_type")
+    return None
+
+def _recommendation(chart_type, reason):
+    recommendation = f"Recommended Visualization: {chart_type or 'none'}\nReason: {reason}"
+    return {"chart_type": chart_type or "none", "recommendation": recommendation}
+
+#Recommend a chart from the result shape, then the router's guess, asking the LLM only when neither is confident
+def heuristic_chart_type(state: State):
+    """
+    (chart_type, reason) from the result shape, else from the router's confident guess; None
+    when the LLM has to recommend the chart, always so when the heuristic finds the shape
+    ambiguous for the question (e.g. an explicitly requested chart type the result does not fit).
+    """
+    chart_type, reason, ambiguous = recommend_chart_heuristic(result_frame(state), state_question(state))
+    if chart_type is None and not ambiguous and confident_chart_type(state):
+        chart_type, reason = confident_chart_type(state), "Predicted from the question by the router"
+    return chart_type, reason
+
+def recommend_chart(state: State, config=None):
+    """Returns the chart type for the result, written to 'chart_type' so it can run alongside generate_answer."""
+    chart_type, reason = heuristic_chart_type(state)
+    if chart_type is None:
+        with scheduler.slot_sync("llm", _session(config)):
+            response_dict = parse_response_to_dict(get_llm().invoke(build_viz_prompt(state)).content)
+        chart_type = response_dict.get("Recommended Visualization")
+        reason = response_dict.get("Reason")
+    return _recommendation(chart_type, reason)
+
+async def arecommend_chart(state: State, config=None):
+    """Async version of recommend_chart."""
+    chart_type, reason = heuristic_chart_type(state)
+    if chart_type is None:
+        async with scheduler.slot("llm", _session(config)):
+            response = await get_llm().ainvoke(build_viz_prompt(state))
+        response_dict = parse_response_to_dict(response.content)
+        chart_type = response_dict.get("Recommended Visualization")
+        reason = response_dict.get("Reason")
+    return _recommendation(chart_type, reason)
+
+def prepare_transform(state: State):
     """
+    Resolves the chart data without an LLM when possible.
 
-    response = llm.invoke(viz_prompt)
-    # Update the state with the response_dict
-    state["answer"] = response.content  # Explicitly store it in state
-    return state
+    Returns:
+        tuple: (output, None, chart_type) when the output is final, or (None, transform_chain, chart_type)
+        when the LLM transform chain has to be invoked with the state.
+    """
+    dump("State in transform_data_for_visualization_chain:", state)
+    chart_type = state.get("chart_type")
+    if not chart_type and state.get("answer"):
+        answer=state.get("answer")
+        response_dict = parse_response_to_dict(answer)
+        chart_type = response_dict.get("Recommended Visualization")
+    if not chart_type:
+        # get_visualization was skipped because the router was confident about the chart type
+        chart_type = confident_chart_type(state)
+    logger.debug("Chart type in transform_data_for_visualization_chain: %s", chart_type)
+    result = state.get("result")
+    if not chart_type or not result or chart_type == 'none':
+        return {"viz_data": None}, None, chart_type
+    # Chart titles and the transform prompt describe the data, so follow-ups use the question it answers
+    question = state.get("context_question") or state.get("question")
+
+    # Sample or aggregate large results down to what the chart can show, then shape the rows
+    # directly when the result has an unambiguous layout for the chart type
+    df = shape_for_chart(chart_type, result_frame(state))
+    if df is not None:
+        # A second numeric column only weights a histogram when the SQL counts the rows of each value
+        counts = count_column(state["query"], get_db().dialect) if chart_type == "histogram" and state.get("query") else None
+        chart_data = build_chart_data(chart_type, df, question, counts)
+        if chart_data:
+            viz_data = add_chart_note(json.dumps(chart_data), chart_note(state))
+            return {'viz_data':viz_data,'chart_type':chart_type}, None, chart_type
+        result = rows_text(df)
+
+    # Otherwise fall back to the LLM transform, with the result cut to the prompt budget
+    result = prompt_result(result, state.get("result_truncated", False), note=state.get("result_note"))
+    transform_prompt=create_data_transform_prompt(chart_type.lower())
+    dump("Transform Prompt in transform_data_for_visualization_chain:", transform_prompt)
+    assign_chart_type_and_result = RunnableLambda(
+        lambda args: {**args, "chart_type": chart_type, "result": result, "question": question}
+    )
+    # The chart JSON is not shown token by token, also when the transform runs inside recommend_chart
+    transform_chain = (
+        assign_chart_type_and_result
+        | transform_prompt
+        | get_llm()
+    ).with_config(tags=[TAG_NOSTREAM])
+    return None, transform_chain, chart_type
+
+def chart_note(state: State):
+    """Note shown under the chart when the result it is built from was cut or reduced to its budget, else None."""
+    if not state.get("result_truncated"):
+        return None
+    if state.get("result_note"):
+        return state["result_note"]
+    df = result_frame(state)
+    return truncation_note(len(df)) if df is not None else None
+
+def add_chart_note(viz_data, note):
+    """viz_data with `note` added to its chart_data; text that is not chart JSON is returned unchanged."""
+    if not note or not viz_data:
+        return viz_data
+    try:
+        parsed = json.loads(viz_data.replace('```json', '').replace('```', '').strip())
+        parsed["chart_data"]["note"] = note
+    except (ValueError, KeyError, TypeError):
+        return viz_data
+    return json.dumps(parsed)
 
 #@RunnableLambda
-def transform_data_for_visualization_chain(state:State):
+def transform_data_for_visualization_chain(state:State, config=None):
      try:
-         answer=state.get("answer")
-         response_dict = parse_response_to_dict(answer)
-         print("State in transform_data_for_visualization_chain:", state)
-         chart_type = response_dict.get("Recommended Visualization")
-         print("Chart type in transform_data_for_visualization_chain:", chart_type)
-         #return response_dict
-         result = state.get("result")
-         if not chart_type or not result:
-            return {"viz_data": None}
-        
-         if chart_type == 'none':
-            transform_prompt = None
-         else:
-            transform_prompt=create_data_transform_prompt(chart_type.lower(),result,state.get("question"))
-            print("Transform Prompt in transform_data_for_visualization_chain:", transform_prompt)
-
-         assign_chart_type_and_result = RunnableLambda(
-            lambda args: {**args, "chart_type": chart_type, "result": result}
-         )
-
-         if transform_prompt:
-            transform_chain = (
-                assign_chart_type_and_result
-                | transform_prompt
-                | llm
-            )
+         output, transform_chain, chart_type = prepare_transform(state)
+         if transform_chain is None:
+            return output
+         with scheduler.slot_sync("llm", _session(config)):
             response=transform_chain.invoke(state)
-            print("Response in transform_data_for_visualization_chain:", response)
-            return {'viz_data':response.content,'chart_type':chart_type}
-
-         return {"viz_data": None}
+         dump("Response in transform_data_for_visualization_chain:", response.content)
+         return {'viz_data':add_chart_note(response.content, chart_note(state)),'chart_type':chart_type}
 
      except Exception as e:
-        print(e)
-        print(f"Error in transform_data_for_visualization: {e}")
+        logger.exception("Error in transform_data_for_visualization: %s", e)
+        return {"viz_data": None}
+
+async def atransform_data_for_visualization_chain(state:State, config=None):
+    """Async version of transform_data_for_visualization_chain."""
+    try:
+        output, transform_chain, chart_type = prepare_transform(state)
+        if transform_chain is None:
+            return output
+        async with scheduler.slot("llm", _session(config)):
+            response = await transform_chain.ainvoke(state)
+        return {'viz_data':add_chart_note(response.content, chart_note(state)),'chart_type':chart_type}
+    except Exception as e:
+        logger.exception("Error in transform_data_for_visualization: %s", e)
         return {"viz_data": None}
-          
-   
+
+def recommend_and_shape_chart(state: State, config=None):
+    """
+    recommend_chart followed by the chart transform, as the recommend_chart node of the parallel
+    graph. A separate transform node would only start in the next step, once generate_answer
+    (which runs alongside) had finished, so the chart would never arrive before the answer.
+    """
+    output = recommend_chart(state, config)
+    return {**output, **transform_data_for_visualization_chain({**state, **output}, config)}
+
+async def arecommend_and_shape_chart(state: State, config=None):
+    """Async version of recommend_and_shape_chart."""
+    output = await arecommend_chart(state, config)
+    return {**output, **await atransform_data_for_visualization_chain({**state, **output}, config)}
+
+
+def route_question(state: State, config=None):
+    """
+    Predicts with the local router whether the question wants a chart and which one. Runs
+    alongside the first node, so the prediction is in the state by the time it is needed.
+    """
+    route = get_router().predict(state["question"])
+    metrics.incr(f"router.{route.route}")
+    return {"route": route.route, "predicted_chart_type": route.chart_type, "chart_confidence": route.chart_confidence}
+
+async def aroute_question(state: State, config=None):
+    """Async version of route_question; a prediction takes microseconds, so it runs on the event loop."""
+    return route_question(state, config)
+
 def get_flow(state:State):
     """
-    Determines whether to go to 'generate_answer' or 'get_visualization'
-    based on the user query stored in the state.
+    Determines whether to go to 'generate_answer' or 'get_visualization' based on the route
+    predicted for the question (see route_question). Visualization questions whose chart type
+    the router is confident about go straight to 'transform_data_for_visualization_chain'.
 
     Args:
         state (dict): The current state containing the user query.
 
     Returns:
-        str: The next node ('generate_answer' or 'get_visualization').
+        str: The next node.
     """
-    # Extract the user query from the state
-    user_query = state.get("question", "")
+    route = state.get("route") or get_router().predict(state.get("question", "")).route
+    if route == "get_visualization" and confident_chart_type(state):
+        return "transform_data_for_visualization_chain"
+    return route
 
-    # Example condition: Check for keywords in the query
-    visualization_keywords = ["chart", "graph", "visualize", "plot", "diagram"]
 
-    # Check if the query contains visualization-related keywords
-    if any(keyword in user_query.lower() for keyword in visualization_keywords):
-        return "get_visualization"
-
-    # Default flow
+def get_parallel_flow(state:State):
+    """
+    Routing used by the parallel graph: visualization questions get the text answer and the
+    chart recommendation at the same time.
+    """
+    if get_flow(state) != "generate_answer":
+        return ["generate_answer", "recommend_chart"]
     return "generate_answer"
 
 
-def build_graph():
-    graph_builder = StateGraph(State).add_sequence(
-    [write_query, execute_query]
-    )
-    graph_builder.add_edge(START, "write_query")
-    graph_builder.add_conditional_edges(
-        "execute_query",
-        lambda state: get_flow(state)  # Only valid nodes: "generate_answer" or "get_visualization"
+def classify_question(state: State, config=None):
+    """
+    First node of the follow-up graph. The checkpointed state still holds the previous turn of
+    the chat, so a follow-up keeps its SQL and result; a new question starts from a clean turn.
+    """
+    follow_up = classify_follow_up(
+        state["question"], state.get("query"), state.get("result"), get_schema_cache().get_columns()
     )
-    graph_builder.add_node("generate_answer", generate_answer)
-    graph_builder.add_edge("generate_answer", END)
+    metrics.incr(f"follow_up.{follow_up or 'new'}")
+    if follow_up is None:
+        return {"follow_up": None, "context_question": state["question"], "query": None, "result": None,
+                "result_df": None, "result_truncated": False, "result_note": None, "answer": None, "chart_type": None,
+                "recommendation": None, "viz_data": None, "validation_error": None, "query_attempts": 0}
+    logger.info("Follow-up (%s) answered from the previous result: %s", follow_up, state["question"])
+    # The SQL and its result are reused, which counts as a cache hit of this turn
+    add_to_span("cache_hits", 1)
+    chart_type = requested_chart_type(state["question"]) if follow_up == "chart" else None
+    return {"follow_up": follow_up, "answer": None, "chart_type": chart_type, "recommendation": None,
+            "viz_data": None}
+
+async def aclassify_question(state: State, config=None):
+    """Async version of classify_question; a schema cache miss reads table info from the warehouse."""
+    return await asyncio.to_thread(classify_question, state, config)
+
+def get_follow_up_flow(state: State, parallel_viz=False):
+    """Next node after classify_question: new SQL, or straight to the answer or chart nodes for follow-ups."""
+    follow_up = state.get("follow_up")
+    if follow_up == "answer":
+        return "generate_answer"
+    if follow_up == "chart":
+        # A chart type named in the follow-up needs no recommendation
+        if state.get("chart_type"):
+            return "transform_data_for_visualization_chain"
+        return "recommend_chart" if parallel_viz else "get_visualization"
+    return "write_query"
+
+
+#Sync and async implementations of every node; build_graph(async_nodes=True) uses the async ones
+SYNC_NODES = {
+    "route_question": route_question,
+    "classify_question": classify_question,
+    "write_query": write_query,
+    "write_query_cached": write_query_cached,
+    "validate_query": validate_query,
+    "execute_query": execute_query,
+    "execute_query_typed": execute_query_typed,
+    "generate_answer": generate_answer,
+    "get_visualization": get_visualization,
+    "recommend_chart": recommend_and_shape_chart,
+    "transform_data_for_visualization_chain": transform_data_for_visualization_chain,
+}
+ASYNC_NODES = {
+    "route_question": aroute_question,
+    "classify_question": aclassify_question,
+    "write_query": awrite_query,
+    "write_query_cached": awrite_query_cached,
+    "validate_query": avalidate_query,
+    "execute_query": aexecute_query,
+    "execute_query_typed": aexecute_query_typed,
+    "generate_answer": agenerate_answer,
+    "get_visualization": aget_visualization,
+    "recommend_chart": arecommend_and_shape_chart,
+    "transform_data_for_visualization_chain": atransform_data_for_visualization_chain,
+}
+
+
+def build_graph(typed_results=False, cache_queries=False, parallel_viz=False, async_nodes=False, use_replica=False,
+                bound_results=True, validate_queries=False, dedupe_queries=False, trace_nodes=True,
+                follow_ups=False):
+    """
+    Builds and compiles the question answering graph.
 
-    # Explicitly define the visualization sequence and its connection
-    graph_builder.add_node("get_visualization", get_visualization)
-    graph_builder.add_node("transform_data_for_visualization_chain", transform_data_for_visualization_chain)
-    graph_builder.add_edge("get_visualization", "transform_data_for_visualization_chain")
+    Args:
+        typed_results (bool): Execute queries into a typed DataFrame (`result_df`) with a compact
+            text summary in `result`, instead of the stringified rows from QuerySQLDataBaseTool.
+        cache_queries (bool): Serve generated SQL and query results from the query cache when possible.
+        parallel_viz (bool): For visualization questions, run generate_answer and recommend_chart
+            (a heuristic chart recommender followed by the chart transform) in parallel branches,
+            shaping the chart data without an LLM when possible.
+        async_nodes (bool): Use the async node implementations; the graph must then be driven with
+            ainvoke/astream. LLM and warehouse calls go through the shared scheduler either way.
+        use_replica (bool): Run queries on the local DuckDB replica of t_shirts/discounts while it
+            is fresh, falling back to the warehouse otherwise.
+        bound_results (bool): Run queries with a LIMIT and cut results to the row and byte
+            budgets of dataviz.result_shaping (RESULT_MAX_ROWS, RESULT_MAX_BYTES; CHART_RESULT_MAX_ROWS
+            and CHART_RESULT_MAX_BYTES for typed results of chart questions, which are aggregated or
+            sampled in the warehouse when they exceed them).
+        validate_queries (bool): Validate the generated SQL and check its dry run scan estimate
+            before execution, regenerating rejected queries without touching the warehouse.
+        dedupe_queries (bool): Execute identical SQL once across runs that share a
+            configurable.query_results dict, as the batch runner does.
+        trace_nodes (bool): Record a span per node run (wall time, LLM tokens, warehouse bytes,
+            rows, cache hits and result sizes) with dataviz.telemetry.
+        follow_ups (bool): Keep the state of each chat with a checkpointer, so the graph must be
+            run with a configurable.thread_id. Follow-ups that chart or re-word the previous
+            result skip write_query and execute_query (see dataviz.conversation).
+    """
+    nodes = ASYNC_NODES if async_nodes else SYNC_NODES
+    write_node = nodes["write_query_cached"] if cache_queries else nodes["write_query"]
+    execute_node = nodes["execute_query_typed"] if typed_results else nodes["execute_query"]
+    if use_replica:
+        execute_node = with_replica(execute_node, typed_results)
+    if bound_results:
+        execute_node = with_result_budget(execute_node, typed_results)
+    if cache_queries:
+        execute_node = with_result_cache(execute_node)
+    if dedupe_queries:
+        execute_node = with_query_dedupe(execute_node)
+
+    graph_builder = StateGraph(State)
+
+    def add_node(name, node_fn):
+        graph_builder.add_node(name, traced(name, node_fn) if trace_nodes else node_fn)
+
+    add_node("write_query", write_node)
+    add_node("execute_query", execute_node)
+    # The question is routed while the first node runs; the branch ends once the route is in the state
+    add_node("route_question", nodes["route_question"])
+    graph_builder.add_edge(START, "route_question")
+    graph_builder.add_edge("route_question", END)
+    if follow_ups:
+        add_node("classify_question", nodes["classify_question"])
+        graph_builder.add_edge(START, "classify_question")
+        follow_up_targets = ["write_query", "generate_answer", "transform_data_for_visualization_chain",
+                             "recommend_chart" if parallel_viz else "get_visualization"]
+        graph_builder.add_conditional_edges(
+            "classify_question", lambda state: get_follow_up_flow(state, parallel_viz), follow_up_targets
+        )
+    else:
+        graph_builder.add_edge(START, "write_query")
+    if validate_queries:
+        add_node("validate_query", nodes["validate_query"])
+        graph_builder.add_edge("write_query", "validate_query")
+        graph_builder.add_conditional_edges(
+            "validate_query", get_validation_flow, ["execute_query", "write_query", "generate_answer"]
+        )
+    else:
+        graph_builder.add_edge("write_query", "execute_query")
+    add_node("generate_answer", nodes["generate_answer"])
+    graph_builder.add_edge("generate_answer", END)
+    add_node("transform_data_for_visualization_chain", nodes["transform_data_for_visualization_chain"])
     graph_builder.add_edge("transform_data_for_visualization_chain", END)
-    graph = graph_builder.compile()
+
+    if parallel_viz:
+        # generate_answer and recommend_chart run in the same step, and recommend_chart also shapes
+        # the chart, so its output (recommendation, chart_type, viz_data) does not wait for the answer
+        graph_builder.add_conditional_edges("execute_query", get_parallel_flow, ["generate_answer", "recommend_chart"])
+        add_node("recommend_chart", nodes["recommend_chart"])
+        graph_builder.add_edge("recommend_chart", END)
+    else:
+        graph_builder.add_conditional_edges(
+            "execute_query", get_flow, ["generate_answer", "get_visualization", "transform_data_for_visualization_chain"]
+        )
+        # Explicitly define the visualization sequence and its connection
+        add_node("get_visualization", nodes["get_visualization"])
+        graph_builder.add_edge("get_visualization", "transform_data_for_visualization_chain")
+    # One saver per compiled graph; get_graph shares it across the sessions of the process
+    graph = graph_builder.compile(checkpointer=ConversationSaver() if follow_ups else None)
     return graph
 
 
+#Compiled graphs are kept for the lifetime of the process, keyed by the graph configuration,
+#so Streamlit reruns and sessions share one compiled graph instead of rebuilding it per question
+_compiled_graphs = {}
+_compiled_graphs_lock = threading.Lock()
+
+def get_graph(**config):
+    """
+    Returns the compiled graph for the given configuration, building it on first use.
+
+    Args:
+        **config: Keyword arguments forwarded to build_graph().
+
+    Returns:
+        The compiled graph shared by all callers using the same configuration.
+    """
+    key = tuple(sorted(config.items()))
+    graph = _compiled_graphs.get(key)
+    if graph is None:
+        with _compiled_graphs_lock:
+            # Re-check under the lock so concurrent sessions compile only once
+            graph = _compiled_graphs.get(key)
+            if graph is None:
+                graph = build_graph(**config)
+                _compiled_graphs[key] = graph
+    return graph
+
+def warm_up(**config):
+    """Creates the shared resources and compiles the graph ahead of the first question, e.g. when the server starts."""
+    resources.warm_up()
+    if config.get("use_replica"):
+        get_replica().refresh_in_background()
+    return get_graph(**config)
+
+def clear_graph_cache():
+    """Drops all compiled graphs so the next get_graph() call rebuilds them."""
+    with _compiled_graphs_lock:
+        _compiled_graphs.clear()
+
+
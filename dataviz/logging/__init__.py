@@ -1,22 +1,120 @@
 import os
 import sys
+import atexit
+import queue
+import random
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
+import pandas as pd
+from dataviz.metrics import metrics
+
+load_dotenv()
 
 logging_str = "[%(asctime)s: %(levelname)s: %(module)s: %(message)s]"
-log_dir = "logs"
+log_dir = os.getenv("LOG_DIR", "logs")
 log_filepath = os.path.join(log_dir,"running_logs.log")
 os.makedirs(log_dir, exist_ok=True)
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# running_logs.log is rotated at LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT older files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Records waiting for the writer thread; when it is full new records are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Longest string kept in a logged payload; state fields in LOG_REDACT_FIELDS are only described
+LOG_FIELD_MAX_CHARS = int(os.getenv("LOG_FIELD_MAX_CHARS", "300"))
+LOG_REDACT_FIELDS = set(os.getenv("LOG_REDACT_FIELDS", "result,result_df,viz_data").split(","))
+# Fraction of dump() calls written when LOG_LEVEL is DEBUG
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking the caller."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr("logging.dropped")
+
+
+def log_level(name):
+    """Numeric level of a level name such as "DEBUG", or None when the name is not a logging level."""
+    return logging.getLevelNamesMapping().get(str(name).upper())
+
+
+def configure_logging(target=None, level=LOG_LEVEL, filepath=log_filepath, stream=sys.stdout,
+                      queue_size=LOG_QUEUE_SIZE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """
+    Sends the records of `target` (the package logger by default) through a bounded queue to a
+    rotating log file and `stream`, written by a background thread. The queue handler is added
+    to the handlers `target` already has; the root logger and other libraries are left alone.
+
+    :return: The started QueueListener; stop() flushes the queue.
+    """
+    target = target or logger
+    formatter = logging.Formatter(logging_str)
+    handlers = [RotatingFileHandler(filepath, maxBytes=max_bytes, backupCount=backup_count)]
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.Queue(queue_size)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    target.addHandler(DroppingQueueHandler(log_queue))
+    target.setLevel(level)
+    listener.start()
+    return listener
+
+
+def compact(value, max_chars=LOG_FIELD_MAX_CHARS):
+    """
+    A loggable copy of a payload (e.g. a graph step): strings are cut to `max_chars`, fields in
+    LOG_REDACT_FIELDS and DataFrames are replaced by their size. Runs in the caller's thread, so
+    it never formats a whole result set.
+    """
+    if isinstance(value, dict):
+        return {
+            key: _describe(key, item) if key in LOG_REDACT_FIELDS else compact(item, max_chars)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        items = [compact(item, max_chars) for item in value[:10]]
+        return items + [f"... {len(value) - 10} more"] if len(value) > 10 else items
+    if isinstance(value, pd.DataFrame):
+        return f"<DataFrame {value.shape[0]}x{value.shape[1]}>"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) > max_chars:
+        return f"{text[:max_chars]}... ({len(text)} chars)"
+    return text
+
+
+def _describe(key, value):
+    if isinstance(value, pd.DataFrame):
+        return f"<{key}: DataFrame {value.shape[0]}x{value.shape[1]}>"
+    if isinstance(value, str):
+        return f"<{key}: {len(value)} chars>"
+    return f"<{key}: {type(value).__name__}>"
 
 
-logging.basicConfig(
-    level= logging.INFO,
-    format= logging_str,
+def dump(message, payload, sample_rate=None):
+    """
+    Logs a compacted payload at DEBUG level for a sample of the calls. Nothing is built unless
+    debug logging is on and the call is sampled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= (LOG_DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate):
+        return
+    logger.debug("%s %s", message, compact(payload), stacklevel=2)
 
-    handlers=[
-        logging.FileHandler(log_filepath),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 
-logger = logging.getLogger("dataVizLogger")
\ No newline at end of file
+logger = logging.getLogger("dataVizLogger")
+_level = log_level(LOG_LEVEL)
+_listener = configure_logging(logger, level=logging.INFO if _level is None else _level)
+atexit.register(_listener.stop)
+if _level is None:
+    logger.warning("Unknown LOG_LEVEL %r, logging at INFO", LOG_LEVEL)
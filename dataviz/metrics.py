@@ -0,0 +1,75 @@
+import math
+import threading
+from collections import defaultdict, deque
+
+# Only the most recent observations per metric are kept for percentile summaries
+MAX_SAMPLES = 10000
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 when empty)."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Metrics:
+    """Process-wide counters and timing observations, safe to update from several threads."""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._observations = defaultdict(lambda: deque(maxlen=max_samples))
+        # Count and sum of every observation since the start (or reset), unlike the bounded samples
+        self._totals = defaultdict(lambda: [0, 0.0])
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            self._observations[name].append(value)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += value
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def summary(self, name):
+        """
+        Count, mean, p50, p95 and max of the most recent observations, with `total` and `sum`
+        counting every observation since the start.
+        """
+        with self._lock:
+            values = list(self._observations.get(name, ()))
+            total, value_sum = self._totals.get(name, (0, 0.0))
+        return {
+            "count": len(values),
+            "total": total,
+            "sum": value_sum,
+            "mean": sum(values) / len(values) if values else 0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values) if values else 0,
+        }
+
+    def snapshot(self):
+        """All counters and a summary of every observed metric."""
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._observations)
+        return {"counters": counters, "observations": {name: self.summary(name) for name in names}}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+            self._totals.clear()
+
+
+metrics = Metrics()
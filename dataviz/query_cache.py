@@ -0,0 +1,339 @@
+import hashlib
+import math
+import os
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+from dataviz.logging import logger
+from dataviz.metrics import metrics
+from dataviz.replica import REPLICA_TABLES
+
+load_dotenv()
+
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join("cache", "query_cache.sqlite"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+# Size of the entries of one cache level: in-memory size in the memory backend, pickled size in SQLite
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "86400"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "900"))
+# Minimum cosine similarity for a question to reuse the SQL of a previously seen question; 0 disables it.
+# With hashing_embedding, questions differing in one filter word ("white" vs "black" Levi t shirts,
+# "Nike" vs "Adidas") still score 0.8-0.9, so use 0.95 or more; numbers and quoted values must
+# match in any case. Lower it only with a real embedding model, after checking such pairs.
+SEMANTIC_THRESHOLD = float(os.getenv("QUERY_CACHE_SEMANTIC_THRESHOLD", "0"))
+
+# Quotes must start and end at word boundaries, so the apostrophes of "What's ... Levi's" are not a value
+_LITERAL_RE = re.compile(r"(?<!\w)'([^']*)'(?!\w)|(?<!\w)\"([^\"]*)\"(?!\w)|(\d+(?:\.\d+)?)")
+
+
+def entry_size(value):
+    """Approximate in-memory size of a cache entry; DataFrames are measured with memory_usage(deep=True)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sum(entry_size(key) + entry_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(entry_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry TTL, bounded by entry count and by entry_size."""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        # Caller holds the lock
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = entry_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            # An entry larger than the whole budget would evict everything else and is not stored
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, time.time() + ttl, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def items(self):
+        """Unexpired (key, value) pairs, without refreshing their recency."""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at, _) in self._entries.items() if expires_at >= now]
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class SQLiteBackend:
+    """
+    On-disk LRU store with per-entry TTL, shared by processes pointing at the same file and
+    bounded by entry count and by the pickled size of the entries.
+    """
+
+    def __init__(self, path=QUERY_CACHE_PATH, namespace="default", max_entries=QUERY_CACHE_MAX_ENTRIES,
+                 max_bytes=QUERY_CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT, key TEXT, value BLOB, expires_at REAL, accessed_at REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, blob, now + ttl, now),
+            )
+            # Evict expired entries, then the least recently used ones beyond the count and size bounds
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?", (self.namespace, now))
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM (SELECT key, "
+                "ROW_NUMBER() OVER (ORDER BY accessed_at DESC) AS position, "
+                "SUM(LENGTH(value)) OVER (ORDER BY accessed_at DESC ROWS UNBOUNDED PRECEDING) AS total "
+                "FROM cache_entries WHERE namespace = ?) WHERE position > ? OR total > ?)",
+                (self.namespace, self.namespace, self.max_entries, self.max_bytes),
+            )
+
+    def items(self):
+        """Unexpired (key, value) pairs, without refreshing their recency."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache_entries WHERE namespace = ? AND expires_at >= ?",
+                (self.namespace, time.time()),
+            ).fetchall()
+        return [(key, pickle.loads(value)) for key, value in rows]
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+
+def make_backend(namespace, backend=QUERY_CACHE_BACKEND):
+    """Creates the configured cache backend ('memory' or 'sqlite') for one cache level."""
+    if backend == "memory":
+        return MemoryBackend()
+    if backend == "sqlite":
+        return SQLiteBackend(namespace=namespace)
+    raise ValueError(f"Unknown query cache backend: {backend}")
+
+
+def normalize_question(question):
+    """Lower-cases the question and drops punctuation and repeated whitespace."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", question.lower()).split())
+
+
+def question_literals(question):
+    """Numbers and quoted values of a question, e.g. {'20', 'navy blue'}; similar questions must share them."""
+    return sorted({next(group for group in match.groups() if group is not None).lower()
+                   for match in _LITERAL_RE.finditer(question)})
+
+
+def hashing_embedding(text, dimensions=256):
+    """
+    Local stand-in for an embedding model: a normalized bag of hashed words and word bigrams.
+    Any callable returning a list of floats (e.g. OpenAIEmbeddings().embed_query) can replace it.
+    """
+    words = normalize_question(text).split()
+    vector = [0.0] * dimensions
+    for token in words + [" ".join(pair) for pair in zip(words, words[1:])]:
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _entry_sql(entry):
+    # SQL level entries are {"sql", "embedding", "literals"}; older caches hold the SQL string
+    return entry["sql"] if isinstance(entry, dict) else entry
+
+
+class QueryCache:
+    """
+    Two-level cache for the graph.
+
+    Level one maps a normalized question to the SQL generated for it, optionally matching
+    similar questions by embedding similarity; the embedding is stored in the same entry, so it
+    expires and is evicted with the SQL and is shared through the SQLite backend. Level two maps
+    SQL text plus a dataset freshness token to the query result; while the freshness token is
+    unknown (None) results are neither read from nor written to the cache.
+    """
+
+    def __init__(self, sql_backend=None, result_backend=None, embed=hashing_embedding,
+                 semantic_threshold=SEMANTIC_THRESHOLD, freshness_token=None):
+        self.sql_backend = sql_backend or make_backend("sql")
+        self.result_backend = result_backend or make_backend("result")
+        self.embed = embed
+        self.semantic_threshold = semantic_threshold
+        self.freshness_token = freshness_token or (lambda: "")
+
+    def _semantic_match(self, question):
+        if not self.semantic_threshold:
+            return None
+        vector, literals = self.embed(question), question_literals(question)
+        best_key, best_score = None, self.semantic_threshold
+        for key, entry in self.sql_backend.items():
+            # "under 20 dollars" must not reuse the SQL of "under 30 dollars", however similar the rest is
+            if not isinstance(entry, dict) or entry["embedding"] is None or entry["literals"] != literals:
+                continue
+            score = _cosine(vector, entry["embedding"])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get_sql(self, question):
+        key = normalize_question(question)
+        entry = self.sql_backend.get(key)
+        if entry is None:
+            similar = self._semantic_match(question)
+            if similar is not None:
+                entry = self.sql_backend.get(similar)
+                if entry is not None:
+                    metrics.incr("query_cache.sql.semantic_hit")
+        metrics.incr("query_cache.sql.hit" if entry is not None else "query_cache.sql.miss")
+        return _entry_sql(entry) if entry is not None else None
+
+    def put_sql(self, question, sql, ttl=SQL_CACHE_TTL):
+        embedding = self.embed(question) if self.semantic_threshold else None
+        entry = {"sql": sql, "embedding": embedding, "literals": question_literals(question)}
+        self.sql_backend.set(normalize_question(question), entry, ttl)
+
+    def _result_key(self, sql):
+        token = self.freshness_token()
+        if token is None:
+            return None
+        normalized_sql = " ".join(sql.split())
+        return hashlib.sha256(f"{token}|{normalized_sql}".encode("utf-8")).hexdigest()
+
+    def get_result(self, sql):
+        key = self._result_key(sql)
+        if key is None:
+            metrics.incr("query_cache.result.bypass")
+            return None
+        result = self.result_backend.get(key)
+        metrics.incr("query_cache.result.hit" if result is not None else "query_cache.result.miss")
+        return result
+
+    def put_result(self, sql, result, ttl=RESULT_CACHE_TTL):
+        key = self._result_key(sql)
+        if key is not None:
+            self.result_backend.set(key, result, ttl)
+
+    def clear(self):
+        self.sql_backend.clear()
+        self.result_backend.clear()
+
+    def stats(self):
+        """Hit/miss counters of both levels."""
+        names = ["sql.hit", "sql.miss", "sql.semantic_hit", "result.hit", "result.miss", "result.bypass"]
+        return {name: metrics.counter(f"query_cache.{name}") for name in names}
+
+
+def dataset_freshness_token(db, interval=60, tables=REPLICA_TABLES):
+    """
+    Freshness token of the dataset, checked at most once per `interval` seconds. On BigQuery it
+    is the latest table modification time from the dataset's __TABLES__ metadata; elsewhere it is
+    the DATASET_VERSION environment variable when set, otherwise a change marker of `tables`
+    ({table: monotonically increasing key}): row count and maximum key, as the replica uses.
+    Such a marker misses in-place updates, which RESULT_CACHE_TTL then bounds. When the check
+    fails the token is None until the next one, so results bypass the cache instead of being
+    served under a stale token.
+    """
+    state = {"token": "", "checked_at": 0.0}
+    lock = threading.Lock()
+
+    def marker_sql():
+        if db.dialect == "bigquery":
+            return f"SELECT MAX(last_modified_time) FROM `{os.getenv('BIGQUERY_DATASET')}.__TABLES__`"
+        return " UNION ALL ".join(f"SELECT COUNT(*), MAX({key}) FROM {table}" for table, key in tables.items())
+
+    def token():
+        if db.dialect != "bigquery" and os.getenv("DATASET_VERSION"):
+            return os.getenv("DATASET_VERSION")
+        with lock:
+            if time.time() - state["checked_at"] >= interval:
+                try:
+                    state["token"] = db.run(marker_sql())
+                except Exception as e:
+                    logger.warning("Dataset freshness check failed, query results are not cached: %s", e)
+                    state["token"] = None
+                state["checked_at"] = time.time()
+            return state["token"]
+
+    return token
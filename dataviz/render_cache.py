@@ -0,0 +1,100 @@
+import os
+import streamlit as st
+from dotenv import load_dotenv
+from dataviz.export import EXPORT_FORMAT, EXPORT_FORMATS, export_bytes
+from dataviz.metrics import metrics
+from dataviz.query_cache import MemoryBackend
+from dataviz.utils import build_figure
+
+load_dotenv()
+
+# Figures kept in memory, shared by all sessions of the process
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "128"))
+# Messages rendered on every rerun; earlier ones stay collapsed until the user expands them
+HISTORY_RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "10"))
+
+NO_EXPIRY = float("inf")
+
+_figures = MemoryBackend(RENDER_CACHE_MAX_ENTRIES)
+
+
+def remember_figure(message, figure):
+    """Caches a figure that was just built for a chart message (see session_store.chart_message)."""
+    _figures.set(message["chart_key"], figure, NO_EXPIRY)
+
+
+def chart_figure(message):
+    """The figure of a chart message, rebuilt from its chart type and spec only when it is not cached."""
+    figure = _figures.get(message["chart_key"])
+    if figure is None:
+        metrics.incr("render.figure.miss")
+        figure, _ = build_figure(message["chart_spec"], message["chart_type"])
+        _figures.set(message["chart_key"], figure, NO_EXPIRY)
+    return figure
+
+
+def chart_export(message, fmt=EXPORT_FORMAT):
+    """
+    Export of a chart message, built when it is downloaded. Exports are not kept: the cached
+    figure and the shared plotly.js bundle make building one cheap, and offline HTML is large.
+    """
+    metrics.incr(f"render.export.{fmt}")
+    return export_bytes([chart_figure(message)], fmt, message["content"])
+
+
+def render_download_button(message, index, fmt=EXPORT_FORMAT):
+    """Download button whose export is only generated when it is clicked, without rerunning the script."""
+    mime, label = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=label,
+        data=lambda: chart_export(message, fmt),
+        file_name=f"{message['content']}_chart.{fmt}",
+        mime=mime,
+        on_click="ignore",
+        key=f"download-{index}",
+    )
+
+
+def render_dashboard_button(messages, fmt="html"):
+    """Download button for one document with every chart of the history, sharing one plotly.js bundle."""
+    charts = [message for message in messages if "chart_key" in message]
+    if len(charts) < 2:
+        return
+    mime, _ = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=f"Download all {len(charts)} charts",
+        data=lambda: export_bytes([chart_figure(message) for message in charts], fmt, "Charts"),
+        file_name=f"dashboard.{fmt}",
+        mime=mime,
+        on_click="ignore",
+        key="download-dashboard",
+    )
+
+
+def render_message(message, index):
+    """Renders one stored chat message; `index` is its position in the session's history."""
+    if message["role"] == "assistant" and "chart_key" in message:
+        with st.container():  # Use a container instead of st.chat_message
+            st.plotly_chart(chart_figure(message), use_container_width=True, key=f"chart-{index}")
+            render_download_button(message, index)
+    else:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def render_history(messages, recent=HISTORY_RECENT_MESSAGES):
+    """
+    Renders the chat history. Only the last `recent` messages are rendered on every rerun; earlier
+    ones sit behind a toggle and cost nothing until it is switched on.
+    """
+    # Widget keys use absolute positions so they stay stable when a MessageStore evicts messages
+    offset = getattr(messages, "evicted", 0)
+    if offset:
+        st.caption(f"{offset} earlier messages were removed to keep the session small.")
+    start = 0
+    earlier = len(messages) - recent
+    if earlier > 0 and not st.toggle(f"Show {earlier} earlier messages", key="show_earlier_messages"):
+        start = earlier
+    for index in range(start, len(messages)):
+        render_message(messages[index], offset + index)
+    render_dashboard_button(messages)
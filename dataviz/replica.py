@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+from dataviz.logging import logger
+from dataviz.metrics import metrics
+
+try:
+    import duckdb
+except ImportError:  # the replica is optional
+    duckdb = None
+
+try:
+    import sqlglot
+except ImportError:
+    sqlglot = None
+
+load_dotenv()
+
+REPLICA_PATH = os.getenv("REPLICA_PATH", os.path.join("cache", "replica.duckdb"))
+# Seconds after the last successful refresh during which queries are served from the replica
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", "300"))
+
+# Mirrored tables and their monotonically increasing key, used for incremental refresh
+REPLICA_TABLES = {
+    "t_shirts": "t_shirt_id",
+    "discounts": "discount_id",
+}
+
+_QUALIFIED_TABLE_RE = re.compile(r"`?(?:[\w-]+\.){1,2}(" + "|".join(REPLICA_TABLES) + r")`?")
+
+
+def to_replica_sql(sql, source_dialect):
+    """
+    Rewrites warehouse SQL for DuckDB: transpiled with sqlglot when it is installed, otherwise
+    only project/dataset qualifiers and backticks around the mirrored tables are removed.
+    """
+    if sqlglot is not None:
+        expression = sqlglot.parse_one(sql, read=source_dialect)
+        for table in expression.find_all(sqlglot.exp.Table):
+            table.set("db", None)
+            table.set("catalog", None)
+        return expression.sql(dialect="duckdb")
+    return _QUALIFIED_TABLE_RE.sub(r"\1", sql)
+
+
+class Replica:
+    """
+    Local DuckDB mirror of the t_shirts and discounts tables.
+
+    `refresh` compares a change marker (row count, maximum key and, on BigQuery, the last
+    modification time) of every table with the one stored locally: unchanged tables are skipped,
+    tables that only grew get the new rows appended, anything else is reloaded. Queries are served
+    from the replica only while the last refresh is younger than `max_staleness` seconds.
+    """
+
+    def __init__(self, source_db, path=REPLICA_PATH, tables=REPLICA_TABLES, max_staleness=REPLICA_MAX_STALENESS):
+        if duckdb is None:
+            raise ImportError("The replica needs the duckdb package (pip install duckdb)")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.source_db = source_db
+        self.tables = tables
+        self.max_staleness = max_staleness
+        self._connection = duckdb.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS _replica_state ("
+            "table_name VARCHAR PRIMARY KEY, row_count BIGINT, max_key BIGINT, modified VARCHAR, refreshed_at DOUBLE)"
+        )
+        self._refresh_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _source_frame(self, sql):
+        with self.source_db._engine.connect() as connection:
+            return pd.read_sql_query(text(sql), connection)
+
+    def _source_marker(self, table, key):
+        marker = self._source_frame(f"SELECT COUNT(*) AS row_count, MAX({key}) AS max_key FROM {table}")
+        row_count, max_key = marker.iloc[0]
+        modified = None
+        if self.source_db.dialect == "bigquery":
+            # BigQuery also exposes the last modification time, which catches in-place updates
+            dataset = os.getenv("BIGQUERY_DATASET")
+            modified = str(self._source_frame(
+                f"SELECT last_modified_time FROM `{dataset}.__TABLES__` WHERE table_id = '{table}'"
+            ).iloc[0, 0])
+        return int(row_count), None if pd.isna(max_key) else int(max_key), modified
+
+    def _local_state(self, table):
+        return self._connection.cursor().execute(
+            "SELECT row_count, max_key, modified, refreshed_at FROM _replica_state WHERE table_name = ?", [table]
+        ).fetchone()
+
+    def _refresh_table(self, table, key):
+        row_count, max_key, modified = self._source_marker(table, key)
+        state = self._local_state(table)
+        connection = self._connection.cursor()
+        if state and state[:3] == (row_count, max_key, modified):
+            mode = "unchanged"
+        elif state and state[1] is not None and max_key is not None and max_key > state[1]:
+            new_rows = self._source_frame(f"SELECT * FROM {table} WHERE {key} > {state[1]}")
+            if state[0] + len(new_rows) == row_count:
+                connection.register("new_rows", new_rows)
+                connection.execute(f"INSERT INTO {table} SELECT * FROM new_rows")
+                connection.unregister("new_rows")
+                mode = "incremental"
+            else:
+                # Rows were also updated or deleted, so appending would diverge from the source
+                mode = None
+        else:
+            mode = None
+        if mode is None:
+            rows = self._source_frame(f"SELECT * FROM {table}")
+            connection.register("source_rows", rows)
+            connection.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM source_rows")
+            connection.unregister("source_rows")
+            mode = "full"
+        connection.execute(
+            "INSERT OR REPLACE INTO _replica_state VALUES (?, ?, ?, ?, ?)",
+            [table, row_count, max_key, modified, time.time()],
+        )
+        metrics.incr(f"replica.refresh.{mode}")
+        return mode
+
+    def refresh(self):
+        """Brings every mirrored table up to date; returns how each one was refreshed."""
+        with self._refresh_lock:
+            return {table: self._refresh_table(table, key) for table, key in self.tables.items()}
+
+    def _refresh_logged(self):
+        # Nobody waits on the background thread, so a failure would otherwise only reach stderr
+        try:
+            self.refresh()
+        except Exception as e:
+            metrics.incr("replica.refresh.failed")
+            logger.exception("Replica refresh failed, queries go to the warehouse until it is fresh: %s", e)
+
+    def refresh_in_background(self):
+        """Starts a refresh in a daemon thread unless one is already running; failures are logged."""
+        with self._thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_logged, name="replica-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def is_fresh(self):
+        states = [self._local_state(table) for table in self.tables]
+        if not all(states):
+            return False
+        return time.time() - min(state[3] for state in states) <= self.max_staleness
+
+    def query_frame(self, sql):
+        """Runs warehouse SQL on the replica and returns a DataFrame."""
+        replica_sql = to_replica_sql(sql, self.source_db.dialect)
+        start = time.perf_counter()
+        # Each call uses its own cursor so queries from several threads do not share state
+        df = self._connection.cursor().execute(replica_sql).df()
+        metrics.observe("replica.query_ms", (time.perf_counter() - start) * 1000)
+        return df
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,158 @@
+import atexit
+import threading
+
+
+class ResourceManager:
+    """
+    Lazily created, process-wide singletons (LLM client, database, caches, prompts).
+
+    A resource is built by its factory on first use, at most once even when several threads ask
+    for it at the same time. `warm_up` builds resources ahead of the first request and `shutdown`
+    releases them in reverse creation order.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._factories = {}
+        self._closers = {}
+        self._optional = set()
+        self._instances = {}
+        self._order = []
+
+    def register(self, name, factory, close=None, optional=False):
+        """
+        Registers how to build (and optionally release) the resource called `name`. Optional
+        resources are skipped by a bare warm_up() and only built when asked for.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            if optional:
+                self._optional.add(name)
+            if close is not None:
+                self._closers[name] = close
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._factories[name]()
+                    self._instances[name] = instance
+                    self._order.append(name)
+        return instance
+
+    def override(self, name, instance):
+        """Replaces a resource, e.g. with a fake LLM or a local database in tests and benchmarks."""
+        with self._lock:
+            self._instances[name] = instance
+            if name not in self._order:
+                self._order.append(name)
+
+    def warm_up(self, *names):
+        """Builds the given resources, or all registered ones except `optional` ones, before they are first needed."""
+        for name in names or [name for name in self._factories if name not in self._optional]:
+            self.get(name)
+
+    def shutdown(self):
+        """Releases every created resource, most recently created first."""
+        with self._lock:
+            for name in reversed(self._order):
+                close = self._closers.get(name)
+                if close is not None:
+                    close(self._instances[name])
+            self._instances.clear()
+            self._order.clear()
+
+
+def _create_llm():
+    # Imported here so processes that never call the LLM do not pay for the OpenAI client import
+    from langchain_openai import ChatOpenAI
+    # stream_usage makes streamed replies report token usage, which dataviz.telemetry records per node
+    return ChatOpenAI(model_name="gpt-4o-mini", streaming=True, stream_usage=True)
+
+
+def _create_db():
+    from dataviz.db_connect import configure_db
+    return configure_db()
+
+
+def _create_schema_cache():
+    from dataviz.schema_cache import SchemaCache
+    return SchemaCache(get_db())
+
+
+def _create_query_cache():
+    from dataviz.query_cache import QueryCache, dataset_freshness_token
+    return QueryCache(freshness_token=dataset_freshness_token(get_db()))
+
+
+def _create_replica():
+    from dataviz.replica import Replica
+    return Replica(get_db())
+
+
+def _create_dry_run():
+    from dataviz.sql_validation import BigQueryDryRun, StaticDryRun
+    db = get_db()
+    if db.dialect == "bigquery":
+        return BigQueryDryRun()
+    # Other backends have no dry run; their queries are not charged against the scan budget
+    return StaticDryRun(dialect=db.dialect)
+
+
+def _create_query_prompt():
+    from dataviz.prompts import get_prompt_template, precompile_prompts
+    # Prompts are parsed once; every later lookup is a dictionary hit
+    precompile_prompts()
+    return get_prompt_template()
+
+
+def _create_router():
+    from dataviz.router import load_router
+    return load_router()
+
+
+resources = ResourceManager()
+resources.register("llm", _create_llm)
+resources.register("db", _create_db, close=lambda db: db._engine.dispose())
+resources.register("schema_cache", _create_schema_cache)
+resources.register("query_cache", _create_query_cache)
+resources.register("query_prompt", _create_query_prompt)
+resources.register("dry_run", _create_dry_run)
+resources.register("router", _create_router)
+# Only created for graphs built with use_replica=True
+resources.register("replica", _create_replica, close=lambda replica: replica.close(), optional=True)
+atexit.register(resources.shutdown)
+
+
+def get_llm():
+    return resources.get("llm")
+
+
+def get_db():
+    return resources.get("db")
+
+
+def get_schema_cache():
+    return resources.get("schema_cache")
+
+
+def get_query_cache():
+    return resources.get("query_cache")
+
+
+def get_query_prompt():
+    return resources.get("query_prompt")
+
+
+def get_dry_run():
+    return resources.get("dry_run")
+
+
+def get_router():
+    return resources.get("router")
+
+
+def get_replica():
+    return resources.get("replica")
@@ -0,0 +1,294 @@
+import os
+import re
+import pandas as pd
+from dotenv import load_dotenv
+from dataviz.chart_data import build_chart_data, coerce_numeric, parse_result_rows, split_columns
+from dataviz.sql_validation import SQLGLOT_DIALECTS, parse_sql
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # limits are then applied by matching the end of the SQL text
+    sqlglot = None
+
+load_dotenv()
+
+# Rows a query may return; enforced in the SQL itself so the warehouse never sends more
+RESULT_MAX_ROWS = int(os.getenv("RESULT_MAX_ROWS", "10000"))
+# In-memory size of a result (DataFrame memory, or length of the stringified rows)
+RESULT_MAX_BYTES = int(os.getenv("RESULT_MAX_BYTES", str(8 * 1024 * 1024)))
+# Budgets of typed results of chart questions; a larger result is reduced in the warehouse (see
+# reduce_chart_query) so only chart-sized frames reach the app, its caches and checkpoints
+CHART_RESULT_MAX_ROWS = int(os.getenv("CHART_RESULT_MAX_ROWS", "10000"))
+CHART_RESULT_MAX_BYTES = int(os.getenv("CHART_RESULT_MAX_BYTES", str(4 * 1024 * 1024)))
+# Characters of a result included in a prompt
+PROMPT_RESULT_MAX_CHARS = int(os.getenv("PROMPT_RESULT_MAX_CHARS", "6000"))
+# Chart budgets: points of a scatter plot, categories of a bar, pie or stacked bar chart; they
+# apply to every chart, whether its data was shaped from the rows or by the LLM transform
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "25"))
+
+OTHER_LABEL = "Other"
+TRUNCATED_NOTE = "Note: the query returned more rows than the result budget allows; only the first rows are included."
+
+_SELECT_RE = re.compile(r"^\(?\s*(SELECT|WITH)\b", re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+_TRAILING_COMMENT_RE = re.compile(r"(\s*--[^\n]*)+$")
+
+
+def limit_query(query, max_rows=RESULT_MAX_ROWS, dialect=None):
+    """
+    Rewrites a SELECT so the warehouse returns at most `max_rows` + 1 rows; the extra row tells
+    a truncated result apart from one that fits exactly. A larger LIMIT is lowered, otherwise a
+    LIMIT is added. Anything but a single SELECT/WITH statement is left unchanged.
+    """
+    if sqlglot is not None:
+        statement, error = parse_sql(query, dialect)
+        if error or not isinstance(statement, exp.Query):
+            return query
+        limit = statement.args.get("limit")
+        value = limit.expression if limit is not None else None
+        if isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows:
+            return query
+        return statement.limit(max_rows + 1).sql(dialect=SQLGLOT_DIALECTS.get(dialect, dialect))
+    sql = _TRAILING_COMMENT_RE.sub("", query.strip()).rstrip().rstrip(";").rstrip()
+    if not _SELECT_RE.match(sql) or ";" in sql:
+        return query
+    match = _TRAILING_LIMIT_RE.search(sql)
+    if match is None:
+        # On its own line so a trailing -- comment cannot swallow it
+        return f"{sql}\nLIMIT {max_rows + 1}"
+    if int(match.group(1)) <= max_rows:
+        return sql
+    return sql[:match.start(1)] + str(max_rows + 1) + sql[match.end(1):]
+
+
+def count_column(query, dialect=None):
+    """
+    Output name of the COUNT or SUM aggregate of a grouped query, e.g. "n" for
+    SELECT price, COUNT(*) AS n FROM t_shirts GROUP BY price, which counts the rows of each
+    value. None when the query has no GROUP BY, several such aggregates or cannot be parsed.
+    """
+    if sqlglot is None or not query:
+        return None
+    statement, error = parse_sql(query, dialect)
+    if error or not isinstance(statement, exp.Select) or not statement.args.get("group"):
+        return None
+    counts = [projection for projection in statement.expressions
+              if isinstance(projection.unalias(), (exp.Count, exp.Sum))]
+    if len(counts) != 1:
+        return None
+    return counts[0].alias or counts[0].sql(dialect=SQLGLOT_DIALECTS.get(dialect, dialect))
+
+
+def rows_text(df):
+    """Rows of a DataFrame in the format of QuerySQLDataBaseTool: a stringified list of tuples, empty when there are none."""
+    rows = [tuple(row) for row in df.astype(object).values.tolist()]
+    return str(rows) if rows else ""
+
+
+def fit_frame(df, max_rows=RESULT_MAX_ROWS, max_bytes=RESULT_MAX_BYTES):
+    """
+    Keeps the first rows of a result that fit the row and byte budgets.
+
+    :return: (DataFrame, truncated) where truncated tells whether rows were dropped.
+    """
+    truncated = len(df) > max_rows
+    df = df.head(max_rows)
+    size = int(df.memory_usage(deep=True).sum())
+    if size > max_bytes and len(df) > 1:
+        df, truncated = df.head(max(1, len(df) * max_bytes // size)), True
+    return df, truncated
+
+
+def truncation_note(rows):
+    """Note shown on a chart built from a result that was cut to its first `rows` rows."""
+    return f"Only the first {rows:,} rows of the query result are shown."
+
+
+def reduce_chart_query(query, df, max_rows=CHART_RESULT_MAX_ROWS, dialect=None):
+    """
+    Rewrites the query of a chart result with more than `max_rows` rows so the warehouse returns
+    a chart-sized one: one numeric column by one or two categorical ones is summed per category
+    and only the `max_rows` largest totals are kept; any other shape is a random sample of
+    `max_rows` rows.
+
+    :param df: First rows of the result, whose columns decide the reduction.
+    :return: (sql, note) with the note to show on the chart, or (None, None) when the query
+        cannot be rewritten.
+    """
+    if sqlglot is None:
+        return None, None
+    statement, error = parse_sql(query, dialect)
+    if error or not isinstance(statement, exp.Query):
+        return None, None
+    rows = statement.subquery("chart_rows")
+    categorical, numeric = split_columns(df)
+    if len(numeric) == 1 and len(categorical) in (1, 2):
+        categories = [exp.column(name, quoted=True) for name in categorical]
+        total = exp.Sum(this=exp.column(numeric[0], quoted=True))
+        reduced = (
+            exp.select(*categories, exp.alias_(total, numeric[0], quoted=True))
+            .from_(rows)
+            .group_by(*categories)
+            .order_by(exp.Ordered(this=total.copy(), desc=True))
+            .limit(max_rows)
+        )
+        note = f"Only the {max_rows:,} largest totals of the query result are shown."
+    else:
+        reduced = exp.select("*").from_(rows).order_by(exp.Rand()).limit(max_rows)
+        note = f"A random sample of {max_rows:,} rows of the query result is shown."
+    return reduced.sql(dialect=SQLGLOT_DIALECTS.get(dialect, dialect)), note
+
+
+def fit_text_result(result, max_rows=RESULT_MAX_ROWS, max_bytes=RESULT_MAX_BYTES):
+    """Same as fit_frame for the stringified rows of QuerySQLDataBaseTool; errors and unparsable text pass through."""
+    rows = parse_result_rows(result)
+    if rows is None:
+        return result, False
+    truncated = len(rows) > max_rows
+    rows = rows[:max_rows]
+    text = str(rows)
+    if len(text) > max_bytes and len(rows) > 1:
+        rows, truncated = rows[:max(1, len(rows) * max_bytes // len(text))], True
+        text = str(rows)
+    return (text if truncated else result), truncated
+
+
+def _cut_rows(rows, max_chars):
+    # Longest prefix of the rows whose string form fits, counting ", " between rows
+    length, count = 2, 0
+    for row in rows:
+        length += len(str(row)) + 2
+        if length > max_chars:
+            break
+        count += 1
+    return f"{rows[:count]}\n... {len(rows) - count} more rows not shown"
+
+
+def _cut_lines(text, max_chars):
+    lines, length = [], 0
+    for line in text.splitlines():
+        length += len(line) + 1
+        if length > max_chars:
+            break
+        lines.append(line)
+    if not lines:
+        return text[:max_chars] + " ..."
+    return "\n".join(lines) + "\n... (result cut to fit the prompt)"
+
+
+def prompt_result(result, truncated=False, max_chars=PROMPT_RESULT_MAX_CHARS, note=None):
+    """
+    Query result text for prompts: at most about `max_chars` characters, cut at a row (or line)
+    boundary, with a note when the result itself was truncated by the row or byte budget, or
+    `note` when it was reduced in the warehouse instead (see reduce_chart_query).
+    """
+    result = result or ""
+    if len(result) > max_chars:
+        rows = parse_result_rows(result)
+        result = _cut_rows(rows, max_chars) if rows else _cut_lines(result, max_chars)
+    if not truncated:
+        return result
+    return f"{result}\n{f'Note: {note}' if note else TRUNCATED_NOTE}"
+
+
+def stratified_sample(df, n, strata, seed=0):
+    """About `n` rows sampled from every stratum in proportion to its size, kept in their original order."""
+    if len(df) <= n:
+        return df
+    return df.groupby(strata, sort=False).sample(frac=n / len(df), random_state=seed).sort_index()
+
+
+def _top_categories(values, totals, max_categories):
+    # The largest max_categories - 1 categories keep their name, the rest become OTHER_LABEL
+    top = totals.nlargest(max_categories - 1).index
+    return values.where(values.isin(top), OTHER_LABEL)
+
+
+def aggregate_categories(df, category, value, max_categories=CHART_MAX_CATEGORIES):
+    """Sums the smallest categories of `category` into a single 'Other' category when there are too many."""
+    totals = df.groupby(category, sort=False)[value].sum()
+    if len(totals) <= max_categories:
+        return df
+    df = df.copy()
+    df[category] = _top_categories(df[category].astype(object), totals, max_categories)
+    return df.groupby([name for name in df.columns if name != value], sort=False, as_index=False)[value].sum()
+
+
+def shape_for_chart(chart_type, df, max_points=CHART_MAX_POINTS, max_categories=CHART_MAX_CATEGORIES):
+    """
+    Reduces a result to what the chart can show: scatter plots are sampled stratified along the
+    x-axis, bar, pie and stacked bar charts keep their largest categories and sum the rest into
+    'Other'. Histograms are binned from every row and are returned unchanged, as is any result
+    whose shape does not match the chart type.
+    """
+    if df is None or df.empty:
+        return df
+    categorical, numeric = split_columns(df)
+    chart_type = (chart_type or "").lower()
+    if chart_type == "scatter" and not categorical and len(numeric) == 2 and len(df) > max_points:
+        # Up to 20 equally sized strata along x, large enough that each keeps several points
+        strata = pd.qcut(df[numeric[0]].rank(method="first"), q=min(20, max(1, max_points // 10)), labels=False)
+        return stratified_sample(df, max_points, strata)
+    if chart_type in ("bar", "pie") and len(categorical) == 1 and len(numeric) == 1:
+        return aggregate_categories(df, categorical[0], numeric[0], max_categories)
+    if chart_type == "stacked bar" and len(categorical) == 2 and len(numeric) == 1:
+        for category in categorical:
+            df = aggregate_categories(df, category, numeric[0], max_categories)
+        return df
+    return df
+
+
+def _chart_frame(chart_type, chart_data):
+    # The rows behind chart data, in the column layout build_chart_data expects for the chart type
+    if chart_type in ("bar", "pie"):
+        if chart_type == "bar":
+            labels, values = chart_data["labels"], chart_data["values"][0]["data"]
+        else:
+            labels, values = [item["label"] for item in chart_data["data"]], [item["value"] for item in chart_data["data"]]
+        return pd.DataFrame({"label": [str(label) for label in labels], "value": values})
+    if chart_type == "stacked bar":
+        categories = [str(category) for category in chart_data["x_axis_categories"]]
+        return pd.DataFrame(
+            [(str(group["stack_category"]), category, count)
+             for group in chart_data["stack_groups"] for category, count in zip(categories, group["counts"])],
+            columns=["stack", "category", "value"],
+        )
+    if chart_type == "histogram":
+        return pd.DataFrame({"bin": chart_data["bins"], "count": chart_data["counts"]})
+    if chart_type == "scatter":
+        points = chart_data["data_points"]
+        return pd.DataFrame({"x": [point["x"] for point in points], "y": [point["y"] for point in points]})
+    return None
+
+
+def shape_chart_data(chart_type, chart_data, max_points=CHART_MAX_POINTS, max_categories=CHART_MAX_CATEGORIES):
+    """
+    Applies shape_for_chart, and the histogram binning of build_chart_data, to chart data that
+    was not built from the rows (the LLM transform), so every chart gets the same reductions.
+    Only the data is replaced; titles and axis labels are kept. Data without the expected
+    structure or types (e.g. text on a scatter axis) is returned unchanged.
+    """
+    chart_type = (chart_type or "").lower()
+    try:
+        df = _chart_frame(chart_type, chart_data)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return chart_data
+    if df is None or df.empty:
+        return chart_data
+    df = shape_for_chart(chart_type, coerce_numeric(df), max_points, max_categories)
+    shaped = build_chart_data(chart_type, df, count_column="count" if chart_type == "histogram" else None)
+    if shaped is None:
+        return chart_data
+    shaped = shaped["chart_data"]
+    if chart_type == "bar":
+        return {**chart_data, "labels": shaped["labels"],
+                "values": [{**chart_data["values"][0], "data": shaped["values"][0]["data"]}]}
+    if chart_type == "pie":
+        return {**chart_data, "data": shaped["data"]}
+    if chart_type == "stacked bar":
+        return {**chart_data, "x_axis_categories": shaped["x_axis_categories"], "stack_groups": shaped["stack_groups"]}
+    if chart_type == "histogram":
+        return {**chart_data, **{name: shaped[name] for name in ("bins", "counts", "bin_width") if name in shaped}}
+    return {**chart_data, "data_points": shaped["data_points"]}
@@ -0,0 +1,42 @@
+import os
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from dataviz.chart_data import coerce_numeric
+
+load_dotenv()
+
+# Number of rows included verbatim in the textual summary passed to prompts
+SUMMARY_MAX_ROWS = int(os.getenv("RESULT_SUMMARY_MAX_ROWS", "30"))
+
+
+def run_query_frame(db, query):
+    """
+    Executes the query and returns the rows as a typed DataFrame instead of a stringified list of tuples.
+
+    :param db: SQLDatabase whose engine runs the query.
+    :param query: SQL text to execute.
+    :return: (DataFrame, None) on success or (None, error message) on failure.
+    """
+    try:
+        with db._engine.connect() as connection:
+            df = pd.read_sql_query(text(query), connection)
+    except SQLAlchemyError as e:
+        # Same error text QuerySQLDataBaseTool returns, so the LLM nodes see familiar input
+        return None, f"Error: {e}"
+    return coerce_numeric(df), None
+
+
+def summarize_frame(df, max_rows=SUMMARY_MAX_ROWS):
+    """
+    Compact textual view of a query result for prompts: column names with dtypes, the row count
+    and the first `max_rows` rows as CSV.
+    """
+    columns = ", ".join(f"{name} ({dtype})" for name, dtype in df.dtypes.items())
+    lines = [f"Columns: {columns}", f"Rows: {len(df)}"]
+    if len(df):
+        lines.append(df.head(max_rows).to_csv(index=False).strip())
+    if len(df) > max_rows:
+        lines.append(f"... {len(df) - max_rows} more rows not shown")
+    return "\n".join(lines)
@@ -0,0 +1,219 @@
+"""
+Question routing: whether a question gets a text answer or a chart, and which chart it most
+likely wants.
+
+The default router is a TF-IDF model with two logistic regression heads (route, chart type),
+small enough to train in milliseconds and to predict in microseconds with NumPy. It is trained
+from router_data/seed_questions.jsonl plus any logged questions (see `python -m dataviz.router
+train`), and loaded from ROUTER_MODEL_PATH when that file exists. ROUTER_BACKEND=keywords
+restores the previous keyword matching.
+
+    python -m dataviz.router train batch_output/results.jsonl --output router_model.json
+    python -m dataviz.router predict "how are prices spread out?"
+"""
+import argparse
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, namedtuple
+import numpy as np
+from dotenv import load_dotenv
+from dataviz.logging import logger
+
+load_dotenv()
+
+ROUTER_BACKEND = os.getenv("ROUTER_BACKEND", "model")
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", "router_model.json")
+# Chart type guesses at least this confident skip the chart recommendation LLM call
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.8"))
+SEED_QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_data", "seed_questions.jsonl")
+
+ANSWER = "generate_answer"
+VISUALIZATION = "get_visualization"
+
+Route = namedtuple("Route", ["route", "confidence", "chart_type", "chart_confidence"])
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def features(question):
+    """Word unigrams and bigrams, plus character trigrams of each word so spelling variants share features."""
+    words = _WORD_RE.findall(question.lower())
+    terms = list(words)
+    terms += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        terms += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return Counter(terms)
+
+
+class KeywordRouter:
+    """The original routing: a chart for questions containing a visualization keyword, no chart type guess."""
+
+    VISUALIZATION_KEYWORDS = ["chart", "graph", "visualize", "plot", "diagram"]
+
+    def predict(self, question):
+        if any(keyword in question.lower() for keyword in self.VISUALIZATION_KEYWORDS):
+            return Route(VISUALIZATION, 1.0, None, 0.0)
+        return Route(ANSWER, 1.0, None, 0.0)
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def _fit_head(X, labels, l2=1e-4, steps=300, learning_rate=8.0):
+    """Multinomial logistic regression by full-batch gradient descent; returns (classes, weights, bias)."""
+    classes = sorted(set(labels))
+    y = np.zeros((len(labels), len(classes)))
+    y[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1
+    weights = np.zeros((X.shape[1], len(classes)))
+    bias = np.zeros(len(classes))
+    for _ in range(steps):
+        error = (_softmax(X @ weights + bias) - y) / len(labels)
+        weights -= learning_rate * (X.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum(axis=0)
+    return classes, weights, bias
+
+
+class TfidfRouter:
+    """
+    TF-IDF features with a route head and a chart type head. A prediction only touches the
+    weight rows of the question's terms, so it costs a few dictionary lookups and small dot products.
+    """
+
+    def __init__(self, vocabulary, idf, heads):
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf)
+        # head name -> (classes, weights of shape (terms, classes), bias)
+        self.heads = {name: (classes, np.asarray(weights), np.asarray(bias)) for name, (classes, weights, bias) in heads.items()}
+
+    def _vector(self, question):
+        """(term indices, L2-normalized sublinear TF-IDF values) of the known terms of a question."""
+        counts = [(self.vocabulary[term], count) for term, count in features(question).items() if term in self.vocabulary]
+        if not counts:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        index = np.fromiter((i for i, _ in counts), dtype=int, count=len(counts))
+        values = (1 + np.log([count for _, count in counts])) * self.idf[index]
+        return index, values / np.linalg.norm(values)
+
+    def _head(self, name, index, values):
+        classes, weights, bias = self.heads[name]
+        probabilities = _softmax(values @ weights[index] + bias)
+        best = int(probabilities.argmax())
+        return classes[best], float(probabilities[best])
+
+    def predict(self, question):
+        index, values = self._vector(question)
+        route, confidence = self._head("route", index, values)
+        chart_type, chart_confidence = self._head("chart_type", index, values)
+        return Route(route, confidence, chart_type, chart_confidence)
+
+    @classmethod
+    def train(cls, examples):
+        """
+        Fits the model to {"question", "route", "chart_type"} examples. Only examples with a route
+        train the route head, and only charts train the chart type head.
+        """
+        documents = [features(example["question"]) for example in examples]
+        document_frequency = Counter(term for document in documents for term in document)
+        vocabulary = {term: i for i, term in enumerate(sorted(document_frequency))}
+        idf = np.array([math.log((1 + len(documents)) / (1 + document_frequency[term])) + 1 for term in vocabulary])
+        X = np.zeros((len(documents), len(vocabulary)))
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                X[row, vocabulary[term]] = (1 + math.log(count)) * idf[vocabulary[term]]
+        X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+        routes = [row for row, example in enumerate(examples) if example.get("route")]
+        charts = [row for row, example in enumerate(examples) if example.get("chart_type")]
+        heads = {
+            "route": _fit_head(X[routes], [examples[row]["route"] for row in routes]),
+            "chart_type": _fit_head(X[charts], [examples[row]["chart_type"] for row in charts]),
+        }
+        return cls(vocabulary, idf, heads)
+
+    def save(self, path):
+        heads = {name: {"classes": classes, "weights": np.round(weights, 5).tolist(), "bias": bias.tolist()}
+                 for name, (classes, weights, bias) in self.heads.items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"terms": sorted(self.vocabulary, key=self.vocabulary.get), "idf": self.idf.tolist(),
+                       "heads": heads}, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        heads = {name: (head["classes"], head["weights"], head["bias"]) for name, head in model["heads"].items()}
+        return cls({term: i for i, term in enumerate(model["terms"])}, model["idf"], heads)
+
+
+def load_examples(path):
+    """
+    Reads labelled questions from a JSONL file: {"question", "route", "chart_type"} records, or
+    batch runner results (results.jsonl), where a chart type other than "none" means the
+    question was charted. Records without a "route" get None: the route of a logged question
+    was decided by the router itself, so it only trains the chart type head.
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "error" in record or not record.get("question"):
+                continue
+            chart_type = record.get("chart_type")
+            chart_type = None if chart_type in (None, "", "none") else chart_type
+            examples.append({"question": record["question"], "route": record.get("route"), "chart_type": chart_type})
+    return examples
+
+
+def load_router(backend=None, model_path=None):
+    """The router of ROUTER_BACKEND: the saved model at ROUTER_MODEL_PATH, else one trained on the seed questions."""
+    backend = backend or ROUTER_BACKEND
+    model_path = model_path or ROUTER_MODEL_PATH
+    if backend == "keywords":
+        return KeywordRouter()
+    start = time.perf_counter()
+    if os.path.exists(model_path):
+        router = TfidfRouter.load(model_path)
+    else:
+        router = TfidfRouter.train(load_examples(SEED_QUESTIONS_PATH))
+    logger.info("Router ready in %.1f ms (%s)", (time.perf_counter() - start) * 1000,
+                model_path if os.path.exists(model_path) else "seed questions")
+    return router
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="train a model from labelled or logged questions")
+    train.add_argument("paths", nargs="*", help="JSONL files of questions (see load_examples)")
+    train.add_argument("--output", default=ROUTER_MODEL_PATH, help="model file to write")
+    train.add_argument("--no-seed", action="store_true", help="do not include the bundled seed questions")
+    predict = commands.add_parser("predict", help="route questions with the current model")
+    predict.add_argument("questions", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        examples = [] if args.no_seed else load_examples(SEED_QUESTIONS_PATH)
+        for path in args.paths:
+            examples += load_examples(path)
+        start = time.perf_counter()
+        TfidfRouter.train(examples).save(args.output)
+        print(f"Trained on {len(examples)} questions in {(time.perf_counter() - start) * 1000:.0f} ms, saved to {args.output}")
+    else:
+        router = load_router()
+        for question in args.questions:
+            start = time.perf_counter()
+            route = router.predict(question)
+            print(f"{(time.perf_counter() - start) * 1000:.3f} ms  {route.route} ({route.confidence:.2f})  "
+                  f"{route.chart_type} ({route.chart_confidence:.2f})  {question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dotenv import load_dotenv
+from dataviz.metrics import metrics
+
+load_dotenv()
+
+MAX_INFLIGHT_LLM = int(os.getenv("MAX_INFLIGHT_LLM", "8"))
+MAX_INFLIGHT_WAREHOUSE = int(os.getenv("MAX_INFLIGHT_WAREHOUSE", "4"))
+# Requests waiting beyond this per resource are rejected instead of queued
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "200"))
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when a resource queue is full, so callers can shed load instead of waiting."""
+
+
+class _Resource:
+    """In-flight counter plus one FIFO of waiters per session, served round-robin."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = OrderedDict()
+        self.num_waiting = 0
+
+
+class Scheduler:
+    """
+    Caps in-flight LLM and warehouse requests per process.
+
+    Waiters are queued per session and sessions are served round-robin, so one session sending
+    many requests cannot starve the others. Slots can be taken from async code (`slot`) or from
+    threads (`slot_sync`); both share the same limits. Queue wait time is recorded in
+    dataviz.metrics as scheduler.<resource>.queue_wait_ms.
+    """
+
+    def __init__(self, limits=None, max_queue=SCHEDULER_MAX_QUEUE):
+        limits = limits or {"llm": MAX_INFLIGHT_LLM, "warehouse": MAX_INFLIGHT_WAREHOUSE}
+        self._resources = {name: _Resource(limit) for name, limit in limits.items()}
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, resource, session, grant):
+        """Takes a slot immediately, or queues `grant` to be called when one is handed over."""
+        state = self._resources[resource]
+        with self._lock:
+            if state.in_flight < state.limit and state.num_waiting == 0:
+                state.in_flight += 1
+                return True
+            if state.num_waiting >= self.max_queue:
+                metrics.incr(f"scheduler.{resource}.rejected")
+                raise SchedulerBusyError(f"Too many queued {resource} requests")
+            state.waiting.setdefault(session, deque()).append(grant)
+            state.num_waiting += 1
+            return False
+
+    def release(self, resource):
+        """Hands the slot to the next session in round-robin order, or frees it."""
+        state = self._resources[resource]
+        with self._lock:
+            while state.waiting:
+                session, queue = state.waiting.popitem(last=False)
+                grant = queue.popleft()
+                state.num_waiting -= 1
+                if queue:
+                    # Session goes to the back of the rotation with its remaining waiters
+                    state.waiting[session] = queue
+                if grant():
+                    return
+            state.in_flight -= 1
+
+    def _record_wait(self, resource, start):
+        metrics.observe(f"scheduler.{resource}.queue_wait_ms", (time.perf_counter() - start) * 1000)
+
+    @asynccontextmanager
+    async def slot(self, resource, session="default"):
+        """Async context manager holding one `resource` slot for the enclosed call."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        start = time.perf_counter()
+
+        def deliver():
+            if future.cancelled():
+                # The waiter went away after the slot was handed over; pass it on
+                self.release(resource)
+            else:
+                future.set_result(None)
+
+        def grant():
+            # A waiter whose event loop has closed (e.g. an asyncio.run aborted by a Streamlit rerun)
+            # cannot take the slot; returning False passes it to the next waiter or frees it
+            if loop.is_closed():
+                return False
+            try:
+                loop.call_soon_threadsafe(deliver)
+            except RuntimeError:
+                return False
+            return True
+
+        if not self._try_acquire(resource, session, grant):
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(resource)
+                raise
+        self._record_wait(resource, start)
+        try:
+            yield
+        finally:
+            self.release(resource)
+
+    @contextmanager
+    def slot_sync(self, resource, session="default"):
+        """Blocking counterpart of `slot` for synchronous nodes running in threads."""
+        event = threading.Event()
+        start = time.perf_counter()
+
+        def grant():
+            event.set()
+            return True
+
+        if not self._try_acquire(resource, session, grant):
+            event.wait()
+        self._record_wait(resource, start)
+        try:
+            yield
+        finally:
+            self.release(resource)
+
+    def stats(self):
+        """In-flight and queued request counts per resource."""
+        with self._lock:
+            return {
+                name: {"limit": state.limit, "in_flight": state.in_flight, "queued": state.num_waiting}
+                for name, state in self._resources.items()
+            }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA_CACHE_PATH = os.getenv("SCHEMA_CACHE_PATH", os.path.join("cache", "schema_cache.json"))
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+
+
+class SchemaCache:
+    """
+    Caches the output of SQLDatabase.get_table_info() (table DDL plus sample rows).
+
+    Entries live for `ttl` seconds and are persisted to a local JSON file so they survive restarts.
+    When an entry expires, only a schema fingerprint (table and column names/types) is recomputed;
+    if it still matches, the entry is renewed without re-running the sample-row queries.
+    """
+
+    def __init__(self, db, path=SCHEMA_CACHE_PATH, ttl=SCHEMA_CACHE_TTL):
+        self.db = db
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _key(self, table_names):
+        url = self.db._engine.url.render_as_string(hide_password=True)
+        return f"{url}|{','.join(sorted(table_names or []))}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A corrupt or unreadable cache file is treated as empty
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _columns(self, table_names):
+        inspector = self.db._inspector
+        tables = sorted(table_names or self.db.get_usable_table_names())
+        columns = []
+        for table in tables:
+            for column in inspector.get_columns(table, schema=self.db._schema):
+                columns.append((table, column["name"], str(column["type"])))
+        return columns
+
+    @staticmethod
+    def _hash(columns):
+        return hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _column_map(columns):
+        column_map = {}
+        for table, name, _ in columns:
+            column_map.setdefault(table, []).append(name)
+        return column_map
+
+    def fingerprint(self, table_names=None):
+        """Hash of table and column names/types; needs metadata calls only, no sample rows."""
+        return self._hash(self._columns(table_names))
+
+    def _entry(self, table_names):
+        key = self._key(table_names)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            # Entries written before column names were cached are refreshed once
+            if entry and now - entry["created_at"] < self.ttl and "columns" in entry:
+                return entry
+
+            columns = self._columns(table_names)
+            fingerprint = self._hash(columns)
+            if entry and entry["fingerprint"] == fingerprint:
+                # Schema unchanged: renew the entry without fetching sample rows again
+                entry["created_at"] = now
+                entry["columns"] = self._column_map(columns)
+            else:
+                entry = {
+                    "table_info": self.db.get_table_info(table_names),
+                    "columns": self._column_map(columns),
+                    "fingerprint": fingerprint,
+                    "created_at": now,
+                }
+                self._entries[key] = entry
+            self._save()
+            return entry
+
+    def get_table_info(self, table_names=None):
+        """Returns cached table info, refreshing it when the TTL expired and the schema changed."""
+        return self._entry(table_names)["table_info"]
+
+    def get_columns(self, table_names=None):
+        """Returns the cached column names of every table, e.g. {"t_shirts": ["t_shirt_id", ...]}."""
+        return self._entry(table_names)["columns"]
+
+    def invalidate(self, table_names=None):
+        """Drops the entry for `table_names`, or every entry when no tables are given."""
+        with self._lock:
+            if table_names is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(table_names), None)
+            self._save()
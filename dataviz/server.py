@@ -0,0 +1,241 @@
+"""
+ASGI service exposing the question answering graph to other tools.
+
+    uvicorn dataviz.server:app --port 8000
+
+POST /ask          {"question": ..., "session_id": ...} -> answer, SQL and chart spec as JSON
+POST /ask/stream   same body -> newline-delimited JSON events: LLM tokens, completed graph
+                   steps and a final "done" event with the answer
+GET  /health, GET /metrics (JSON), GET /metrics/prometheus (text exposition format)
+
+Simultaneous requests for the same question (compared after normalize_question) share one
+graph run: the first request starts it and every request replays its events.
+"""
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from dataviz.graphbuilder import get_graph, warm_up
+from dataviz.logging import logger
+from dataviz.metrics import metrics
+from dataviz.query_cache import normalize_question
+from dataviz.scheduler import SchedulerBusyError
+from dataviz.session_store import compact_spec
+from dataviz.streaming import astream_graph
+from dataviz.telemetry import prometheus_text
+
+load_dotenv()
+
+SERVER_GRAPH_CONFIG = {"typed_results": True, "cache_queries": True, "parallel_viz": True, "async_nodes": True,
+                       "validate_queries": True}
+# Graph runs in flight at once; further distinct questions wait up to SERVER_QUEUE_TIMEOUT seconds
+SERVER_MAX_RUNS = int(os.getenv("SERVER_MAX_RUNS", "32"))
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "30"))
+
+# State fields sent to clients; result_df and other internals stay on the server
+PUBLIC_FIELDS = ("question", "query", "answer", "chart_type", "recommendation", "viz_data", "validation_error",
+                 "result_truncated")
+
+
+def public_fields(output):
+    return {name: value for name, value in (output or {}).items() if name in PUBLIC_FIELDS}
+
+
+def response_body(state):
+    """
+    Final answer of a run, with the chart data as a parsed chart_spec instead of the viz_data
+    string. Chart data that is not valid JSON leaves chart_spec null, so the answer still goes out.
+    """
+    body = {name: value for name, value in state.items() if name != "viz_data"}
+    body["chart_spec"] = None
+    if state.get("viz_data"):
+        try:
+            body["chart_spec"] = json.loads(compact_spec(state["viz_data"]))
+        except ValueError as e:
+            logger.warning("Chart data of %r is not valid JSON: %s", state.get("question"), e)
+            metrics.incr("server.invalid_charts")
+    return body
+
+
+class GraphPool:
+    """
+    Admission control for graph runs. A compiled graph keeps no per-run state, so all runs share
+    the instance of get_graph(); the pool bounds how many of them run at once.
+    """
+
+    def __init__(self, graph_config=SERVER_GRAPH_CONFIG, size=SERVER_MAX_RUNS, timeout=SERVER_QUEUE_TIMEOUT):
+        self.graph_config = graph_config
+        self.size = size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+
+    async def start(self):
+        """Creates the shared resources and compiles the graph before the first request."""
+        await asyncio.to_thread(warm_up, **self.graph_config)
+
+    @asynccontextmanager
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.incr("server.rejected")
+            raise SchedulerBusyError("All graph runs are busy")
+        try:
+            yield get_graph(**self.graph_config)
+        finally:
+            self._slots.release()
+
+
+class Flight:
+    """One graph run; its events are kept so every request that joined it can replay them."""
+
+    def __init__(self):
+        self.events = []
+        self.state = {}
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event, done=False):
+        async with self._changed:
+            self.events.append(event)
+            self.done = done
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        """Yields every event of the run, from the first one, until the run is done."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.done)
+                events, finished = self.events[index:], self.done
+            index += len(events)
+            for event in events:
+                yield event
+            if finished:
+                return
+
+
+class SingleFlight:
+    """Coalesces simultaneous requests for the same question into one graph run."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._flights = {}
+
+    def join(self, question, session_id):
+        """Returns (flight, coalesced); starts a run unless one for the question is in flight."""
+        key = normalize_question(question)
+        flight = self._flights.get(key)
+        if flight is not None:
+            metrics.incr("server.coalesced")
+            return flight, True
+        flight = self._flights[key] = Flight()
+        # The run is a task of its own so it completes for the other requests if its starter disconnects
+        flight.task = asyncio.create_task(self._run(key, flight, question, session_id))
+        metrics.incr("server.runs")
+        return flight, False
+
+    async def _run(self, key, flight, question, session_id):
+        config = {"configurable": {"session_id": session_id}}
+        try:
+            async with self.pool.acquire() as graph:
+                async for event in astream_graph(graph, {"question": question}, config):
+                    if event[0] == "token":
+                        _, node, text = event
+                        await flight.publish({"type": "token", "node": node, "text": text})
+                        continue
+                    for node, output in event[1].items():
+                        output = public_fields(output)
+                        flight.state.update(output)
+                        await flight.publish({"type": "step", "node": node, "output": output})
+            await flight.publish({"type": "done", "state": response_body(flight.state)}, done=True)
+        except Exception as e:
+            logger.exception("Graph run failed for %r: %s", question, e)
+            metrics.incr("server.errors")
+            status = 503 if isinstance(e, SchedulerBusyError) else 500
+            await flight.publish({"type": "error", "status": status, "error": str(e)}, done=True)
+        finally:
+            self._flights.pop(key, None)
+
+
+async def _join(request):
+    """Returns (flight, coalesced), or (None, error message) when the request body is invalid."""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, "the request body must be JSON"
+    if not isinstance(body, dict):
+        return None, "the request body must be a JSON object"
+    question = body.get("question")
+    if not isinstance(question, str) or not question.strip():
+        return None, "question is required"
+    session_id = body.get("session_id") or uuid.uuid4().hex
+    return request.app.state.single_flight.join(question.strip(), session_id)
+
+
+async def ask(request):
+    flight, coalesced = await _join(request)
+    if flight is None:
+        return JSONResponse({"error": coalesced}, status_code=400)
+    async for event in flight.subscribe():
+        last = event
+    if last["type"] == "error":
+        return JSONResponse({"error": last["error"]}, status_code=last["status"])
+    return JSONResponse({**last["state"], "coalesced": coalesced})
+
+
+async def ask_stream(request):
+    flight, coalesced = await _join(request)
+    if flight is None:
+        return JSONResponse({"error": coalesced}, status_code=400)
+
+    async def events():
+        yield json.dumps({"type": "start", "coalesced": coalesced}) + "\n"
+        async for event in flight.subscribe():
+            yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics_snapshot(request):
+    return JSONResponse(metrics.snapshot())
+
+
+async def metrics_prometheus(request):
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+def create_app(graph_config=SERVER_GRAPH_CONFIG, max_runs=SERVER_MAX_RUNS):
+    """Builds the Starlette application; the graph is compiled when the server starts."""
+    pool = GraphPool(graph_config, size=max_runs)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await pool.start()
+        yield
+
+    app = Starlette(
+        routes=[
+            Route("/ask", ask, methods=["POST"]),
+            Route("/ask/stream", ask_stream, methods=["POST"]),
+            Route("/health", health),
+            Route("/metrics", metrics_snapshot),
+            Route("/metrics/prometheus", metrics_prometheus),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.single_flight = SingleFlight(pool)
+    return app
+
+
+app = create_app()
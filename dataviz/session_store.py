@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+from dotenv import load_dotenv
+from dataviz.metrics import metrics
+
+load_dotenv()
+
+# Per-session caps of the chat history; the oldest messages are evicted first
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "500"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+def compact_spec(viz_data):
+    """The chart data returned by the graph as compact JSON, without code fences or indentation."""
+    content = viz_data.replace('```json', '').replace('```', '').strip()
+    return json.dumps(json.loads(content), separators=(",", ":"))
+
+
+def chart_message(label, chart_type, viz_data):
+    """
+    Chat message for a chart. Only the chart type and its chart_data JSON are kept; the figure is
+    rebuilt from them when needed and cached by `chart_key`, a hash of both.
+    """
+    chart_spec = compact_spec(viz_data)
+    chart_key = hashlib.sha256(f"{chart_type}\n{chart_spec}".encode("utf-8")).hexdigest()
+    return {"role": "assistant", "content": label, "chart_type": chart_type, "chart_spec": chart_spec,
+            "chart_key": chart_key}
+
+
+def message_size(message):
+    """Approximate memory held by a message: the total length of its strings."""
+    return sum(len(value) for value in message.values() if isinstance(value, str))
+
+
+class MessageStore:
+    """
+    Chat history of one session, capped at `max_messages` messages and about `max_bytes` of
+    text and chart specs. Supports len(), indexing and iteration like the list it replaces.
+    """
+
+    def __init__(self, messages=None, max_messages=SESSION_MAX_MESSAGES, max_bytes=SESSION_MAX_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # Messages dropped so far; also the absolute position of the first kept message
+        self.evicted = 0
+        self._messages = []
+        for message in messages or []:
+            self.append(message)
+
+    def append(self, message):
+        self._messages.append(message)
+        self.nbytes += message_size(message)
+        # The newest message is always kept, even when it alone exceeds max_bytes
+        while len(self._messages) > 1 and (len(self._messages) > self.max_messages or self.nbytes > self.max_bytes):
+            self.nbytes -= message_size(self._messages.pop(0))
+            self.evicted += 1
+            metrics.incr("session.messages_evicted")
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __iter__(self):
+        return iter(self._messages)
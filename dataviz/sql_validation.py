@@ -0,0 +1,179 @@
+import os
+import re
+from dotenv import load_dotenv
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # validation falls back to keyword and table checks
+    sqlglot = None
+
+load_dotenv()
+
+# Largest number of bytes a query may scan according to the dry run
+SQL_MAX_BYTES_SCANNED = int(os.getenv("SQL_MAX_BYTES_SCANNED", str(10 * 1024 ** 3)))
+# SQL generations per question, including the first one, before a rejected query is refused
+SQL_MAX_ATTEMPTS = int(os.getenv("SQL_MAX_ATTEMPTS", "3"))
+
+# SQLAlchemy dialect names that sqlglot spells differently
+SQLGLOT_DIALECTS = {"postgresql": "postgres", "mssql": "tsql"}
+
+_FORBIDDEN_RE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|DROP|CREATE|ALTER|TRUNCATE|GRANT|REVOKE|CALL|EXECUTE)\b", re.IGNORECASE
+)
+_SELECT_RE = re.compile(r"^\(?\s*(SELECT|WITH)\b", re.IGNORECASE)
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?([\w.-]+)`?", re.IGNORECASE)
+_CTE_RE = re.compile(r"(?:\bWITH|,)\s*(\w+)\s+AS\s*\(", re.IGNORECASE)
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _lower(names):
+    return {name.lower() for name in names}
+
+
+def parse_sql(sql, dialect):
+    """
+    Parses a single SQL statement of a SQLAlchemy dialect with sqlglot, which must be installed.
+
+    :return: (statement, None) or (None, error message).
+    """
+    try:
+        statements = [statement for statement in sqlglot.parse(sql, read=SQLGLOT_DIALECTS.get(dialect, dialect))
+                      if statement is not None]
+    except sqlglot.errors.ParseError as e:
+        return None, f"The SQL does not parse: {str(e).splitlines()[0]}"
+    if len(statements) != 1:
+        return None, "Only a single SQL statement is allowed."
+    return statements[0], None
+
+
+def referenced_tables(sql, dialect=None):
+    """Names (without project/dataset) of the tables a query reads, excluding CTEs."""
+    if sqlglot is not None:
+        statement, _ = parse_sql(sql, dialect)
+        if statement is not None:
+            ctes = _lower(cte.alias_or_name for cte in statement.find_all(exp.CTE))
+            return {table.name for table in statement.find_all(exp.Table) if table.name.lower() not in ctes}
+    ctes = _lower(_CTE_RE.findall(sql))
+    return {name.split(".")[-1] for name in _TABLE_RE.findall(sql) if name.split(".")[-1].lower() not in ctes}
+
+
+def _validate_parsed(sql, dialect, columns):
+    statement, error = parse_sql(sql, dialect)
+    if error:
+        return error
+    if not isinstance(statement, exp.Query) or any(
+        statement.find(node) for node in (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Drop, exp.Create,
+                                          exp.Alter, exp.TruncateTable, exp.Command)
+    ):
+        return "Only read-only SELECT queries are allowed."
+    ctes = _lower(cte.alias_or_name for cte in statement.find_all(exp.CTE))
+    tables = {table.name for table in statement.find_all(exp.Table) if table.name.lower() not in ctes}
+    known_tables = {name.lower(): name for name in columns}
+    unknown = sorted(table for table in tables if table.lower() not in known_tables)
+    if unknown:
+        return f"Unknown table(s): {', '.join(unknown)}. Available tables: {', '.join(sorted(columns))}."
+    if statement.find(exp.Unnest) or statement.find(exp.Lateral):
+        # Columns produced by UNNEST/LATERAL are not in the schema
+        return None
+    known_columns = _lower(
+        name for table in tables for name in columns[known_tables[table.lower()]]
+    ) | _lower(alias.alias for alias in statement.find_all(exp.Alias))
+    unknown = sorted({column.name for column in statement.find_all(exp.Column)
+                      if column.name and column.name.lower() not in known_columns})
+    if unknown:
+        available = ", ".join(f"{table}({', '.join(columns[known_tables[table.lower()]])})" for table in sorted(tables))
+        return f"Unknown column(s): {', '.join(unknown)}. Available columns: {available}."
+    return None
+
+
+def validate_sql(sql, dialect, columns):
+    """
+    Static checks of generated SQL against the cached schema, without touching the warehouse.
+
+    :param sql: Generated SQL query.
+    :param dialect: SQLAlchemy dialect name of the database, e.g. bigquery.
+    :param columns: Column names per table, as returned by SchemaCache.get_columns().
+    :return: None when the query is acceptable, otherwise the reason it was rejected.
+    """
+    if not sql or not sql.strip():
+        return "The SQL query is empty."
+    if sqlglot is not None:
+        return _validate_parsed(sql, dialect, columns)
+    statement = sql.strip().rstrip(";")
+    if ";" in statement:
+        return "Only a single SQL statement is allowed."
+    if not _SELECT_RE.match(statement) or _FORBIDDEN_RE.search(statement):
+        return "Only read-only SELECT queries are allowed."
+    known_tables = _lower(columns)
+    unknown = sorted(table for table in referenced_tables(statement) if table.lower() not in known_tables)
+    if unknown:
+        return f"Unknown table(s): {', '.join(unknown)}. Available tables: {', '.join(sorted(columns))}."
+    return None
+
+
+class BigQueryDryRun:
+    """Bytes a query would scan, from a BigQuery dry run; dry runs are free and read no data."""
+
+    def __init__(self, project=None, dataset=None, credentials_path=None):
+        from google.cloud import bigquery
+
+        self._bigquery = bigquery
+        project = project or os.getenv("GOOGLE_PROJECT")
+        credentials_path = credentials_path or os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if credentials_path:
+            self.client = bigquery.Client.from_service_account_json(credentials_path, project=project)
+        else:
+            self.client = bigquery.Client(project=project)
+        self.default_dataset = f"{project}.{dataset or os.getenv('BIGQUERY_DATASET')}"
+
+    def estimate_bytes(self, sql):
+        job_config = self._bigquery.QueryJobConfig(
+            dry_run=True, use_query_cache=False, default_dataset=self.default_dataset
+        )
+        return self.client.query(sql, job_config=job_config).total_bytes_processed
+
+
+class StaticDryRun:
+    """
+    Local stand-in for the dry run, used for backends without one and in tests and benchmarks:
+    a query is assumed to scan every table it reads completely, at the sizes given.
+    """
+
+    def __init__(self, table_bytes=None, default_bytes=0, dialect=None):
+        self.table_bytes = {name.lower(): size for name, size in (table_bytes or {}).items()}
+        self.default_bytes = default_bytes
+        self.dialect = dialect
+
+    def estimate_bytes(self, sql):
+        return sum(self.table_bytes.get(table.lower(), self.default_bytes)
+                   for table in referenced_tables(sql, self.dialect))
+
+
+def check_query(sql, dialect, columns, dry_run, max_bytes=SQL_MAX_BYTES_SCANNED):
+    """
+    Validates a query and checks its dry run estimate against the scan budget.
+
+    :return: (error, estimated bytes); error is None when the query may run. A failing dry run
+        (e.g. BigQuery rejecting an invalid column) counts as a validation error.
+    """
+    error = validate_sql(sql, dialect, columns)
+    if error:
+        return error, None
+    try:
+        estimate = dry_run.estimate_bytes(sql)
+    except Exception as e:
+        return f"The dry run rejected the query: {e}", None
+    if estimate is not None and estimate > max_bytes:
+        return (
+            f"The query would scan about {_format_bytes(estimate)}, over the budget of {_format_bytes(max_bytes)}. "
+            "Filter, aggregate or select fewer columns so it reads less data."
+        ), estimate
+    return None, estimate
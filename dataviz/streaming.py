@@ -0,0 +1,61 @@
+import time
+from collections import defaultdict
+from dataviz.metrics import metrics
+
+# Nodes whose LLM output is shown to the user token by token
+STREAMED_NODES = ("generate_answer", "get_visualization", "recommend_chart")
+
+
+class TokenStreamStats:
+    """Time-to-first-token and tokens/sec of one request, per streamed node."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = {}
+        self.last_token_at = {}
+        self.tokens = defaultdict(int)
+
+    def on_token(self, node):
+        now = time.perf_counter()
+        self.first_token_at.setdefault(node, now)
+        self.last_token_at[node] = now
+        self.tokens[node] += 1
+
+    def finish(self):
+        """Records the request's streaming metrics in dataviz.metrics and returns them."""
+        stats = {}
+        for node, first in self.first_token_at.items():
+            duration = self.last_token_at[node] - first
+            stats[node] = {
+                "ttft_ms": (first - self.start) * 1000,
+                "tokens": self.tokens[node],
+                # A single chunk has no measurable duration
+                "tokens_per_sec": self.tokens[node] / duration if duration > 0 else None,
+            }
+            metrics.observe(f"stream.{node}.ttft_ms", stats[node]["ttft_ms"])
+            if stats[node]["tokens_per_sec"] is not None:
+                metrics.observe(f"stream.{node}.tokens_per_sec", stats[node]["tokens_per_sec"])
+        if self.first_token_at:
+            stats["ttft_ms"] = (min(self.first_token_at.values()) - self.start) * 1000
+            metrics.observe("stream.request.ttft_ms", stats["ttft_ms"])
+        return stats
+
+
+async def astream_graph(graph, inputs, config=None, stats=None):
+    """
+    Runs the graph with LangGraph update and message streaming.
+
+    Yields:
+        ("token", node, text) for each LLM token of a streamed node, and ("step", step) for each
+        completed node, in the same format as graph.stream() updates.
+    """
+    async for mode, chunk in graph.astream(inputs, config, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if node in STREAMED_NODES and isinstance(message.content, str) and message.content:
+                if stats is not None:
+                    stats.on_token(node)
+                yield "token", node, message.content
+        else:
+            yield "step", chunk
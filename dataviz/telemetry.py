@@ -0,0 +1,189 @@
+"""
+Per-node spans for the question answering graph.
+
+Every node wrapped with `traced` records its wall time, the LLM prompt/completion tokens of the
+calls it makes, warehouse bytes and rows, cache hits and result sizes. Spans are aggregated in
+dataviz.metrics as node.<name>.<field> observations, exported as OpenTelemetry spans when the
+opentelemetry package is installed, and served in Prometheus text format by `prometheus_text`.
+"""
+import inspect
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+from dataviz.metrics import metrics
+
+try:
+    from opentelemetry import trace
+except ImportError:  # spans are still aggregated in dataviz.metrics
+    trace = None
+
+# Nodes listed first in the report, in pipeline order
+REPORT_NODES = ["route_question", "write_query", "validate_query", "execute_query", "generate_answer",
+                "get_visualization", "recommend_chart", "transform_data_for_visualization_chain"]
+SPAN_FIELDS = ["ms", "prompt_tokens", "completion_tokens", "warehouse_bytes", "rows", "result_bytes", "cache_hits"]
+
+_current_span = ContextVar("dataviz_span", default=None)
+# Set while a traced node runs, so every LangChain LLM call in it reports token usage to the span
+_token_usage_handler = ContextVar("dataviz_token_usage_handler", default=None)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Adds the usage_metadata of every LLM response to the current span."""
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    add_to_span("prompt_tokens", usage.get("input_tokens", 0))
+                    add_to_span("completion_tokens", usage.get("output_tokens", 0))
+
+
+register_configure_hook(_token_usage_handler, inheritable=True)
+_handler = TokenUsageHandler()
+
+
+class Span:
+    __slots__ = ("name", "start", "attributes")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.attributes = {}
+
+
+def add_to_span(field, value):
+    """Adds `value` to a numeric field of the span of the node currently running, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes[field] = span.attributes.get(field, 0) + value
+
+
+def _result_sizes(span, output):
+    if not isinstance(output, dict):
+        return
+    df = output.get("result_df")
+    if isinstance(df, pd.DataFrame):
+        span.attributes["rows"] = len(df)
+        span.attributes["result_bytes"] = int(df.memory_usage(deep=True).sum())
+    elif isinstance(output.get("result"), str):
+        span.attributes["result_bytes"] = len(output["result"])
+    if isinstance(output.get("viz_data"), str):
+        span.attributes["result_bytes"] = span.attributes.get("result_bytes", 0) + len(output["viz_data"])
+
+
+def _finish(span, output, otel_span):
+    span.attributes["ms"] = (time.perf_counter() - span.start) * 1000
+    _result_sizes(span, output)
+    for field, value in span.attributes.items():
+        metrics.observe(f"node.{span.name}.{field}", value)
+    if otel_span is not None:
+        otel_span.set_attributes({f"dataviz.{field}": value for field, value in span.attributes.items()})
+
+
+def _otel_span(name):
+    if trace is None:
+        return nullcontext()
+    return trace.get_tracer("dataviz").start_as_current_span(f"dataviz.{name}")
+
+
+def traced(name, node_fn):
+    """Wraps a graph node (sync or async) in a span named after the node."""
+    if inspect.iscoroutinefunction(node_fn):
+        async def atraced_node(state, config=None):
+            span = Span(name)
+            span_token, handler_token = _current_span.set(span), _token_usage_handler.set(_handler)
+            output = None
+            try:
+                with _otel_span(name) as otel_span:
+                    output = await node_fn(state, config)
+                    _finish(span, output, otel_span)
+                return output
+            finally:
+                _current_span.reset(span_token)
+                _token_usage_handler.reset(handler_token)
+        return atraced_node
+
+    def traced_node(state, config=None):
+        span = Span(name)
+        span_token, handler_token = _current_span.set(span), _token_usage_handler.set(_handler)
+        try:
+            with _otel_span(name) as otel_span:
+                output = node_fn(state, config)
+                _finish(span, output, otel_span)
+            return output
+        finally:
+            _current_span.reset(span_token)
+            _token_usage_handler.reset(handler_token)
+    return traced_node
+
+
+def node_report(snapshot=None):
+    """
+    p50/p95 of every span field per node, as {node: {field: {"count", "p50", "p95"}}}.
+
+    :param snapshot: A metrics.snapshot(); the current one by default.
+    """
+    observations = (snapshot or metrics.snapshot())["observations"]
+    report = {}
+    for name, summary in observations.items():
+        if not name.startswith("node."):
+            continue
+        node, field = name[len("node."):].rsplit(".", 1)
+        report.setdefault(node, {})[field] = {"count": summary["count"], "p50": summary["p50"], "p95": summary["p95"]}
+    return report
+
+
+def format_node_report(snapshot=None):
+    """Text table of node_report(): one row per node with p50/p95 of time, tokens, rows and sizes."""
+    report = node_report(snapshot)
+    nodes = [node for node in REPORT_NODES if node in report] + sorted(set(report) - set(REPORT_NODES))
+    header = f"{'node':<40}{'runs':>6}" + "".join(f"{field + ' p50':>22}/{'p95':<10}" for field in SPAN_FIELDS)
+    lines = [header.rstrip()]
+    for node in nodes:
+        fields = report[node]
+        cells = []
+        for field in SPAN_FIELDS:
+            summary = fields.get(field)
+            cells.append(f"{summary['p50']:>22.1f}/{summary['p95']:<10.1f}" if summary else f"{'-':>22}{'':<11}")
+        lines.append(f"{node:<40}{fields['ms']['count']:>6}" + "".join(cells).rstrip())
+    return "\n".join(lines)
+
+
+def _prometheus_name(name):
+    """Metric name and labels; span fields of every node share one metric with a node label."""
+    labels = ""
+    if name.startswith("node."):
+        node, name = name[len("node."):].rsplit(".", 1)
+        name, labels = f"node.{name}", f'node="{node}"'
+    return "dataviz_" + re.sub(r"[^a-zA-Z0-9_]", "_", name), labels
+
+
+def prometheus_text(snapshot=None):
+    """
+    The metrics in Prometheus text exposition format: counters, and summaries with p50/p95
+    quantiles of the recent observations and the running _count and _sum of all of them.
+    """
+    snapshot = snapshot or metrics.snapshot()
+    families = {}
+    for name, value in sorted(snapshot["counters"].items()):
+        metric, labels = _prometheus_name(name)
+        families.setdefault((metric + "_total", "counter"), []).append(f"{metric}_total{{{labels}}} {value}")
+    for name, summary in sorted(snapshot["observations"].items()):
+        metric, labels = _prometheus_name(name)
+        prefix = labels + "," if labels else ""
+        families.setdefault((metric, "summary"), []).extend([
+            f'{metric}{{{prefix}quantile="0.5"}} {summary["p50"]}',
+            f'{metric}{{{prefix}quantile="0.95"}} {summary["p95"]}',
+            f"{metric}_sum{{{labels}}} {summary['sum']}",
+            f"{metric}_count{{{labels}}} {summary['total']}",
+        ])
+    lines = []
+    for (metric, kind), samples in families.items():
+        lines.append(f"# TYPE {metric} {kind}")
+        lines += [sample.replace("{}", "") for sample in samples]
+    return "\n".join(lines) + "\n"
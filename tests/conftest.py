@@ -0,0 +1,50 @@
+import sqlite3
+import pytest
+from langchain_community.utilities import SQLDatabase
+from benchmarks.fakes import FakeChatModel
+from dataviz.graphbuilder import clear_graph_cache
+from dataviz.resources import resources
+from dataviz.schema_cache import SchemaCache
+
+T_SHIRTS = [
+    (1, "Nike", "Red", "M", 20, 30), (2, "Nike", "Blue", "L", 25, 10), (3, "Adidas", "Black", "S", 30, 40),
+    (4, "Levi", "White", "XL", 35, 15), (5, "Van Huesen", "Red", "M", 40, 25), (6, "Adidas", "Blue", "M", 22, 5),
+]
+
+
+@pytest.fixture
+def shop_db_path(tmp_path):
+    """A small SQLite copy of the t_shirts and discounts tables."""
+    path = str(tmp_path / "shop.db")
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE t_shirts (
+            t_shirt_id INTEGER PRIMARY KEY, brand TEXT, color TEXT, size TEXT, price INTEGER, stock_quantity INTEGER
+        );
+        CREATE TABLE discounts (discount_id INTEGER PRIMARY KEY, t_shirt_id INTEGER, pct_discount REAL);
+        """
+    )
+    connection.executemany("INSERT INTO t_shirts VALUES (?, ?, ?, ?, ?, ?)", T_SHIRTS)
+    connection.execute("INSERT INTO discounts VALUES (1, 3, 20)")
+    connection.commit()
+    connection.close()
+    return path
+
+
+@pytest.fixture
+def graph_resources(shop_db_path):
+    """Points the shared resources at the SQLite copy and a FakeChatModel; returns a function setting the model."""
+    db = SQLDatabase.from_uri(f"sqlite:///{shop_db_path}")
+    resources.override("db", db)
+    resources.override("schema_cache", SchemaCache(db, path=None))
+
+    def use_llm(**fields):
+        llm = FakeChatModel(**fields)
+        resources.override("llm", llm)
+        return llm
+
+    use_llm()
+    yield use_llm
+    resources.shutdown()
+    clear_graph_cache()
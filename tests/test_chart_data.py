@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from dataviz.chart_data import MAX_HISTOGRAM_BINS, MISSING_LABEL, build_chart_data
+
+
+def test_histogram_skips_missing_and_infinite_values():
+    values = np.append(np.arange(100, dtype=float), [np.nan, np.inf])
+    chart_data = build_chart_data("histogram", pd.DataFrame({"price": values}))["chart_data"]
+    assert len(chart_data["bins"]) == MAX_HISTOGRAM_BINS
+    assert sum(chart_data["counts"]) == 100
+
+
+def test_histogram_without_finite_values_is_not_shaped():
+    assert build_chart_data("histogram", pd.DataFrame({"price": [np.nan, np.nan]})) is None
+
+
+def test_histogram_weights_only_come_from_a_count_column():
+    df = pd.DataFrame({"price": [10, 20, 30], "n": [3, 1, 2]})
+    assert build_chart_data("histogram", df) is None
+    chart_data = build_chart_data("histogram", df, count_column="n")["chart_data"]
+    assert chart_data["bins"] == [10, 20, 30] and chart_data["counts"] == [3, 1, 2]
+
+
+def test_missing_categories_are_labeled():
+    df = pd.DataFrame({"brand": ["Nike", None, "Adidas", None], "stock": [1, 2, 3, 4]})
+    chart_data = build_chart_data("bar", df)["chart_data"]
+    assert chart_data["labels"] == ["Nike", MISSING_LABEL, "Adidas"]
+    assert chart_data["values"][0]["data"] == [1, 6, 3]
+    df = pd.DataFrame({"color": ["Red", np.nan], "size": ["M", "L"], "stock": [1, 2]})
+    stacked = build_chart_data("stacked bar", df)["chart_data"]
+    assert [group["stack_category"] for group in stacked["stack_groups"]] == ["Red", MISSING_LABEL]
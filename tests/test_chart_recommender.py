@@ -0,0 +1,19 @@
+import pandas as pd
+from dataviz.chart_recommender import recommend_chart
+
+BY_BRAND = pd.DataFrame({"brand": ["Nike", "Adidas", "Levi"], "stock": [30, 45, 15]})
+PRICE_DISCOUNT = pd.DataFrame({"price": [20, 25, 30, 35], "pct_discount": [10, 20, 15, 30]})
+
+
+def test_requested_chart_type_that_fits_is_kept():
+    assert recommend_chart(BY_BRAND, "Show stock by brand as a pie chart")[0] == "pie"
+
+
+def test_requested_chart_type_that_does_not_fit_defers_to_the_llm():
+    chart_type, _, ambiguous = recommend_chart(BY_BRAND, "Show stock by brand as a scatter plot")
+    assert chart_type is None and ambiguous
+
+
+def test_two_numeric_columns_need_a_hint():
+    assert recommend_chart(PRICE_DISCOUNT, "price and discount of every t shirt")[::2] == (None, True)
+    assert recommend_chart(PRICE_DISCOUNT, "price vs discount")[0] == "scatter"
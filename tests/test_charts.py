@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dataviz.chart_data import build_chart_data
+from dataviz.charts import build_chart_figure
+
+
+def test_large_scatter_is_sampled_and_drawn_with_webgl():
+    points = np.random.default_rng(0).normal(size=(50000, 2))
+    chart_data = {"title": "Price vs Stock", "x_label": "Price", "y_label": "Stock",
+                  "data_points": [{"x": x, "y": y} for x, y in points.tolist()]}
+    chart, _ = build_chart_figure("scatter", chart_data)
+    assert isinstance(chart.data[0], go.Scattergl)
+    assert len(chart.data[0].x) <= 2100
+
+
+def test_binned_histogram_bars_cover_their_bins():
+    df = pd.DataFrame({"price": np.arange(100, dtype=float)})
+    chart, _ = build_chart_figure("histogram", build_chart_data("histogram", df)["chart_data"])
+    bar = chart.data[0]
+    # 20 bins of width 4.95 over 0..99: the first bar is centered on its bin, not on its left edge
+    assert bar.width == 4.95 and bar.x[0] == 4.95 / 2
@@ -0,0 +1,28 @@
+import pandas as pd
+import dataviz.graphbuilder as graphbuilder
+from dataviz.conversation import ConversationSaver
+
+
+def test_saver_keeps_latest_checkpoint_of_recent_threads(graph_resources):
+    graph = graphbuilder.build_graph(typed_results=True, follow_ups=True)
+    saver = graph.checkpointer
+    saver.max_threads = 2
+    for thread_id in ["a", "b", "c"]:
+        config = {"configurable": {"thread_id": thread_id}}
+        graph.invoke({"question": "Show a bar chart of stock by brand"}, config)
+        graph.invoke({"question": "now show that as a pie chart"}, config)
+    assert saver.get_tuple({"configurable": {"thread_id": "a"}}) is None
+    checkpoints = list(saver.list({"configurable": {"thread_id": "c"}}))
+    assert len(checkpoints) == 1
+    assert checkpoints[0].checkpoint["channel_values"]["chart_type"] == "pie"
+    assert checkpoints[0].checkpoint["channel_values"]["result_df"] is not None
+
+
+def test_saver_compacts_large_results():
+    df = pd.DataFrame({"brand": [f"brand {i}" for i in range(1000)], "stock": range(1000)})
+    checkpoint = {"channel_values": {"result_df": df, "result_truncated": False}}
+    compacted = ConversationSaver(max_result_bytes=10_000)._compact(checkpoint)["channel_values"]
+    assert 0 < len(compacted["result_df"]) < len(df)
+    assert compacted["result_df"].memory_usage(deep=True).sum() <= 10_000
+    assert compacted["result_truncated"]
+    assert ConversationSaver()._compact(checkpoint) is checkpoint
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+import dataviz.graphbuilder as graphbuilder
+
+
+def test_transform_prompt_uses_question_of_follow_up_context(monkeypatch):
+    prompts = []
+
+    def fake_llm(prompt):
+        prompts.append(prompt.to_string())
+        return AIMessage(content="{}")
+
+    monkeypatch.setattr(graphbuilder, "get_llm", lambda: RunnableLambda(fake_llm))
+    # Two categorical columns cannot be shaped into a bar chart directly, so the LLM transform runs
+    state = {"question": "now show that as a bar chart", "context_question": "How many t shirts per brand and size?",
+             "chart_type": "bar", "result": "[('Nike', 'M', 3), ('Adidas', 'L', 5)]"}
+    output, transform_chain, chart_type = graphbuilder.prepare_transform(state)
+    assert output is None and chart_type == "bar"
+    transform_chain.invoke(state)
+    assert "How many t shirts per brand and size?" in prompts[0]
+    assert "now show that as a bar chart" not in prompts[0]
+
+
+def test_parallel_chart_arrives_before_the_answer(graph_resources):
+    graph_resources(latency=0.3)
+    graph = graphbuilder.build_graph(typed_results=True, parallel_viz=True, async_nodes=True)
+
+    async def arrivals():
+        start, steps = time.perf_counter(), {}
+        async for step in graph.astream({"question": "Show a bar chart of total stock by brand"}, stream_mode="updates"):
+            for node, output in step.items():
+                steps[node] = (time.perf_counter() - start, output)
+        return steps
+
+    steps = asyncio.run(arrivals())
+    chart_at, chart = steps["recommend_chart"]
+    answer_at, _ = steps["generate_answer"]
+    assert chart["chart_type"] == "bar" and chart["viz_data"]
+    # The chart is shaped without an LLM call, so it does not wait for the answer's 0.3 s call
+    assert chart_at < answer_at - 0.2
+
+
+def test_large_chart_result_is_reduced_in_the_warehouse(graph_resources, monkeypatch):
+    monkeypatch.setattr(graphbuilder, "CHART_RESULT_MAX_ROWS", 2)
+    graph_resources(sql="SELECT brand, stock_quantity FROM t_shirts")
+    graph = graphbuilder.build_graph(typed_results=True, bound_results=True)
+    state = graph.invoke({"question": "Show a bar chart of stock by brand"})
+    assert state["result_df"].values.tolist() == [["Adidas", 45], ["Nike", 40]]
+    assert state["result_truncated"] and state["result_note"].startswith("Only the 2 largest totals")
+    assert state["result_note"] in state["viz_data"]
+
+
+def test_get_graph_compiles_each_configuration_once(monkeypatch):
+    builds = []
+
+    def slow_build(**config):
+        builds.append(config)
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(graphbuilder, "build_graph", slow_build)
+    graphbuilder.clear_graph_cache()
+    barrier = threading.Barrier(8)
+
+    def get():
+        barrier.wait()
+        return graphbuilder.get_graph(typed_results=True, parallel_viz=True)
+
+    with ThreadPoolExecutor(8) as pool:
+        graphs = list(pool.map(lambda _: get(), range(8)))
+    assert len(builds) == 1 and all(graph is graphs[0] for graph in graphs)
+    assert graphbuilder.get_graph(parallel_viz=True, typed_results=True) is graphs[0]
+    assert graphbuilder.get_graph(typed_results=False) is not graphs[0] and len(builds) == 2
+    graphbuilder.clear_graph_cache()
+    assert graphbuilder.get_graph(typed_results=True, parallel_viz=True) is not graphs[0]
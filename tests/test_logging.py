@@ -0,0 +1,23 @@
+import io
+import logging
+from dataviz.logging import configure_logging, log_level
+
+
+def test_log_level_rejects_unknown_names():
+    assert log_level("debug") == logging.DEBUG
+    assert log_level("verbose") is None
+
+
+def test_configure_logging_only_adds_handlers_to_its_logger(tmp_path):
+    root_handlers = list(logging.getLogger().handlers)
+    target = logging.getLogger("dataviz.tests.configure")
+    existing = logging.NullHandler()
+    target.addHandler(existing)
+    stream = io.StringIO()
+    listener = configure_logging(target, "INFO", str(tmp_path / "test.log"), stream)
+    target.info("written")
+    listener.stop()
+    assert existing in target.handlers and len(target.handlers) == 2
+    assert logging.getLogger().handlers == root_handlers
+    assert "written" in stream.getvalue()
+    target.handlers.clear()
@@ -0,0 +1,20 @@
+from dataviz.metrics import Metrics
+from dataviz.telemetry import prometheus_text
+
+
+def test_summary_totals_cover_observations_beyond_the_samples():
+    metrics = Metrics(max_samples=3)
+    for value in range(10):
+        metrics.observe("node.write_query.ms", value)
+    summary = metrics.summary("node.write_query.ms")
+    assert summary["count"] == 3 and summary["max"] == 9
+    assert summary["total"] == 10 and summary["sum"] == 45
+
+
+def test_prometheus_summary_count_and_sum_are_running_totals():
+    metrics = Metrics(max_samples=3)
+    for value in range(10):
+        metrics.observe("node.write_query.ms", value)
+    text = prometheus_text(metrics.snapshot())
+    assert 'dataviz_node_ms_count{node="write_query"} 10' in text
+    assert 'dataviz_node_ms_sum{node="write_query"} 45.0' in text
@@ -0,0 +1,70 @@
+import pandas as pd
+from langchain_community.utilities import SQLDatabase
+from dataviz.query_cache import MemoryBackend, QueryCache, SQLiteBackend, dataset_freshness_token, question_literals
+
+
+def test_question_literals():
+    assert question_literals("T shirts under 20.5 dollars in 'Navy Blue'") == ["20.5", "navy blue"]
+
+
+def test_semantic_match_requires_same_literals():
+    cache = QueryCache(MemoryBackend(), MemoryBackend(), semantic_threshold=0.5)
+    cache.put_sql("Show t shirts under 20 dollars", "SELECT * FROM t_shirts WHERE price < 20")
+    assert cache.get_sql("Please show t shirts under 20 dollars") == "SELECT * FROM t_shirts WHERE price < 20"
+    assert cache.get_sql("Please show t shirts under 30 dollars") is None
+
+
+def test_semantic_match_uses_embeddings_stored_with_sqlite_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    QueryCache(SQLiteBackend(path, "sql"), MemoryBackend(), semantic_threshold=0.5).put_sql(
+        "How many Nike t shirts are in stock?", "SELECT 1")
+    # A new process sharing the file matches without having seen the question
+    cache = QueryCache(SQLiteBackend(path, "sql"), MemoryBackend(), semantic_threshold=0.5)
+    assert cache.get_sql("how many nike t shirts are in stock right now") == "SELECT 1"
+
+
+def test_results_bypass_cache_without_freshness_token():
+    cache = QueryCache(MemoryBackend(), MemoryBackend(), freshness_token=lambda: None)
+    cache.put_result("SELECT 1", "[(1,)]")
+    assert cache.get_result("SELECT 1") is None
+
+
+def test_apostrophes_are_not_quoted_values():
+    assert question_literals("What's the price of Levi's t shirts?") == []
+
+
+def test_failed_freshness_check_gives_no_token():
+    class FailingDb:
+        dialect = "bigquery"
+
+        def run(self, sql):
+            raise RuntimeError("403 Access Denied")
+
+    assert dataset_freshness_token(FailingDb())() is None
+
+
+def test_memory_backend_evicts_least_recently_used_beyond_byte_budget():
+    frame = pd.DataFrame({"brand": ["Nike"] * 1000})
+    size = int(frame.memory_usage(deep=True).sum())
+    backend = MemoryBackend(max_bytes=int(size * 2.5))
+    for key in ["a", "b", "c"]:
+        backend.set(key, {"result_df": frame}, ttl=60)
+    assert backend.get("a") is None and backend.get("b") is not None and backend.get("c") is not None
+    backend.set("huge", pd.concat([frame] * 3), ttl=60)
+    assert backend.get("huge") is None and backend.get("b") is not None
+
+
+def test_sqlite_backend_evicts_least_recently_used_beyond_byte_budget(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite"), "result", max_bytes=2500)
+    for key in ["a", "b", "c"]:
+        backend.set(key, "x" * 1000, ttl=60)
+    assert backend.get("a") is None and backend.get("b") is not None and backend.get("c") is not None
+
+
+def test_freshness_token_changes_with_the_data(shop_db_path, monkeypatch):
+    monkeypatch.delenv("DATASET_VERSION", raising=False)
+    db = SQLDatabase.from_uri(f"sqlite:///{shop_db_path}")
+    token = dataset_freshness_token(db, interval=0)
+    before = token()
+    db.run("INSERT INTO discounts VALUES (2, 5, 10)")
+    assert before and token() != before
@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from langchain_community.utilities import SQLDatabase
+
+pytest.importorskip("duckdb")
+from dataviz.replica import Replica, to_replica_sql  # noqa: E402
+
+
+@pytest.fixture
+def replica(shop_db_path, tmp_path):
+    replica = Replica(SQLDatabase.from_uri(f"sqlite:///{shop_db_path}"), path=str(tmp_path / "replica.duckdb"))
+    yield replica
+    replica.close()
+
+
+def execute(path, *statements):
+    connection = sqlite3.connect(path)
+    for statement in statements:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+
+def test_unchanged_tables_are_skipped(replica):
+    assert replica.refresh() == {"t_shirts": "full", "discounts": "full"}
+    assert replica.refresh() == {"t_shirts": "unchanged", "discounts": "unchanged"}
+    assert replica.is_fresh()
+
+
+def test_appended_rows_are_refreshed_incrementally(replica, shop_db_path):
+    replica.refresh()
+    execute(shop_db_path, "INSERT INTO t_shirts VALUES (7, 'Levi', 'Black', 'S', 28, 12)")
+    assert replica.refresh() == {"t_shirts": "incremental", "discounts": "unchanged"}
+    df = replica.query_frame("SELECT COUNT(*) AS n, SUM(stock_quantity) AS stock FROM t_shirts")
+    assert df.values.tolist() == [[7, 137]]
+
+
+def test_deleted_rows_reload_the_table(replica, shop_db_path):
+    replica.refresh()
+    execute(shop_db_path, "DELETE FROM t_shirts WHERE t_shirt_id = 2",
+            "INSERT INTO t_shirts VALUES (7, 'Levi', 'Black', 'S', 28, 12)")
+    assert replica.refresh()["t_shirts"] == "full"
+    df = replica.query_frame("SELECT t_shirt_id FROM t_shirts ORDER BY t_shirt_id")
+    assert df["t_shirt_id"].tolist() == [1, 3, 4, 5, 6, 7]
+
+
+def test_replica_is_stale_after_max_staleness(replica):
+    replica.refresh()
+    replica.max_staleness = -1
+    assert not replica.is_fresh()
+
+
+def test_qualified_warehouse_tables_are_rewritten():
+    sql = to_replica_sql("SELECT brand FROM `project.shop.t_shirts` WHERE price > 20", "bigquery")
+    assert sql == 'SELECT brand FROM "t_shirts" WHERE price > 20'
+
+
+def test_background_refresh_failure_is_logged(replica, caplog):
+    def failing_refresh():
+        raise RuntimeError("connection reset")
+
+    replica.refresh = failing_refresh
+    replica.refresh_in_background()
+    replica._refresh_thread.join()
+    assert "Replica refresh failed" in caplog.text and "connection reset" in caplog.text
@@ -0,0 +1,57 @@
+import pandas as pd
+from dataviz.result_shaping import count_column, limit_query, reduce_chart_query, shape_chart_data
+
+
+def test_limit_query_appends_limit():
+    assert limit_query("SELECT a FROM t", 100) == "SELECT a FROM t LIMIT 101"
+
+
+def test_limit_query_keeps_smaller_limit_before_comment():
+    assert limit_query("SELECT a FROM t LIMIT 5 -- five rows", 100) == "SELECT a FROM t LIMIT 5 -- five rows"
+
+
+def test_limit_query_lowers_larger_limit_before_comment():
+    assert limit_query("SELECT a FROM t LIMIT 500 -- comment", 100, "sqlite") == "SELECT a FROM t LIMIT 101"
+
+
+def test_limit_query_leaves_other_statements():
+    assert limit_query("DELETE FROM t", 100) == "DELETE FROM t"
+    assert limit_query("SELECT 1; SELECT 2", 100) == "SELECT 1; SELECT 2"
+
+
+def test_count_column_of_grouped_queries():
+    assert count_column("SELECT price, COUNT(*) AS n FROM t_shirts GROUP BY price") == "n"
+    assert count_column("SELECT price, COUNT(*) FROM t_shirts GROUP BY price", "sqlite") == "COUNT(*)"
+    assert count_column("SELECT price, stock_quantity FROM t_shirts") is None
+    assert count_column("SELECT price, AVG(stock_quantity) FROM t_shirts GROUP BY price") is None
+
+
+def test_reduce_chart_query_sums_largest_categories():
+    df = pd.DataFrame({"brand": ["Nike", "Adidas", "Nike"], "stock": [1, 2, 3]})
+    sql, note = reduce_chart_query("SELECT brand, stock FROM t_shirts", df, 2, "sqlite")
+    assert sql == ('SELECT "brand", SUM("stock") AS "stock" FROM (SELECT brand, stock FROM t_shirts) AS chart_rows '
+                   'GROUP BY "brand" ORDER BY SUM("stock") DESC LIMIT 2')
+    assert note == "Only the 2 largest totals of the query result are shown."
+
+
+def test_reduce_chart_query_samples_other_shapes():
+    df = pd.DataFrame({"price": [1.0, 2.0, 3.0], "stock": [1, 2, 3]})
+    sql, note = reduce_chart_query("SELECT price, stock FROM t_shirts", df, 2, "bigquery")
+    assert sql == "SELECT * FROM (SELECT price, stock FROM t_shirts) AS chart_rows ORDER BY RAND() LIMIT 2"
+    assert note.startswith("A random sample of 2 rows")
+    assert reduce_chart_query("DELETE FROM t_shirts", df, 2) == (None, None)
+
+
+def test_shape_chart_data_folds_llm_bar_categories_like_rows():
+    chart_data = {"title": "Stock", "labels": [f"c{i}" for i in range(30)],
+                  "values": [{"data": list(range(30)), "label": "Stock"}]}
+    shaped = shape_chart_data("bar", chart_data, max_categories=5)
+    assert len(shaped["labels"]) == 5 and "Other" in shaped["labels"]
+    assert sum(shaped["values"][0]["data"]) == sum(range(30))
+    assert shaped["values"][0]["label"] == "Stock" and shaped["title"] == "Stock"
+
+
+def test_shape_chart_data_keeps_text_scatter_axis():
+    chart_data = {"title": "Sales", "x_label": "Day", "y_label": "Sales",
+                  "data_points": [{"x": "2024-01-01", "y": 3}, {"x": "2024-01-02", "y": 5}]}
+    assert shape_chart_data("scatter", chart_data) is chart_data
@@ -0,0 +1,19 @@
+import json
+from dataviz.router import SEED_QUESTIONS_PATH, TfidfRouter, load_examples
+
+
+def test_logged_results_only_train_the_chart_type_head(tmp_path):
+    results = tmp_path / "results.jsonl"
+    with open(results, "w", encoding="utf-8") as f:
+        for i in range(50):
+            f.write(json.dumps({"id": i, "question": f"zebra report {i}", "chart_type": "pie"}) + "\n")
+    logged = load_examples(results)
+    assert all(example["route"] is None for example in logged)
+
+    seed = load_examples(SEED_QUESTIONS_PATH)
+    router = TfidfRouter.train(seed + logged)
+    routes, weights, _ = router.heads["route"]
+    # The router's own past decisions add no route labels, and their terms get no route weight
+    assert routes == sorted({example["route"] for example in seed})
+    assert not weights[router.vocabulary["zebra"]].any()
+    assert "pie" in router.heads["chart_type"][0]
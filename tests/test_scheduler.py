@@ -0,0 +1,25 @@
+import asyncio
+from dataviz.scheduler import Scheduler
+
+
+def test_release_skips_waiter_whose_loop_closed():
+    scheduler = Scheduler({"llm": 1})
+
+    async def queued_then_cancelled():
+        async def acquire():
+            async with scheduler.slot("llm", "queued"):
+                pass
+        try:
+            await asyncio.wait_for(acquire(), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    with scheduler.slot_sync("llm", "holder"):
+        # The queued waiter is cancelled and its event loop closes while the slot is still held
+        asyncio.run(queued_then_cancelled())
+    assert scheduler.stats()["llm"]["in_flight"] == 0
+
+    async def acquire_again():
+        async with scheduler.slot("llm"):
+            return True
+    assert asyncio.run(asyncio.wait_for(acquire_again(), timeout=1))
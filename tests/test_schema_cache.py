@@ -0,0 +1,62 @@
+import sqlite3
+import pytest
+from langchain_community.utilities import SQLDatabase
+from dataviz.schema_cache import SchemaCache
+
+
+@pytest.fixture
+def db(shop_db_path):
+    return SQLDatabase.from_uri(f"sqlite:///{shop_db_path}")
+
+
+def count_table_info_calls(monkeypatch, db):
+    calls = []
+    get_table_info = db.get_table_info
+    monkeypatch.setattr(db, "get_table_info", lambda table_names=None: calls.append(table_names) or get_table_info(table_names))
+    return calls
+
+
+def test_entry_is_reused_until_the_ttl_expires(db, monkeypatch):
+    calls = count_table_info_calls(monkeypatch, db)
+    cache = SchemaCache(db, path=None, ttl=3600)
+    assert "CREATE TABLE t_shirts" in cache.get_table_info()
+    cache.get_table_info()
+    assert cache.get_columns()["discounts"] == ["discount_id", "t_shirt_id", "pct_discount"]
+    assert len(calls) == 1
+
+
+def test_expired_entry_is_renewed_while_the_fingerprint_matches(db, monkeypatch):
+    calls = count_table_info_calls(monkeypatch, db)
+    cache = SchemaCache(db, path=None, ttl=0)
+    cache.get_table_info()
+    cache.get_table_info()
+    assert len(calls) == 1
+
+
+def test_schema_change_refreshes_the_entry(db, shop_db_path, monkeypatch):
+    calls = count_table_info_calls(monkeypatch, db)
+    cache = SchemaCache(db, path=None, ttl=0)
+    fingerprint = cache.fingerprint()
+    cache.get_table_info()
+    connection = sqlite3.connect(shop_db_path)
+    connection.execute("ALTER TABLE t_shirts ADD COLUMN material TEXT")
+    connection.commit()
+    connection.close()
+    db._inspector.clear_cache()
+    assert cache.fingerprint() != fingerprint
+    # SQLDatabase renders table info from the metadata it reflected at startup, so only the re-fetch is checked
+    cache.get_table_info()
+    assert len(calls) == 2
+    assert "material" in cache.get_columns()["t_shirts"]
+
+
+def test_entries_survive_a_restart(db, tmp_path, monkeypatch):
+    path = str(tmp_path / "schema_cache.json")
+    SchemaCache(db, path=path).get_table_info()
+    calls = count_table_info_calls(monkeypatch, db)
+    restarted = SchemaCache(db, path=path)
+    assert "CREATE TABLE t_shirts" in restarted.get_table_info()
+    assert calls == []
+    restarted.invalidate()
+    restarted.get_table_info()
+    assert len(calls) == 1
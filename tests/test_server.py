@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from starlette.testclient import TestClient
+from dataviz.metrics import metrics
+from dataviz.server import GraphPool, SingleFlight, create_app, response_body
+
+
+def test_response_body_keeps_answer_when_chart_data_is_not_json():
+    body = response_body({"question": "Stock by brand?", "answer": "Adidas.", "viz_data": '{"chart_data": [1, 2'})
+    assert body == {"question": "Stock by brand?", "answer": "Adidas.", "chart_spec": None}
+
+
+def test_response_body_parses_chart_data():
+    body = response_body({"answer": "Adidas.", "viz_data": '```json\n{"chart_data": {"labels": ["Adidas"]}}\n```'})
+    assert body["chart_spec"] == {"chart_data": {"labels": ["Adidas"]}}
+
+
+@pytest.mark.parametrize("path", ["/ask", "/ask/stream"])
+@pytest.mark.parametrize("content", ["not json", "[1, 2]", '{"question": 5}', '{"question": "  "}'])
+def test_invalid_request_body_is_a_bad_request(path, content):
+    # Without the context manager the lifespan, which compiles the graph, does not run
+    response = TestClient(create_app()).post(path, content=content, headers={"content-type": "application/json"})
+    assert response.status_code == 400 and response.json()["error"]
+
+
+def test_simultaneous_questions_share_one_graph_run(graph_resources):
+    graph_resources(latency=0.05)
+    single_flight = SingleFlight(GraphPool({"typed_results": True, "async_nodes": True}))
+    runs = metrics.counter("server.runs")
+
+    async def ask_all():
+        first, first_coalesced = single_flight.join("How much stock is there per brand?", "a")
+        second, second_coalesced = single_flight.join("how much stock is there per brand", "b")
+        other, other_coalesced = single_flight.join("What is the average price?", "c")
+        assert second is first and not first_coalesced and second_coalesced
+        assert other is not first and not other_coalesced
+
+        async def events(flight):
+            return [event async for event in flight.subscribe()]
+
+        first_events, second_events, _ = await asyncio.gather(events(first), events(second), events(other))
+        # A late subscriber replays the run from its first event
+        late_events = await events(first)
+        again, again_coalesced = single_flight.join("How much stock is there per brand?", "d")
+        await again.task
+        return first_events, second_events, late_events, again_coalesced
+
+    first_events, second_events, late_events, again_coalesced = asyncio.run(ask_all())
+    assert first_events == second_events == late_events
+    assert first_events[-1]["type"] == "done" and first_events[-1]["state"]["answer"]
+    assert [event["node"] for event in first_events if event["type"] == "step"][-1] == "generate_answer"
+    # Once the run is done the question starts a new one
+    assert not again_coalesced and metrics.counter("server.runs") - runs == 3
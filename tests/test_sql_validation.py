@@ -0,0 +1,54 @@
+import pytest
+from dataviz.sql_validation import StaticDryRun, check_query, validate_sql
+
+COLUMNS = {"t_shirts": ["t_shirt_id", "brand", "color", "size", "price", "stock_quantity"],
+           "discounts": ["discount_id", "t_shirt_id", "pct_discount"]}
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT brand, SUM(stock_quantity) AS stock FROM t_shirts GROUP BY brand ORDER BY stock DESC",
+    "WITH cheap AS (SELECT * FROM t_shirts WHERE price < 20) SELECT brand FROM cheap",
+    "SELECT t.brand, d.pct_discount FROM `shop.t_shirts` t JOIN discounts d ON t.t_shirt_id = d.t_shirt_id",
+])
+def test_valid_queries_pass(sql):
+    assert validate_sql(sql, "bigquery", COLUMNS) is None
+
+
+def test_unknown_table_is_rejected():
+    error = validate_sql("SELECT brand FROM shirts", "bigquery", COLUMNS)
+    assert error.startswith("Unknown table(s): shirts.") and "t_shirts" in error
+
+
+def test_unknown_column_is_rejected():
+    error = validate_sql("SELECT brand, colour FROM t_shirts", "bigquery", COLUMNS)
+    assert error.startswith("Unknown column(s): colour.") and "t_shirts(t_shirt_id" in error
+
+
+@pytest.mark.parametrize("sql", ["DELETE FROM t_shirts", "DROP TABLE t_shirts", "UPDATE t_shirts SET price = 0"])
+def test_writes_are_rejected(sql):
+    assert validate_sql(sql, "bigquery", COLUMNS) == "Only read-only SELECT queries are allowed."
+
+
+def test_several_statements_are_rejected():
+    assert validate_sql("SELECT 1; SELECT 2", "bigquery", COLUMNS) == "Only a single SQL statement is allowed."
+
+
+def test_dry_run_over_budget_is_rejected():
+    dry_run = StaticDryRun({"t_shirts": 3 * 1024 ** 3, "discounts": 1024})
+    error, estimate = check_query("SELECT brand FROM t_shirts", "bigquery", COLUMNS, dry_run, max_bytes=1024 ** 3)
+    assert estimate == 3 * 1024 ** 3 and error.startswith("The query would scan about 3 GB, over the budget of 1 GB.")
+    assert check_query("SELECT pct_discount FROM discounts", "bigquery", COLUMNS, dry_run, 1024 ** 3) == (None, 1024)
+
+
+def test_failing_dry_run_is_a_validation_error():
+    class FailingDryRun:
+        def estimate_bytes(self, sql):
+            raise RuntimeError("Unrecognized name: colour")
+
+    error, estimate = check_query("SELECT brand FROM t_shirts", "bigquery", COLUMNS, FailingDryRun())
+    assert error == "The dry run rejected the query: Unrecognized name: colour" and estimate is None
+
+
+def test_invalid_queries_skip_the_dry_run():
+    dry_run = StaticDryRun(default_bytes=1)
+    assert check_query("SELECT brand FROM shirts", "bigquery", COLUMNS, dry_run)[1] is None